@@ -10,19 +10,89 @@ Modes:
 Usage:
   python3 ai_security_node_final.py collect      # Data collection mode
   python3 ai_security_node_final.py monitor       # Active detection mode
+  python3 ai_security_node_final.py monitor --profile-startup
+  python3 ai_security_node_final.py monitor --workers 4   # Sharded scoring
+  python3 ai_security_node_final.py monitor --frames-only # Behind telemetry_bridge.py
+  python3 ai_security_node_final.py monitor --detector both  # Forest + adaptive baseline
+
+Model refresh:
+  In monitor mode the node watches the model files and hot-swaps a newly
+  trained model without restarting (no dropped messages, counters kept).
+  A reload can also be requested on the control topic:
+    mosquitto_pub -t ics/security/control -m '{"command": "reload_model"}'
+
+Sharded scoring:
+  With --workers N, raw telemetry payloads are routed by device ID to N
+  scoring processes (sharded_inference.py) that decode, build features and
+  score in parallel; this process keeps only MQTT I/O and dispatch. The
+  model is mapped from shared memory, so extra workers add little RAM.
+
+Binary telemetry:
+  Struct-packed records (telemetry_binary.py) on ics/telemetry/bin are scored
+  exactly like the JSON messages on ics/telemetry/data. Frames on
+  ics/telemetry/frame (N samples per publish, e.g. from telemetry_bridge.py)
+  are unpacked straight into one batch matrix and scored in a single call;
+  window features use each sample's own timestamp. When telemetry_bridge.py
+  re-publishes the single-sample topics as frames, run with --frames-only so
+  samples are not scored twice.
+
+Streaming detector:
+  --detector streaming scores with an adaptive per-sensor, per-regime robust
+  baseline (streaming_detector.py) instead of the trained forest - no model
+  needed, O(1) per sample, fixed memory. --detector both keeps the forest
+  and lets the baseline confirm its verdicts, so slow drift the forest never
+  saw stops triggering interventions. The baseline is checkpointed to
+  --streaming-state every minute and on shutdown, and restored at startup.
+
+Interventions:
+  Anomalies queue a pump_shutdown on a separate dispatcher thread
+  (intervention_dispatcher.py), which publishes at QoS 1, coalesces repeats
+  within INTERVENTION_COOLDOWN and rate-limits, so a flood of anomalous
+  samples cannot stall scoring.
+
+Metrics:
+  Prometheus metrics (metrics_exporter.py) are served on
+  http://127.0.0.1:9105/metrics (--metrics-port, 0 disables) and can also be
+  written for node_exporter's textfile collector (--metrics-textfile).
+
+Profiling:
+  --stage-timers (or SIGUSR2 / the control topic to toggle) times each
+  hot-path stage - on_message, decode, features, enqueue, score, result,
+  intervention - into ics_stage_seconds histograms; while off, the original
+  methods run unwrapped. SIGUSR1 or
+    mosquitto_pub -t ics/security/control -m '{"command": "profile", "mode": "cprofile", "seconds": 30}'
+  captures a profile (hotpath_profiler.py) into PROFILE_DIR.
+
+Logging:
+  Runtime events are logged as JSON lines (structured_logging.py) through a
+  queue to a background writer, so journald back-pressure never blocks the
+  MQTT or scoring threads. Anomalies are logged in full for the first
+  ANOMALY_LOG_BURST per ANOMALY_LOG_INTERVAL and summarized after that.
+  --log-format text for a terminal.
+
+Startup:
+  Only paho, json, ssl and logging are imported at module level so collect
+  mode (and a systemd restart) comes up fast; collect mode only counts
+  messages and never decodes them. structured_logging is imported by main()
+  (its queued writer only in monitor mode); the metrics registry and
+  hotpath_profiler are set up in monitor mode, or in collect mode only once
+  a metrics endpoint, stage timers or a profile is asked for. numpy and the
+  model backend are imported lazily by load_model() in monitor mode.
 """
 
-import paho.mqtt.client as mqtt
-import json
 import time
-import pandas as pd
-import numpy as np
-import joblib
+_t0 = time.perf_counter()
+import json
+import logging
 import os
+import signal
 import ssl
-from datetime import datetime
-from sklearn.ensemble import IsolationForest
 import threading
+from contextlib import contextmanager
+from datetime import datetime
+_t1 = time.perf_counter()
+import paho.mqtt.client as mqtt
+_t2 = time.perf_counter()
 
 # Configuration
 BROKER = "localhost"
@@ -33,6 +103,25 @@ CA_CERT = "/etc/mosquitto/ca_certificates/ca.crt"
 
 # Model configuration
 MODEL_PATH = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/isolation_forest_model.pkl"
+COMPILED_MODEL_PATH = MODEL_PATH.replace('.pkl', '.npz')  # Exported by train_model.py
+METADATA_PATH = MODEL_PATH.replace('.pkl', '_metadata.json')
+MODEL_POLL_INTERVAL = 10  # seconds between checks for a retrained model
+CONTROL_TOPIC = "ics/security/control"
+TELEMETRY_TOPIC = "ics/telemetry/data"
+TELEMETRY_BIN_TOPIC = "ics/telemetry/bin"  # Struct-packed records (telemetry_binary.py)
+TELEMETRY_FRAME_TOPIC = "ics/telemetry/frame"  # Multi-sample frames (telemetry_bridge.py)
+INTERVENTION_TOPIC = "ics/security/intervention"
+INTERVENTION_COOLDOWN = 5.0  # seconds before the same command is re-published
+INTERVENTION_RATE = 1.0      # sustained interventions per second
+INTERVENTION_BURST = 3
+NODE_SOURCE = "ics_ai_node"  # Tags our own interventions so the echo is not counted
+METRICS_PORT = 9105  # Prometheus endpoint
+METRICS_BIND = "127.0.0.1"  # Scraped locally (or through a reverse proxy)
+PROFILE_DIR = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/profiles"
+STREAMING_STATE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/streaming_detector_state.npz"
+DETECTORS = ['forest', 'streaming', 'both']  # Batch forest, adaptive baseline, or forest confirmed by it
+ANOMALY_LOG_BURST = 5        # Anomalies logged in full per interval...
+ANOMALY_LOG_INTERVAL = 10.0  # ...the rest are summarized once per interval (s)
 FEATURES = ['flow_rate', 'pressure', 'temperature', 'motor_current',
             'phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
 
@@ -40,35 +129,125 @@ FEATURES = ['flow_rate', 'pressure', 'temperature', 'motor_current',
 ANOMALY_THRESHOLD = -0.5  # Decision function threshold for anomalies
 
 
+class StartupProfiler:
+    """Records wall time spent importing and loading each startup component"""
+    
+    def __init__(self):
+        self.started = _t0
+        self.timings = [("import stdlib (json, os, ssl)", _t1 - _t0),
+                        ("import paho.mqtt", _t2 - _t1)]
+    
+    @contextmanager
+    def measure(self, component):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((component, time.perf_counter() - start))
+    
+    def report(self):
+        """Print per-component timings and which heavy modules got imported"""
+        import sys
+        
+        print(f"\n--- Startup Profile ---")
+        for component, seconds in self.timings:
+            print(f"  {component:<40} {seconds * 1000:8.1f} ms")
+        print(f"  {'total since module import':<40} "
+              f"{(time.perf_counter() - self.started) * 1000:8.1f} ms")
+        loaded = [name for name in ('numpy', 'pandas', 'sklearn', 'joblib')
+                  if name in sys.modules]
+        print(f"  Heavy modules loaded: {', '.join(loaded) or 'none'}")
+        print(f"-----------------------\n")
+
+
+STARTUP = StartupProfiler()
+log = logging.getLogger("ics.node")
+
+
+def fields(**values):
+    """extra= for a structured record (structured_logging.fields, without the import)"""
+    return {"fields": values}
+
+
 class ICSAISecurityNode:
-    def __init__(self, mode='collect'):
+    def __init__(self, mode='collect', workers=0, frames_only=False, client=None,
+                 model_path=MODEL_PATH, batch_size=None, metrics_port=None,
+                 metrics_bind=METRICS_BIND, metrics_textfile=None, stage_timers=False,
+                 profile_dir=PROFILE_DIR, detector='forest', streaming_state=STREAMING_STATE):
         """
         Initialize the AI Security Node.
         
         Args:
             mode: 'collect' (log only) or 'monitor' (active detection)
+            workers: scoring processes for sharded inference (0 = score in-process)
+            frames_only: subscribe to telemetry frames only, not single samples
+            client: MQTT client to use instead of a TLS paho client for BROKER
+                    (e.g. an in-process stub in benchmarks)
+            model_path: joblib model; the .npz export and metadata sit beside it
+            batch_size: max rows per scoring batch (default: BATCH_SIZE)
+            metrics_port: serve Prometheus metrics on this port (None: off)
+            metrics_bind: address the metrics endpoint listens on
+            metrics_textfile: also write the metrics to this .prom file
+            stage_timers: time each hot-path stage from the start
+            profile_dir: where on-demand profiles are written
+            detector: 'forest', 'streaming' or 'both' (see DETECTORS)
+            streaming_state: checkpoint file of the streaming detector
         """
         self.mode = mode
+        self.workers = workers
+        self.frames_only = frames_only
+        self.model_path = model_path
+        self.compiled_model_path = model_path.replace('.pkl', '.npz')
+        self.metadata_path = model_path.replace('.pkl', '_metadata.json')
+        self.batch_size = batch_size
+        self.metrics_port = metrics_port
+        self.metrics_bind = metrics_bind
+        self.metrics_textfile = metrics_textfile
+        self.metrics_server = None
+        self.profile_dir = profile_dir
+        self.detector = detector
+        self.streaming_state = streaming_state
         self.running = True
         
         # MQTT setup
-        self.client = mqtt.Client(
-            callback_api_version=mqtt.CallbackAPIVersion.VERSION2
-        )
-        self.client.username_pw_set(USERNAME, PASSWORD)
-        self.client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
+        with STARTUP.measure("MQTT client + TLS context"):
+            if client is None:
+                client = mqtt.Client(
+                    callback_api_version=mqtt.CallbackAPIVersion.VERSION2
+                )
+                client.username_pw_set(USERNAME, PASSWORD)
+                client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
+            self.client = client
+            self.client.on_connect = self.on_connect
+            self.client.on_message = self.on_message
         
         # Statistics
         self.normal_count = 0
         self.anomaly_count = 0
         self.intervention_count = 0
+        self.frame_count = 0
         self.last_log_time = time.time()
         
         # Model (loaded in monitor mode)
         self.model = None
         self.model_loaded = False
+        self.n_features = len(FEATURES)
+        self.window_engine = None  # Sliding-window features, if the model uses them
+        self.telemetry_features = None
+        self.decoder = None
+        self.window_config = None
+        self.streaming = None  # Adaptive baseline (--detector streaming/both)
+        self.batcher = None
+        self.watcher = None
+        self.dispatcher = None
+        self.model_generation = 0
+        self._reload_lock = threading.Lock()
+        
+        # Log throttles (anomaly floods, garbage on the telemetry topics)
+        from structured_logging import EventThrottle
+        self.anomaly_log = EventThrottle(log, "anomaly", ANOMALY_LOG_BURST, ANOMALY_LOG_INTERVAL)
+        self.invalid_log = EventThrottle(log, "invalid_payload", ANOMALY_LOG_BURST,
+                                         ANOMALY_LOG_INTERVAL)
         
         print(f"="*60)
         print(f"ICS AI Security Node v2.0")
@@ -77,109 +256,552 @@ class ICSAISecurityNode:
         
         # Load model if in monitor mode
         if self.mode == 'monitor':
-            self.load_model()
+            if self.detector == 'streaming':
+                self.load_feature_config({})
+            else:
+                self.load_model()
+        if self.mode == 'monitor' and self.detector != 'forest':
+            self.load_streaming()
+        
+        # Micro-batched scoring off the MQTT callback thread (or in worker processes)
+        if self.mode == 'monitor' and (self.model_loaded or self.streaming is not None):
+            with STARTUP.measure("import batch_inference"):
+                from batch_inference import MicroBatcher, BATCH_SIZE, BATCH_MAX_DELAY
+            batch_size = self.batch_size or BATCH_SIZE
+            if self.workers > 0:
+                from sharded_inference import ShardedScorer
+                self.batcher = ShardedScorer(
+                    self.workers,
+                    self.model,
+                    FEATURES,
+                    self.window_config,
+                    self.on_scored,
+                    max_batch=batch_size,
+                    max_delay=BATCH_MAX_DELAY
+                )
+            else:
+                self.batcher = MicroBatcher(
+                    self.score_fn(),
+                    self.on_scored,
+                    n_features=self.n_features,
+                    max_batch=batch_size,
+                    max_delay=BATCH_MAX_DELAY
+                )
+            from intervention_dispatcher import InterventionDispatcher
+            self.dispatcher = InterventionDispatcher(
+                self.client,
+                topic=INTERVENTION_TOPIC,
+                cooldown=INTERVENTION_COOLDOWN,
+                rate=INTERVENTION_RATE,
+                burst=INTERVENTION_BURST
+            )
+        
+        # Metrics and profiling: always in monitor mode, in collect mode only when
+        # asked for, so collect mode starts on paho/json/ssl alone
+        self.metrics = None
+        self.received_metrics = {}
+        self.invalid_metrics = {}
+        self.frame_samples_metric = None
+        self.stage_timers = None
+        self.profile_capture = None
+        if self.mode == 'monitor' or metrics_port is not None or metrics_textfile:
+            with STARTUP.measure("metrics registry"):
+                self.setup_metrics()
+        if self.mode == 'monitor' or stage_timers:
+            self.load_profiler()
+        if stage_timers:
+            self.set_stage_timers(True)
     
-    def load_model(self):
-        """Load the trained Isolation Forest model"""
-        if os.path.exists(MODEL_PATH):
-            print(f"Loading model from {MODEL_PATH}...")
-            try:
-                self.model = joblib.load(MODEL_PATH)
-                self.model_loaded = True
-                print("✓ Model loaded successfully")
-                
-                # Get model info
-                n_estimators = self.model.get_params().get('n_estimators', 'unknown')
-                print(f"  - n_estimators: {n_estimators}")
-                print(f"  - contamination: {self.model.get_params().get('contamination', 'unknown')}")
-            except Exception as e:
-                print(f"✗ Failed to load model: {e}")
-                print("  Falling back to collect mode...")
-                self.mode = 'collect'
+    def load_profiler(self):
+        """Stage timers and profile capture (hotpath_profiler.py), on first use"""
+        if self.stage_timers is not None:
+            return
+        with STARTUP.measure("import hotpath_profiler"):
+            from hotpath_profiler import StageTimers, ProfileCapture
+        if self.metrics is None:
+            self.setup_metrics()
+        self.stage_timers = StageTimers(self.metrics)
+        self.profile_capture = ProfileCapture(self.profile_hooks, self.profile_dir)
+    
+    def stage_timers_active(self):
+        return self.stage_timers is not None and self.stage_timers.active
+    
+    def setup_metrics(self):
+        """
+        Register the node's metrics. Hot-path metrics are single-writer
+        counters/histograms; everything already counted elsewhere is read
+        at scrape time.
+        """
+        from metrics_exporter import MetricsRegistry, LATENCY_BUCKETS, BATCH_BUCKETS
+        
+        self.metrics = registry = MetricsRegistry()
+        topics = [TELEMETRY_TOPIC, TELEMETRY_BIN_TOPIC, TELEMETRY_FRAME_TOPIC,
+                  INTERVENTION_TOPIC, CONTROL_TOPIC]
+        # Written by the MQTT thread
+        self.received_metrics = {
+            topic: registry.counter("ics_messages_received_total",
+                                    "MQTT messages received", topic=topic)
+            for topic in topics}
+        self.invalid_metrics = {
+            topic: registry.counter("ics_decode_errors_total",
+                                    "Payloads that could not be decoded", topic=topic)
+            for topic in topics}
+        self.frame_samples_metric = registry.counter(
+            "ics_frame_samples_received_total", "Samples received inside telemetry frames")
+        # Written by the batcher (or shard merger) thread
+        self.latency_metric = registry.histogram(
+            "ics_scoring_latency_seconds", "Time from queueing a sample to its verdict",
+            LATENCY_BUCKETS)
+        self.batch_metric = registry.histogram(
+            "ics_batch_size", "Samples per scoring call", BATCH_BUCKETS)
+        
+        # Read at scrape time
+        registry.gauge_fn("ics_node_start_time_seconds", "Node start time (unix)",
+                          lambda started=time.time(): started)
+        registry.gauge_fn("ics_monitor_mode", "1 when actively scoring",
+                          lambda: int(self.batcher is not None))
+        registry.counter_fn("ics_samples_scored_total", "Samples scored (or counted in collect mode)",
+                            lambda: self.normal_count + self.anomaly_count)
+        registry.counter_fn("ics_anomalies_total", "Samples scored as anomalous",
+                            lambda: self.anomaly_count)
+        registry.gauge_fn("ics_anomaly_ratio", "Anomalous fraction of scored samples",
+                          lambda: self.anomaly_count / max(1, self.normal_count + self.anomaly_count))
+        registry.counter_fn("ics_interventions_total", "Interventions triggered or received",
+                            lambda: self.intervention_count)
+        registry.counter_fn("ics_frames_received_total", "Telemetry frames processed",
+                            lambda: self.frame_count)
+        registry.gauge_fn("ics_model_generation", "Hot-swapped model generation",
+                          lambda: self.model_generation)
+        from structured_logging import dropped_records
+        registry.counter_fn("ics_log_records_dropped_total",
+                            "Log records dropped on a full logging queue", dropped_records)
+        registry.counter_fn("ics_log_events_suppressed_total",
+                            "Events summarized instead of logged individually",
+                            lambda: self.anomaly_log.suppressed, event="anomaly")
+        registry.counter_fn("ics_log_events_suppressed_total",
+                            "Events summarized instead of logged individually",
+                            lambda: self.invalid_log.suppressed, event="invalid_payload")
+        if self.decoder is not None:
+            registry.counter_fn("ics_decoder_fallbacks_total",
+                                "Payloads re-decoded after the typed decoder rejected them",
+                                lambda: self.decoder.fallbacks)
+        if self.batcher is not None:
+            registry.gauge_fn("ics_queue_depth", "Samples waiting to be scored",
+                              self.batcher.qsize)
+            registry.counter_fn("ics_samples_dropped_total", "Samples dropped on a full queue",
+                                lambda: self.batcher.dropped)
+            registry.counter_fn("ics_scoring_errors_total", "Failed scoring calls",
+                                lambda: self.batcher.errors)
+            if self.workers > 0:
+                registry.counter_fn("ics_decode_errors_total",
+                                    "Payloads that could not be decoded",
+                                    lambda: self.batcher.invalid, topic="sharded")
+                registry.gauge_fn("ics_workers_alive", "Scoring worker processes alive",
+                                  lambda: self.batcher.stats()['workers_alive'])
+                registry.counter_fn("ics_worker_restarts_total",
+                                    "Scoring worker processes respawned after exiting",
+                                    lambda: self.batcher.restarts)
+        if self.streaming is not None:
+            registry.gauge_fn("ics_streaming_warm_baselines",
+                              "Streaming detector regimes past warm-up",
+                              self.streaming.warm_baselines)
+            registry.counter_fn("ics_streaming_anomalies_total",
+                                "Samples over the streaming detector's threshold",
+                                lambda: self.streaming.anomalies)
+            registry.counter_fn("ics_streaming_checkpoints_total",
+                                "Streaming detector state checkpoints written",
+                                lambda: self.streaming.checkpoints)
+        if self.dispatcher is not None:
+            for outcome in ('published', 'coalesced', 'rate_limited', 'dropped', 'errors',
+                            'queued_offline'):
+                registry.counter_fn("ics_interventions_dispatched_total",
+                                    "Intervention dispatch outcomes",
+                                    lambda outcome=outcome: getattr(self.dispatcher, outcome),
+                                    outcome=outcome)
+    
+    def read_model(self):
+        """Load the newest model and its metadata from disk (no side effects)"""
+        metadata = {}
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path) as f:
+                metadata = json.load(f)
+        
+        # The metadata names the export that belongs to this model (null: none)
+        compiled = os.path.exists(self.compiled_model_path)
+        if 'compiled_model' in metadata:
+            compiled = compiled and metadata['compiled_model'] == \
+                os.path.basename(self.compiled_model_path)
+        if compiled:
+            path, backend = self.compiled_model_path, "compiled_forest (numpy)"
+        elif os.path.exists(self.model_path):
+            path, backend = self.model_path, "joblib"
         else:
-            print(f"✗ Model not found at {MODEL_PATH}")
+            raise FileNotFoundError(self.model_path)
+        
+        with STARTUP.measure(f"import {backend}"):
+            if path == self.compiled_model_path:
+                from compiled_forest import load_forest
+                loader = load_forest
+            else:
+                import joblib
+                loader = joblib.load
+        # Unpickling also imports sklearn for the joblib backend
+        with STARTUP.measure(f"load model {os.path.basename(path)}"):
+            model = loader(path)
+        return model, metadata, path
+    
+    def load_model(self):
+        """Load the trained Isolation Forest model (compiled export preferred)"""
+        try:
+            model, metadata, path = self.read_model()
+        except FileNotFoundError:
+            print(f"✗ Model not found at {self.model_path}")
             print("  Run train_model.py first, or use collect mode.")
             print("  Falling back to collect mode...")
             self.mode = 'collect'
+            return
+        except Exception as e:
+            print(f"✗ Failed to load model: {e}")
+            print("  Falling back to collect mode...")
+            self.mode = 'collect'
+            return
+        
+        print(f"Loaded model from {path}")
+        try:
+            self.model = model
+            self.load_feature_config(metadata)
+            self.model_loaded = True
+            print("✓ Model loaded successfully")
+            
+            # Get model info
+            n_estimators = self.model.get_params().get('n_estimators', 'unknown')
+            print(f"  - backend: {type(self.model).__name__}")
+            print(f"  - n_estimators: {n_estimators}")
+            print(f"  - contamination: {self.model.get_params().get('contamination', 'unknown')}")
+            if hasattr(self.model, 'regimes'):
+                print(f"  - regimes: {len(self.model.regimes())} "
+                      f"(+ fallback for {', '.join(self.model.keys)} states without a model)")
+        except Exception as e:
+            print(f"✗ Failed to load model: {e}")
+            print("  Falling back to collect mode...")
+            self.mode = 'collect'
+    
+    def load_feature_config(self, metadata):
+        """Set up window features from the model metadata and check the width"""
+        from window_features import WindowFeatureEngine, TelemetryFeatures
+        
+        if metadata.get('window'):
+            self.window_config = metadata['window']
+            self.window_engine = WindowFeatureEngine.from_config(self.window_config)
+            print(f"  - window features: windows {list(self.window_engine.windows)}, "
+                  f"lags {list(self.window_engine.lags)}")
+        self.telemetry_features = TelemetryFeatures(FEATURES, self.window_engine)
+        self.n_features = self.telemetry_features.n_features
+        
+        with STARTUP.measure("import telemetry_decoder"):
+            from telemetry_decoder import TelemetryDecoder
+        self.decoder = TelemetryDecoder(FEATURES)
+        print(f"  - telemetry decoder: {self.decoder.backend}")
+        
+        self.check_model(self.model, metadata)
+    
+    def load_streaming(self):
+        """Set up the streaming detector, resuming from its last checkpoint"""
+        with STARTUP.measure("import streaming_detector"):
+            from streaming_detector import StreamingDetector
+        try:
+            self.streaming = StreamingDetector(self.feature_names(),
+                                               state_path=self.streaming_state)
+        except ValueError as e:
+            print(f"✗ Streaming detector unavailable: {e}")
+            print("  Falling back to collect mode...")
+            self.mode = 'collect'
+            return
+        with STARTUP.measure("restore streaming state"):
+            warm = self.streaming.restore()
+        print(f"✓ Streaming detector ready ({self.detector})")
+        print(f"  - channels: {', '.join(self.streaming.channel_names)}, "
+              f"per {', '.join(self.streaming.keys)} regime")
+        if warm:
+            print(f"  - resumed from {self.streaming_state} "
+                  f"({self.streaming.warm_baselines()} warm baselines)")
+        else:
+            print(f"  - cold start ({self.streaming.warmup} samples per regime before scoring)")
+    
+    def score_fn(self):
+        """Batch scoring function for the configured detector"""
+        if self.detector == 'streaming':
+            return self.streaming.decision_function
+        if self.detector == 'both':
+            return self.score_both
+        return self.model.decision_function
+    
+    def score_both(self, X):
+        """Forest scores, confirmed (and learned from) by the streaming detector"""
+        return self.streaming.confirm(self.model.decision_function(X), X)
+    
+    def feature_names(self):
+        """Names of the columns extract_features() builds, in order"""
+        return self.telemetry_features.names()
+    
+    def check_model(self, model, metadata):
+        """Raise ValueError unless the model fits the live feature pipeline"""
+        window = self.window_engine.config() if self.window_engine is not None else None
+        if (metadata.get('window') or None) != window:
+            raise ValueError(f"model window config {metadata.get('window')} "
+                             f"does not match running config {window} (restart required)")
+        if 'features' in metadata and metadata['features'] != self.feature_names():
+            raise ValueError("model metadata features do not match the node's features")
+        expected = getattr(model, 'n_features_in_', self.n_features)
+        if expected != self.n_features:
+            raise ValueError(f"model expects {expected} features, node builds {self.n_features}")
+        if hasattr(model, 'regimes'):
+            # Per-regime models route on columns of the feature row
+            names = self.feature_names()
+            routed = [names[column] for column in model.columns]
+            if routed != model.keys:
+                raise ValueError(f"model routes regimes on {model.keys}, "
+                                 f"node builds {routed} in those columns")
+    
+    def reload_model(self):
+        """
+        Hot-swap a retrained model: load, validate, warm up, then swap the
+        reference the batcher scores with. Runs off the MQTT thread; scoring
+        continues on the old model until the swap.
+        """
+        if self.batcher is None:
+            log.warning("Model reload ignored: node is not in monitor mode")
+            return False
+        if self.detector == 'streaming':
+            log.warning("Model reload ignored: the streaming detector uses no trained model")
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            log.warning("Model reload already in progress")
+            return False
+        
+        try:
+            import numpy as np
+            
+            started = time.perf_counter()
+            model, metadata, path = self.read_model()
+            self.check_model(model, metadata)
+            
+            # Warm up (first-call allocations, lazy imports) and sanity-check output
+            scores = model.decision_function(np.zeros((self.batcher.max_batch, self.n_features)))
+            if scores.shape != (self.batcher.max_batch,) or not np.isfinite(scores).all():
+                raise ValueError("warm-up scoring returned invalid scores")
+            
+            # Single reference assignments: the next batch uses the new model
+            self.model = model
+            if self.workers > 0:
+                # Publish to shared memory and keep only the mapped copy here
+                self.model = self.batcher.swap_model(model)
+            else:
+                self.batcher.score_fn = self.score_fn()
+                if self.stage_timers_active():
+                    self.stage_timers.attach(self.profile_hooks())  # Time the new score_fn
+            self.model_generation += 1
+            log.info("Model hot-swapped", extra=fields(
+                event="model_reload", path=path, generation=self.model_generation,
+                ms=round((time.perf_counter() - started) * 1000, 1)))
+            return True
+        except Exception as e:
+            log.error("Model reload rejected, keeping current model",
+                      extra=fields(event="model_reload_failed", error=str(e)))
+            return False
+        finally:
+            self._reload_lock.release()
+    
+    def profile_hooks(self):
+        """(object, attribute, stage) for each hot-path entry point"""
+        return [
+            (self.client, 'on_message', 'on_message'),
+            (self.decoder, 'decode_into', 'decode'),
+            (self.decoder, 'decode_frame', 'decode'),
+            (self.decoder, 'frame_into', 'decode'),
+            (self.telemetry_features, 'fill_window', 'features'),
+            (self.telemetry_features, 'fill_window_rows', 'features'),
+            (self.batcher, 'submit', 'enqueue'),
+            (self.batcher, 'submit_block', 'enqueue'),
+            (self.batcher, 'score_fn', 'score'),        # In-process scoring only
+            (self.batcher, 'result_fn', 'result'),
+            (self, 'trigger_intervention', 'intervention'),
+        ]
+    
+    def set_stage_timers(self, enabled):
+        """Switch the per-stage timers on or off"""
+        self.load_profiler()
+        if self.profile_capture.running:
+            log.warning("Profile capture running; stage timers unchanged")
+            return
+        if enabled:
+            self.stage_timers.attach(self.profile_hooks())
+        else:
+            self.stage_timers.detach()
+        log.info(f"Stage timers {'on' if enabled else 'off'}",
+                 extra=fields(event="stage_timers", enabled=enabled))
+    
+    def start_profile(self, mode='sample', seconds=None):
+        """Capture a profile in the background (see hotpath_profiler.py)"""
+        from hotpath_profiler import PROFILE_SECONDS
+        self.load_profiler()
+        if self.stage_timers.active and mode == 'cprofile':
+            log.warning("Stage timers are on; the cProfile capture includes their cost")
+        try:
+            if not self.profile_capture.start(mode, seconds or PROFILE_SECONDS):
+                log.warning("Profile capture already running")
+        except ValueError as e:
+            log.warning(str(e))
     
     def on_connect(self, client, userdata, flags, rc, properties):
         """MQTT connection callback"""
         if rc == 0:
-            print(f"✓ Connected to MQTT broker at {BROKER}:{PORT}")
-            # Subscribe to telemetry and interventions
-            client.subscribe("ics/telemetry/data")
-            client.subscribe("ics/security/intervention")
-            print("  Subscribed to: ics/telemetry/data, ics/security/intervention")
+            log.info(f"Connected to MQTT broker at {BROKER}:{PORT}",
+                     extra=fields(event="mqtt_connected"))
+            # Subscribe to telemetry (JSON, binary and frames) and interventions
+            topics = [TELEMETRY_FRAME_TOPIC, INTERVENTION_TOPIC, CONTROL_TOPIC]
+            if not self.frames_only:
+                topics[:0] = [TELEMETRY_TOPIC, TELEMETRY_BIN_TOPIC]
+            for topic in topics:
+                client.subscribe(topic)
+            log.info(f"Subscribed to: {', '.join(topics)}", extra=fields(topics=topics))
         else:
-            print(f"✗ MQTT connection failed with code {rc}")
+            log.error(f"MQTT connection failed with code {rc}",
+                      extra=fields(event="mqtt_connect_failed", rc=str(rc)))
     
     def on_message(self, client, userdata, msg):
         """MQTT message callback"""
+        counter = self.received_metrics.get(msg.topic)
+        if counter is not None:
+            counter.inc()
         try:
+            if msg.topic == TELEMETRY_TOPIC or msg.topic == TELEMETRY_BIN_TOPIC:
+                # Telemetry is decoded straight into a feature row, not via json.loads
+                self.process_telemetry(msg.payload)
+                return
+            if msg.topic == TELEMETRY_FRAME_TOPIC:
+                self.process_frame(msg.payload)
+                return
+            
             payload = json.loads(msg.payload.decode())
             
-            if msg.topic == "ics/telemetry/data":
-                self.process_telemetry(payload)
-            elif msg.topic == "ics/security/intervention":
+            if msg.topic == INTERVENTION_TOPIC:
                 self.process_intervention(payload)
+            elif msg.topic == CONTROL_TOPIC:
+                self.process_control(payload)
                 
-        except json.JSONDecodeError:
-            print(f"⚠ Invalid JSON received on {msg.topic}")
-        except Exception as e:
-            print(f"⚠ Error processing message: {e}")
+        except ValueError:
+            if msg.topic in self.invalid_metrics:
+                self.invalid_metrics[msg.topic].inc()
+            self.invalid_log.emit("Invalid payload received", key=msg.topic, topic=msg.topic)
+        except Exception:
+            log.exception("Error processing message", extra=fields(topic=msg.topic))
     
-    def process_telemetry(self, data):
-        """Process incoming telemetry data"""
-        timestamp = data.get('timestamp', datetime.now().isoformat())
-        
-        if self.mode == 'monitor' and self.model_loaded:
-            # Active anomaly detection
-            try:
-                # Extract features
-                features = np.array([[
-                    data.get('flow_rate', 0),
-                    data.get('pressure', 0),
-                    data.get('temperature', 0),
-                    data.get('motor_current', 0)
-                ]])
-                
-                # Predict (-1 = anomaly, 1 = normal)
-                prediction = self.model.predict(features)[0]
-                
-                # Get anomaly score
-                score = self.model.decision_function(features)[0]
-                
-                if prediction == -1:
-                    # Anomaly detected
-                    self.anomaly_count += 1
-                    self.trigger_intervention(data, score)
-                else:
-                    self.normal_count += 1
-                    
-            except Exception as e:
-                print(f"⚠ Inference error: {e}")
-                self.normal_count += 1
+    def process_telemetry(self, payload):
+        """Process an incoming telemetry payload (raw bytes)"""
+        if self.workers > 0 and self.batcher is not None:
+            # Sharded: the worker processes decode; only route the payload here
+            self.batcher.submit(payload)
+        elif self.batcher is not None:
+            # Active anomaly detection - queue for batched scoring
+            row, data = self.extract_features(payload)
+            self.batcher.submit(row, data)
         else:
-            # Collect mode - just count messages
+            # Collect mode - just count messages (nothing is decoded)
             self.normal_count += 1
         
-        # Periodic status update
+        self.maybe_log_status()
+    
+    def process_frame(self, payload):
+        """Process a multi-sample telemetry frame (raw bytes)"""
+        if self.workers > 0 and self.batcher is not None:
+            # Sharded: split by device and routed without decoding the samples
+            self.batcher.submit(payload)
+        elif self.batcher is not None:
+            # The whole frame becomes one batch; records are only read for anomalies
+            X, records = self.extract_frame_features(payload)
+            self.batcher.submit_block(X, records)
+        else:
+            # Collect mode - just count samples (from the frame header)
+            self.normal_count += int.from_bytes(payload[2:4], 'little')
+        self.frame_count += 1
+        if self.frame_samples_metric is not None:
+            self.frame_samples_metric.inc(int.from_bytes(payload[2:4], 'little'))
+        
+        self.maybe_log_status()
+    
+    def maybe_log_status(self):
+        """Periodic status update"""
         if time.time() - self.last_log_time > 60:
             self.log_status()
             self.last_log_time = time.time()
     
+    def extract_features(self, payload):
+        """
+        Decode a payload into a new feature row in training order (FEATURES,
+        then window features). Returns (row, decoded record).
+        """
+        row = self.telemetry_features.new_row()
+        data = self.decoder.decode_into(payload, row)
+        self.telemetry_features.fill_window(data, row, time.time())
+        return row, data
+    
+    def extract_frame_features(self, payload):
+        """
+        Decode a frame into a new (n, n_features) matrix, one row per sample.
+        Returns (X, FrameRecords).
+        """
+        records = self.decoder.decode_frame(payload)
+        X = self.telemetry_features.new_rows(len(records))
+        self.decoder.frame_into(records, X)
+        self.telemetry_features.fill_window_rows(records.array['device'].tolist(), X,
+                                                 records.array['ts'].tolist())
+        return X, records
+    
+    def on_scored(self, scores, contexts, latencies):
+        """Handle one scored batch (runs on the batcher thread)"""
+        # decision_function < 0 is exactly what predict() reports as -1;
+        # contexts may be a lazy frame, so only anomalous entries are read
+        self.latency_metric.observe_many(latencies)
+        self.batch_metric.observe(len(scores))
+        anomalies = (scores < 0).nonzero()[0]
+        self.normal_count += len(scores) - len(anomalies)
+        for i in anomalies:
+            self.anomaly_count += 1
+            self.trigger_intervention(contexts[i], scores[i])
+    
+    def process_control(self, data):
+        """Handle control commands (model reload, profiling)"""
+        command = data.get('command')
+        if command == 'reload_model':
+            log.info("Model reload requested on control topic",
+                     extra=fields(event="control", command=command))
+            threading.Thread(target=self.reload_model, name="model-reload", daemon=True).start()
+        elif command == 'profile':
+            self.start_profile(data.get('mode', 'sample'), data.get('seconds'))
+        elif command == 'stage_timers':
+            self.set_stage_timers(bool(data.get('enabled', not self.stage_timers_active())))
+        else:
+            log.warning("Unknown control command", extra=fields(event="control", command=command))
+    
     def process_intervention(self, data):
         """Process received interventions (echo)"""
+        if data.get('source') == NODE_SOURCE:
+            return  # Our own dispatch, already counted by trigger_intervention
         self.intervention_count += 1
-        print(f"📢 Intervention received: {data.get('command', 'unknown')}")
+        log.info("Intervention received", extra=fields(
+            event="intervention_received", command=data.get('command', 'unknown'),
+            source=data.get('source')))
     
     def trigger_intervention(self, data, score):
-        """Trigger a security intervention"""
+        """Trigger a security intervention (queued; published by the dispatcher)"""
         intervention = {
-            "command": "pump_shutdown",
             "reason": "AI detected anomaly",
+            "source": NODE_SOURCE,
             "anomaly_score": float(score),
             "timestamp": datetime.now().isoformat(),
+            "device_id": data.get('device_id'),
+            "sample_timestamp": data.get('timestamp'),
             "sensor_data": {
                 "flow_rate": data.get('flow_rate'),
                 "pressure": data.get('pressure'),
@@ -193,65 +815,202 @@ class ICSAISecurityNode:
             }
         }
         self.intervention_count += 1
+        queued = self.dispatcher.submit("pump_shutdown", intervention)
         
-        print(f"\n{'!'*60}")
-        print(f"🚨 ANOMALY DETECTED - INTERVENTION TRIGGERED")
-        print(f"{'!'*60}")
-        print(f"  Score: {score:.4f} (threshold: {ANOMALY_THRESHOLD})")
-        print(f"  Flow: {data.get('flow_rate', 'N/A')}")
-        print(f"  Pressure: {data.get('pressure', 'N/A')}")
-        print(f"  Temperature: {data.get('temperature', 'N/A')}")
-        print(f"  Current: {data.get('motor_current', 'N/A')}")
-        print(f"  Command: pump_shutdown published")
-        print(f"{'!'*60}\n")
+        # One line per anomaly at most ANOMALY_LOG_BURST times per interval
+        self.anomaly_log.emit(
+            "Anomaly detected - intervention triggered", key=intervention["device_id"],
+            score=round(float(score), 4), threshold=ANOMALY_THRESHOLD,
+            device_id=intervention["device_id"], sensor_data=intervention["sensor_data"],
+            command="pump_shutdown", queued=queued)
     
     def log_status(self):
-        """Log periodic status"""
-        total = self.normal_count + self.anomaly_count
-        anomaly_rate = (self.anomaly_count / total * 100) if total > 0 else 0
+        """Log periodic status (one structured record)"""
+        from structured_logging import dropped_records
+        
+        # Summaries of throttled events from windows that have ended
+        self.anomaly_log.flush()
+        self.invalid_log.flush()
         
-        print(f"\n--- Status Update ---")
-        print(f"  Mode: {self.mode}")
-        print(f"  Total messages: {total}")
-        print(f"  Normal: {self.normal_count}")
-        print(f"  Anomalies: {self.anomaly_count}")
-        print(f"  Anomaly rate: {anomaly_rate:.2f}%")
-        print(f"  Interventions: {self.intervention_count}")
-        print(f"-------------------\n")
+        def rounded(stats):
+            return {key: round(value, 3) if isinstance(value, float) else value
+                    for key, value in stats.items()}
+        
+        total = self.normal_count + self.anomaly_count
+        status = {
+            "event": "status",
+            "mode": self.mode,
+            "total": total,
+            "normal": self.normal_count,
+            "anomalies": self.anomaly_count,
+            "anomaly_rate_pct": round((self.anomaly_count / total * 100) if total > 0 else 0, 2),
+            "interventions": self.intervention_count,
+            "frames": self.frame_count,
+            "model_generation": self.model_generation,
+            "log_dropped": dropped_records(),
+            "log_suppressed": self.anomaly_log.suppressed + self.invalid_log.suppressed,
+        }
+        if self.batcher is not None:
+            status["batcher"] = rounded(self.batcher.stats())
+        if self.dispatcher is not None:
+            status["dispatcher"] = rounded(self.dispatcher.stats())
+        if self.streaming is not None:
+            status["streaming"] = self.streaming.stats()
+        if self.stage_timers_active():
+            status["stages"] = {stage: {"calls": calls, "mean_us": round(mean * 1e6, 1),
+                                        "total_s": round(total, 3)}
+                                for stage, calls, mean, total in self.stage_timers.summary()}
+        log.info(f"Status: {total} samples, {self.anomaly_count} anomalies, "
+                 f"{self.intervention_count} interventions", extra=fields(**status))
     
     def start(self):
         """Start the AI security node"""
-        print(f"\nStarting AI Security Node in {self.mode} mode...\n")
+        log.info(f"Starting AI Security Node in {self.mode} mode",
+                 extra=fields(event="start", mode=self.mode, workers=self.workers))
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.start_profile())
+        signal.signal(signal.SIGUSR2,
+                      lambda signum, frame: self.set_stage_timers(not self.stage_timers_active()))
+        # systemctl stop: leave loop_forever so queued work and log lines are flushed
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.client.disconnect())
+        self.start_metrics()
+        self.start_workers()
         
         try:
             self.client.connect(BROKER, PORT, 60)
             self.client.loop_forever()
+            log.info("Shutting down AI Security Node (SIGTERM)", extra=fields(event="stop"))
+            self.stop_workers()
+            self.log_status()
         except KeyboardInterrupt:
-            print("\n\nShutting down AI Security Node...")
+            log.info("Shutting down AI Security Node", extra=fields(event="stop"))
+            self.stop_workers()
             self.log_status()
             self.client.disconnect()
-        except Exception as e:
-            print(f"\n✗ Error: {e}")
+        except Exception:
+            log.exception("AI Security Node stopped on error", extra=fields(event="stop"))
+            self.stop_workers()
             self.client.disconnect()
+        self.anomaly_log.flush(force=True)
+        self.invalid_log.flush(force=True)
+    
+    def start_metrics(self):
+        """Serve the metrics endpoint and/or textfile export, if configured"""
+        if self.metrics_port is None and not self.metrics_textfile:
+            return
+        from metrics_exporter import MetricsServer
+        server = MetricsServer(self.metrics, port=self.metrics_port, bind=self.metrics_bind,
+                               textfile=self.metrics_textfile)
+        try:
+            server.start()
+        except OSError as e:
+            log.warning(f"Metrics endpoint unavailable on {self.metrics_bind}:{self.metrics_port}",
+                        extra=fields(error=str(e)))
+            return
+        self.metrics_server = server
+        if self.metrics_port is not None:
+            log.info(f"Metrics at http://{self.metrics_bind}:{server.port}/metrics")
+        if self.metrics_textfile:
+            log.info(f"Metrics textfile: {self.metrics_textfile}")
+    
+    def start_workers(self):
+        """Start the dispatcher, the batcher and the model watcher (monitor mode)"""
+        if self.batcher is None:
+            return
+        self.dispatcher.start()
+        self.batcher.start()
+        if self.streaming is not None:
+            self.streaming.start()  # Periodic checkpoints, off the scoring thread
+        if self.workers > 0:
+            self.model = self.batcher.model  # Drop our private copy for the shared one
+        if self.detector == 'streaming':
+            return  # No model files to watch
+        
+        from model_watcher import ModelWatcher
+        self.watcher = ModelWatcher([self.model_path, self.compiled_model_path,
+                                     self.metadata_path],
+                                    self.reload_model, MODEL_POLL_INTERVAL)
+        self.watcher.start()
+    
+    def stop_workers(self):
+        """Stop the model watcher, drain the batcher, then the dispatcher"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.batcher is not None:
+            self.batcher.stop()
+        if self.streaming is not None:
+            self.streaming.stop()
+            self.streaming.checkpoint()  # Batcher drained: the state is final
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()  # Last, so the final textfile has the drained counts
+            self.metrics_server = None
 
 
 def main():
-    import sys
+    import argparse
+    with STARTUP.measure("import structured_logging"):
+        from structured_logging import LOG_FORMAT, LOG_FORMATS, LOG_LEVEL, \
+            setup_logging, stop_logging
+    
+    parser = argparse.ArgumentParser(description="ICS AI Security Node")
+    parser.add_argument("mode", nargs="?", default="collect",
+                        type=str.lower, choices=["collect", "monitor"],
+                        help="collect (log only) or monitor (active detection)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and model-load time per component")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Score in N worker processes sharded by device ID "
+                             "(default: 0, score in this process)")
+    parser.add_argument("--frames-only", action="store_true",
+                        help="Only read telemetry frames (when telemetry_bridge.py "
+                             "aggregates the single-sample topics)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Prometheus metrics port (default: {METRICS_PORT}, 0 disables)")
+    parser.add_argument("--metrics-bind", default=METRICS_BIND,
+                        help=f"Metrics listen address (default: {METRICS_BIND})")
+    parser.add_argument("--metrics-textfile", default=None,
+                        help="Also write metrics to this file for node_exporter's "
+                             "textfile collector")
+    parser.add_argument("--stage-timers", action="store_true",
+                        help="Time each hot-path stage (toggle later with SIGUSR2)")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR,
+                        help="Where SIGUSR1/control-topic profiles are written")
+    parser.add_argument("--detector", default="forest", choices=DETECTORS,
+                        help="Monitor mode scoring: trained forest, adaptive streaming "
+                             "baseline, or forest confirmed by the baseline (default: forest)")
+    parser.add_argument("--streaming-state", default=STREAMING_STATE,
+                        help="Streaming detector checkpoint file")
+    parser.add_argument("--log-format", default=LOG_FORMAT, choices=LOG_FORMATS,
+                        help=f"Runtime log format (default: {LOG_FORMAT})")
+    parser.add_argument("--log-level", default=LOG_LEVEL, type=str.upper,
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help=f"Runtime log level (default: {LOG_LEVEL})")
     
-    # Parse mode from command line
-    mode = 'collect'
-    if len(sys.argv) > 1:
-        mode = sys.argv[1].lower()
-        if mode not in ['collect', 'monitor']:
-            print(f"Invalid mode: {mode}")
-            print("Usage: python3 ai_security_node_final.py [collect|monitor]")
-            sys.exit(1)
+    args = parser.parse_args()
+    if args.workers > 0 and args.detector != 'forest':
+        parser.error("--detector streaming/both keeps its state in this process; "
+                     "it cannot be combined with --workers")
+    # Collect mode logs little: write directly instead of starting the queue writer
+    listener = setup_logging(args.log_format, args.log_level, queued=args.mode == 'monitor')
     
     # Create and start the node
-    node = ICSAISecurityNode(mode=mode)
-    node.start()
+    node = ICSAISecurityNode(mode=args.mode, workers=args.workers,
+                             frames_only=args.frames_only,
+                             metrics_port=args.metrics_port or None,
+                             metrics_bind=args.metrics_bind,
+                             metrics_textfile=args.metrics_textfile,
+                             stage_timers=args.stage_timers,
+                             profile_dir=args.profile_dir,
+                             detector=args.detector,
+                             streaming_state=args.streaming_state)
+    if args.profile_startup:
+        STARTUP.report()
+    try:
+        node.start()
+    finally:
+        stop_logging(listener)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+ICS AI Security Node - Micro-batched Inference
+Queues decoded telemetry rows off the MQTT callback thread and scores them
+in vectorized batches on a dedicated worker thread.
+
+A batch is flushed when it reaches `max_batch` rows or when the oldest queued
+row has waited `max_delay` seconds, whichever comes first, so throughput
+scales with message rate while per-message latency stays bounded.
+
+Rows that arrive together (a multi-sample telemetry frame) can be submitted
+as one block: it is queued as a single item and scored as its own batch,
+without being copied row by row.
+
+Usage (from the AI node):
+  batcher = MicroBatcher(model.decision_function, on_scored, n_features=9)
+  batcher.start()
+  batcher.submit(row, context)
+  batcher.submit_block(X, contexts)   # contexts: any sequence of len(X)
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Defaults
+BATCH_SIZE = 64          # Max rows per scoring call
+BATCH_MAX_DELAY = 0.020  # Max seconds the oldest row may wait (20 ms)
+QUEUE_SIZE = 10000       # Rows buffered before new samples are dropped
+LATENCY_WINDOW = 4096    # Recent latencies kept for percentile reporting
+
+log = logging.getLogger("ics.batcher")
+
+
+class _Block:
+    """Rows submitted together; scored as one batch"""
+
+    __slots__ = ('X', 'contexts', 'submitted')
+
+    def __init__(self, X, contexts, submitted):
+        self.X = X
+        self.contexts = contexts
+        self.submitted = submitted
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, result_fn, n_features,
+                 max_batch=BATCH_SIZE, max_delay=BATCH_MAX_DELAY,
+                 queue_size=QUEUE_SIZE):
+        """
+        Initialize the batcher.
+
+        Args:
+            score_fn: callable mapping an (n, n_features) array to n scores
+                      (e.g. IsolationForest.decision_function)
+            result_fn: callable(scores, contexts, latencies) run on the
+                       worker thread after each batch is scored
+            n_features: width of each submitted row
+            max_batch: flush when this many rows are queued
+            max_delay: flush when the oldest row has waited this long (s)
+            queue_size: bound on queued items (rows or blocks); overflow is
+                        counted and dropped
+        """
+        self.score_fn = score_fn
+        self.result_fn = result_fn
+        self.n_features = n_features
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buffer = np.empty((max_batch, n_features), dtype=np.float64)
+        self._pending = None  # Block that ended the previous collect
+        self._thread = None
+        self._running = False
+
+        # Statistics (written only by the worker thread, except `dropped`)
+        self.batches = 0
+        self.samples = 0
+        self.dropped = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._latencies_lock = threading.Lock()  # stats() reads from other threads
+
+    def start(self):
+        """Start the scoring worker thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-batcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the worker after draining rows already queued"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row, context=None):
+        """
+        Queue one feature row for scoring. Safe to call from the paho thread.
+
+        Returns:
+            True if queued, False if the queue was full and the row was dropped
+        """
+        try:
+            self._queue.put_nowait((row, context, time.perf_counter()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def submit_block(self, X, contexts):
+        """
+        Queue an (n, n_features) array of rows for scoring as one batch.
+        contexts[i] belongs to X[i]; it is only indexed for anomalies.
+
+        Returns:
+            True if queued, False if the queue was full and the block was dropped
+        """
+        try:
+            self._queue.put_nowait(_Block(X, contexts, time.perf_counter()))
+            return True
+        except queue.Full:
+            self.dropped += len(X)
+            return False
+
+    def qsize(self):
+        """Approximate number of rows waiting to be scored"""
+        return self._queue.qsize()
+
+    def _collect(self):
+        """
+        Block for the first row, then gather more until size or deadline.
+        A block is returned on its own; one that arrives mid-batch ends the
+        batch and is returned by the next call.
+        """
+        first, self._pending = self._pending, None
+        if first is None:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                return []
+        if isinstance(first, _Block):
+            return first
+
+        items = [first]
+        deadline = first[2] + self.max_delay
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if isinstance(item, _Block):
+                self._pending = item
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        """Worker loop: collect, score, hand results back"""
+        while self._running or not self._queue.empty() or self._pending is not None:
+            items = self._collect()
+            if isinstance(items, _Block):
+                self._score_block(items)
+            elif items:
+                self._score(items)
+
+    def _score(self, items):
+        """Score one batch with a single vectorized call"""
+        n = len(items)
+        X = self._buffer[:n]
+        contexts = []
+        for i, (row, context, _) in enumerate(items):
+            X[i] = row
+            contexts.append(context)
+
+        try:
+            scores = self.score_fn(X)
+        except Exception as e:
+            self.errors += 1
+            log.error(f"Batch inference error ({n} samples): {e}")
+            return
+
+        done = time.perf_counter()
+        latencies = [done - item[2] for item in items]
+        with self._latencies_lock:
+            self._latencies.extend(latencies)
+        self.batches += 1
+        self.samples += n
+
+        self._deliver(scores, contexts, latencies)
+
+    def _deliver(self, scores, contexts, latencies):
+        """Hand a scored batch to result_fn; a failure must not stop scoring"""
+        try:
+            self.result_fn(scores, contexts, latencies)
+        except Exception:
+            self.errors += 1
+            log.exception(f"Result handler error ({len(scores)} samples)")
+
+    def _score_block(self, block):
+        """Score a submitted block in place with one vectorized call"""
+        n = len(block.X)
+        try:
+            scores = self.score_fn(block.X)
+        except Exception as e:
+            self.errors += 1
+            log.error(f"Batch inference error ({n} samples): {e}")
+            return
+
+        latencies = [time.perf_counter() - block.submitted] * n
+        with self._latencies_lock:
+            self._latencies.extend(latencies)
+        self.batches += 1
+        self.samples += n
+
+        self._deliver(scores, block.contexts, latencies)
+
+    def stats(self):
+        """Return batch and latency statistics (latencies in ms)"""
+        with self._latencies_lock:
+            latencies = np.array(self._latencies, dtype=np.float64)
+        latencies *= 1000.0
+        stats = {
+            "batches": self.batches,
+            "samples": self.samples,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queue_depth": self.qsize(),
+            "mean_batch_size": (self.samples / self.batches) if self.batches else 0.0,
+        }
+        if latencies.size:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats.update(latency_p50_ms=p50, latency_p95_ms=p95,
+                         latency_p99_ms=p99, latency_max_ms=latencies.max())
+        return stats
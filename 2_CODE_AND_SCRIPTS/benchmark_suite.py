@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+ICS AI End-to-end Benchmark Suite
+Measures how long it takes from a telemetry publish to a scored verdict and
+to the resulting intervention, by driving ICSAISecurityNode in-process on
+the stub MQTT broker (load_generator.StubBroker) with synthetic load.
+
+Grid: model size (n_estimators) x batch size x message rate. Per run:
+  detect_ms     sample queued for scoring -> verdict (batcher result callback)
+  intervene_ms  sample timestamp -> pump_shutdown published on the broker
+  throughput    samples scored per second of wall time
+  cpu_percent   CPU time of this process (and scoring workers) / wall time
+  rss_peak_mb   peak resident memory during the run (workers included)
+plus training time per n_estimators (train_model.train_model).
+
+ANOMALY_FRACTION of the devices send spoofed pressure readings so that
+interventions happen. The dispatcher's cooldown and rate limit are disabled
+during runs: every anomaly is published, so the path is measured rather
+than the throttling policy.
+
+Results are written as JSON (default 3_DATA_AND_ARTIFACTS/benchmarks/,
+named after the git commit), so runs from two commits can be compared.
+
+Usage:
+  python3 benchmark_suite.py                 # Default grid (~4 min)
+  python3 benchmark_suite.py --quick         # One short run per dimension
+  python3 benchmark_suite.py --estimators 50,200 --batch-sizes 16,256 --rates 2000
+  python3 benchmark_suite.py --compare old.json new.json   # Exit 1 on regression
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from load_generator import AttackWindow, LoadGenerator, StubBroker, TelemetryProfile, \
+    parse_time, TRAINING_DATA
+from structured_logging import setup_logging, stop_logging
+
+# Configuration
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "3_DATA_AND_ARTIFACTS", "benchmarks")
+INTERVENTION_TOPIC = "ics/security/intervention"
+
+# Defaults
+ESTIMATORS = [50, 100, 200]
+BATCH_SIZES = [16, 64, 256]
+RATES = [1000, 5000]
+DURATION = 10.0
+DEVICES = 500
+TRAINING_ROWS = 5000
+ANOMALY_FRACTION = 0.01   # Devices sending spoofed readings
+DRAIN_TIMEOUT = 10.0      # Seconds to wait for queued samples after a run
+RSS_INTERVAL = 0.05
+REGRESSION = 0.10         # Relative change flagged by --compare
+
+# Metrics compared by --compare: (path, higher is better)
+COMPARED = [
+    (('throughput',), True),
+    (('detect_ms', 'p50'), False),
+    (('detect_ms', 'p95'), False),
+    (('detect_ms', 'p99'), False),
+    (('intervene_ms', 'p95'), False),
+    (('cpu_percent',), False),
+    (('rss_peak_mb',), False),
+]
+RUN_KEY = ('n_estimators', 'batch_size', 'rate', 'workers', 'format')
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discard stdout (startup banners, model training output)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentiles(values):
+    """p50/p95/p99/max in ms of a list of seconds (None if empty)"""
+    if not values:
+        return None
+    ms = np.asarray(values, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "max": float(ms.max()), "count": int(ms.size)}
+
+
+def rss_kb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def cpu_seconds():
+    """User + system CPU of this process and its reaped children"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def git_revision():
+    """(short commit, dirty) of the working tree, or (None, None)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                cwd=here, capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    return commit or None, bool(status.strip())
+
+
+class RssSampler:
+    """Background sampler of peak RSS for this process plus extra pids"""
+
+    def __init__(self, pids_fn=None):
+        self.pids_fn = pids_fn or (lambda: [])
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak_kb
+
+    def _run(self):
+        while not self._stop.is_set():
+            total = rss_kb() + sum(rss_kb(pid) for pid in self.pids_fn())
+            self.peak_kb = max(self.peak_kb, total)
+            self._stop.wait(RSS_INTERVAL)
+
+
+class LatencyRecorder:
+    """Collects verdict latencies (batcher callback) and intervention arrivals"""
+
+    def __init__(self):
+        self.detect = []
+        self.intervene = []
+        self.scored = 0
+        self.anomalies = 0
+        self.interventions = 0
+        self.last_verdict = None
+
+    def wrap(self, result_fn):
+        def on_scored(scores, contexts, latencies):
+            self.detect.extend(latencies)
+            self.scored += len(scores)
+            self.anomalies += int((scores < 0).sum())
+            self.last_verdict = time.perf_counter()
+            result_fn(scores, contexts, latencies)
+        return on_scored
+
+    def on_intervention(self, message):
+        arrived = time.time()
+        try:
+            sent = parse_time(json.loads(message.payload).get('sample_timestamp'))
+        except ValueError:
+            return
+        self.interventions += 1
+        if sent is not None:
+            self.intervene.append(arrived - sent)
+
+
+def synthetic_training_data(profile, features, rows, seed=0):
+    """Normal rows in the node's feature order (fields the generator lacks are 0)"""
+    import pandas as pd
+    from load_generator import ANALOG
+
+    rng = np.random.default_rng(seed)
+    analog = profile.sample(profile.device_offsets(rows, rng), rng)
+    X = np.zeros((rows, len(features)))
+    for i, name in enumerate(ANALOG):
+        X[:, features.index(name)] = analog[:, i]
+    return pd.DataFrame(X, columns=features)
+
+
+def train_models(profile, estimators, directory, rows=TRAINING_ROWS):
+    """Train and export one model per forest size; returns (paths, timings)"""
+    import train_model
+    from ai_security_node_final import FEATURES
+
+    X = synthetic_training_data(profile, FEATURES, rows)
+    paths, timings = {}, []
+    for n in estimators:
+        path = os.path.join(directory, f"forest_{n}.pkl")
+        started = time.perf_counter()
+        with quiet():
+            model = train_model.train_model(X, n)
+        seconds = time.perf_counter() - started
+        with quiet():
+            compiled = train_model.save_compiled_model(model, X.iloc[:1000], path)
+            train_model.save_model(model, path, compiled, features=FEATURES)
+        paths[n] = path
+        timings.append({"n_estimators": n, "rows": rows, "train_s": seconds})
+        print(f"  Trained {n:>4} trees on {rows} rows in {seconds:.2f}s")
+    return paths, timings
+
+
+def run_once(model_path, profile, n_estimators, batch_size, rate, duration,
+             devices=DEVICES, workers=0, fmt='json', seed=0):
+    """One benchmark run against a fresh node; returns its result dict"""
+    from ai_security_node_final import ICSAISecurityNode
+    from intervention_dispatcher import TokenBucket
+
+    broker = StubBroker()
+    recorder = LatencyRecorder()
+    with quiet():
+        node = ICSAISecurityNode('monitor', workers, client=broker.client(),
+                                 model_path=model_path, batch_size=batch_size)
+    if node.batcher is None:
+        raise RuntimeError(f"node did not load {model_path}")
+    node.dispatcher.cooldown = 0.0
+    node.dispatcher.bucket = TokenBucket(rate=1e9, burst=1e9)
+    node.batcher.result_fn = recorder.wrap(node.batcher.result_fn)
+    broker.subscribe(INTERVENTION_TOPIC, recorder.on_intervention)
+
+    generator = LoadGenerator(broker.publish, profile, devices, rate, fmt,
+                              [AttackWindow('spoofing', 0.0, duration)], ANOMALY_FRACTION,
+                              seed=seed)
+    # Node output (anomaly log lines) is part of the cost, but not of the report
+    with quiet():
+        node.client.connect()
+        node.start_workers()
+        pids = node.batcher.worker_pids if workers > 0 else None
+        sampler = RssSampler(pids).start()
+        cpu_started = cpu_seconds()
+        started = time.perf_counter()
+
+        generated = generator.run(duration)
+        deadline = time.perf_counter() + DRAIN_TIMEOUT
+        while recorder.scored < generator.samples - node.batcher.dropped:
+            if time.perf_counter() > deadline:
+                break
+            time.sleep(0.01)
+        finished = recorder.last_verdict or time.perf_counter()
+        node.stop_workers()
+
+        cpu = cpu_seconds() - cpu_started
+        wall = time.perf_counter() - started
+        rss_peak = sampler.stop()
+
+    return {
+        "n_estimators": n_estimators,
+        "batch_size": batch_size,
+        "rate": rate,
+        "workers": workers,
+        "format": fmt,
+        "devices": devices,
+        "duration_s": duration,
+        "published": generator.samples,
+        "scored": recorder.scored,
+        "dropped": node.batcher.dropped,
+        "anomalies": recorder.anomalies,
+        "interventions": recorder.interventions,
+        "throughput": recorder.scored / max(finished - started, 1e-9),
+        "generator_rate": generated["achieved_rate"],
+        "generator_lag_s": generated["max_lag_s"],
+        "saturated": generated["saturated"] or recorder.scored < generator.samples,
+        "detect_ms": percentiles(recorder.detect),
+        "intervene_ms": percentiles(recorder.intervene),
+        "cpu_percent": 100.0 * cpu / wall,
+        "rss_peak_mb": rss_peak / 1024.0,
+    }
+
+
+def format_run(run):
+    detect = run["detect_ms"] or {}
+    intervene = run["intervene_ms"] or {}
+    return (f"  trees {run['n_estimators']:>4}  batch {run['batch_size']:>4}  "
+            f"rate {run['rate']:>6}  {run['throughput']:8.0f} msg/s  "
+            f"detect p50/p95/p99 {detect.get('p50', 0):6.2f}/{detect.get('p95', 0):6.2f}/"
+            f"{detect.get('p99', 0):6.2f} ms  intervene p95 {intervene.get('p95', 0):6.2f} ms  "
+            f"cpu {run['cpu_percent']:5.1f}%  rss {run['rss_peak_mb']:6.1f} MB"
+            f"{'  ⚠ saturated' if run['saturated'] else ''}")
+
+
+def run_suite(estimators, batch_sizes, rates, duration, devices=DEVICES, workers=0,
+              fmt='json', profile_path=TRAINING_DATA):
+    """Train the models and run the whole grid; returns the results document"""
+    commit, dirty = git_revision()
+    profile = TelemetryProfile.from_csv(profile_path)
+    results = {
+        "suite": "ics_e2e",
+        "version": 1,
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now().isoformat(),
+        "host": {
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "node": platform.node(),
+        },
+        "config": {"estimators": estimators, "batch_sizes": batch_sizes, "rates": rates,
+                   "duration_s": duration, "devices": devices, "workers": workers,
+                   "format": fmt, "anomaly_fraction": ANOMALY_FRACTION},
+        "training": [],
+        "runs": [],
+    }
+    # The node's log records take their production path (queue + writer thread)
+    with tempfile.TemporaryDirectory(prefix="ics_bench_") as directory, \
+            open(os.devnull, "w") as devnull:
+        listener = setup_logging(stream=devnull)
+        try:
+            print("Training models...")
+            paths, results["training"] = train_models(profile, estimators, directory)
+            print(f"Running {len(estimators) * len(batch_sizes) * len(rates)} configurations "
+                  f"of {duration:.0f}s each...")
+            for n in estimators:
+                for batch_size in batch_sizes:
+                    for rate in rates:
+                        run = run_once(paths[n], profile, n, batch_size, rate, duration,
+                                       devices, workers, fmt)
+                        results["runs"].append(run)
+                        print(format_run(run))
+        finally:
+            stop_logging(listener)
+    return results
+
+
+def _metric(run, path):
+    value = run
+    for key in path:
+        value = (value or {}).get(key)
+    return value
+
+
+def compare(old, new, threshold=REGRESSION):
+    """Print per-run metric changes; returns the number of regressions"""
+    print(f"Comparing {old.get('commit')} ({old.get('created', '?')[:19]}) -> "
+          f"{new.get('commit')} ({new.get('created', '?')[:19]})")
+    baseline = {tuple(run[k] for k in RUN_KEY): run for run in old["runs"]}
+    regressions = matched = 0
+    for run in new["runs"]:
+        key = tuple(run[k] for k in RUN_KEY)
+        before = baseline.get(key)
+        if before is None:
+            continue
+        matched += 1
+        print(f"\n  trees {key[0]}, batch {key[1]}, rate {key[2]}, workers {key[3]}, {key[4]}")
+        for path, higher_is_better in COMPARED:
+            a, b = _metric(before, path), _metric(run, path)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a if a else 0.0
+            worse = change < -threshold if higher_is_better else change > threshold
+            regressions += worse
+            print(f"    {'.'.join(path):<16} {a:10.2f} -> {b:10.2f}  ({change:+7.1%})"
+                  f"{'  ✗ regression' if worse else ''}")
+    if not matched:
+        print("⚠ No configurations in common")
+    print(f"\n{'✓ No regressions' if not regressions else f'✗ {regressions} regressions'} "
+          f"(threshold {threshold:.0%})")
+    return regressions
+
+
+def parse_list(text):
+    return [int(item) for item in text.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ICS AI end-to-end benchmark suite")
+    parser.add_argument("--estimators", type=parse_list, default=ESTIMATORS,
+                        help="Forest sizes, comma-separated (default: 50,100,200)")
+    parser.add_argument("--batch-sizes", type=parse_list, default=BATCH_SIZES,
+                        help="Scoring batch sizes (default: 16,64,256)")
+    parser.add_argument("--rates", type=parse_list, default=RATES,
+                        help="Samples per second (default: 1000,5000)")
+    parser.add_argument("--duration", type=float, default=DURATION,
+                        help=f"Seconds per run (default: {DURATION:.0f})")
+    parser.add_argument("--devices", type=int, default=DEVICES)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Sharded scoring processes (default: 0, in-process)")
+    parser.add_argument("--format", choices=["json", "bin", "frame"], default="json")
+    parser.add_argument("--quick", action="store_true",
+                        help="100 trees, batch 64, 1000 msg/s, 3 s")
+    parser.add_argument("--output", default=None,
+                        help="Results file (default: benchmarks/bench_<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two results files instead of running")
+    parser.add_argument("--threshold", type=float, default=REGRESSION,
+                        help=f"Relative change counted as a regression (default: {REGRESSION})")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(old, new, args.threshold) else 0
+
+    if args.quick:
+        args.estimators, args.batch_sizes, args.rates, args.duration = [100], [64], [1000], 3.0
+    results = run_suite(args.estimators, args.batch_sizes, args.rates, args.duration,
+                        args.devices, args.workers, args.format)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_{results['commit'] or 'nogit'}_{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+ICS AI Compiled Isolation Forest
+Flat, array-backed export of a fitted sklearn IsolationForest plus a
+pure-NumPy scorer that reproduces its decision_function bit-for-bit.
+
+All trees are concatenated into one set of node arrays (feature, threshold,
+left/right child, missing-value direction and leaf path length). Leaves point
+to themselves, so a batch is scored by walking every (sample, tree) pair one
+level per step for `max_depth` steps - no Python loop over trees or rows.
+
+Scoring only needs numpy; sklearn is imported by export_forest() alone.
+
+Usage:
+  python3 compiled_forest.py model.pkl [model.npz]   # Export a trained model
+  model = load_forest("model.npz")                    # Also loads regime forests
+"""
+
+import numpy as np
+
+# Array names stored in the .npz file
+ARRAYS = ['roots', 'feature', 'threshold', 'left', 'right',
+          'missing_left', 'leaf_value']
+
+
+def _contamination(value):
+    """IsolationForest contamination: a float or "auto" (older archives: str(float))"""
+    value = value.item() if hasattr(value, 'item') else value
+    return value if value == 'auto' else float(value)
+
+
+class CompiledForest:
+    def __init__(self, arrays):
+        """
+        Build a scorer from exported arrays (see export_forest).
+
+        Args:
+            arrays: mapping with the node arrays in ARRAYS plus the scalars
+                    max_depth, denominator, offset, n_features,
+                    n_estimators and contamination
+        """
+        self.roots = np.asarray(arrays['roots'], dtype=np.intp)
+        self.feature = np.asarray(arrays['feature'], dtype=np.intp)
+        self.threshold = np.asarray(arrays['threshold'], dtype=np.float64)
+        self.left = np.asarray(arrays['left'], dtype=np.intp)
+        self.right = np.asarray(arrays['right'], dtype=np.intp)
+        self.missing_left = np.asarray(arrays['missing_left'], dtype=bool)
+        self.leaf_value = np.asarray(arrays['leaf_value'], dtype=np.float64)
+        self.max_depth = int(arrays['max_depth'])
+        self.denominator = float(arrays['denominator'])
+        self.offset_ = float(arrays['offset'])
+        self.n_features_in_ = int(arrays['n_features'])
+        self.n_estimators = int(arrays['n_estimators'])
+        self.contamination = _contamination(arrays['contamination'])
+
+    @classmethod
+    def load(cls, path):
+        """Load a compiled forest saved with save()"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def arrays(self):
+        """Arrays and scalars as stored in the .npz archive"""
+        return {
+            'roots': self.roots.astype(np.int32),
+            'feature': self.feature.astype(np.int32),
+            'threshold': self.threshold,
+            'left': self.left.astype(np.int32),
+            'right': self.right.astype(np.int32),
+            'missing_left': self.missing_left,
+            'leaf_value': self.leaf_value,
+            'max_depth': self.max_depth,
+            'denominator': self.denominator,
+            'offset': self.offset_,
+            'n_features': self.n_features_in_,
+            'n_estimators': self.n_estimators,
+            'contamination': self.contamination,  # float or 'auto', no pickling
+        }
+
+    def save(self, path):
+        """Save the forest as an uncompressed .npz archive"""
+        np.savez(path, **self.arrays())
+
+    def get_params(self):
+        """Subset of sklearn's get_params() used for logging"""
+        return {'n_estimators': self.n_estimators,
+                'contamination': self.contamination}
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_samples, n_trees)"""
+        # sklearn scores float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected "
+                             f"(n_samples, {self.n_features_in_})")
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.roots.size))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def score_samples(self, X):
+        """Opposite of the anomaly score, as IsolationForest.score_samples"""
+        # Accumulate trees in order, matching sklearn's sequential sum
+        depths = np.cumsum(self.leaf_value[self.apply(X)], axis=1)[:, -1]
+        if self.denominator != 0:
+            ratio = depths / self.denominator
+        else:
+            ratio = np.ones_like(depths)
+        return -(2 ** (-ratio))
+
+    def decision_function(self, X):
+        """Anomaly score shifted so that < 0 means anomaly"""
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        """Return -1 for anomalies and 1 for normal samples"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def load_forest(path):
+    """Load a compiled .npz: a CompiledForest, or a RegimeForest of them"""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    if 'regime_table' in arrays:
+        from regime_forest import RegimeForest
+        return RegimeForest.from_arrays(arrays)
+    return CompiledForest(arrays)
+
+
+def export_forest(model):
+    """
+    Flatten a fitted sklearn IsolationForest into a CompiledForest.
+
+    Feature subsampling is folded into the node feature indices, and each
+    leaf stores the exact depth contribution sklearn adds for it.
+    """
+    from sklearn.ensemble._iforest import _average_path_length
+
+    roots, feature, threshold, left, right, missing_left, leaf_value = \
+        [], [], [], [], [], [], []
+    max_depth = 0
+    base = 0
+
+    for i, (estimator, features) in enumerate(zip(model.estimators_,
+                                                  model.estimators_features_)):
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        self_index = np.arange(n)
+
+        if hasattr(model, '_decision_path_lengths'):
+            path_lengths = model._decision_path_lengths[i]
+            avg_lengths = model._average_path_length_per_tree[i]
+        else:
+            path_lengths = tree.compute_node_depths()
+            avg_lengths = _average_path_length(tree.n_node_samples)
+
+        roots.append(base)
+        feature.append(np.where(is_leaf, 0, np.asarray(features)[tree.feature]))
+        threshold.append(tree.threshold)
+        left.append(np.where(is_leaf, self_index, tree.children_left) + base)
+        right.append(np.where(is_leaf, self_index, tree.children_right) + base)
+        missing_left.append(getattr(tree, 'missing_go_to_left',
+                                    np.zeros(n, dtype=np.uint8)).astype(bool))
+        leaf_value.append(path_lengths + avg_lengths - 1.0)
+        max_depth = max(max_depth, tree.max_depth)
+        base += n
+
+    return CompiledForest({
+        'roots': np.array(roots),
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'missing_left': np.concatenate(missing_left),
+        'leaf_value': np.concatenate(leaf_value),
+        'max_depth': max_depth,
+        'denominator': len(model.estimators_) * _average_path_length([model._max_samples])[0],
+        'offset': model.offset_,
+        'n_features': model.n_features_in_,
+        'n_estimators': len(model.estimators_),
+        'contamination': model.contamination,
+    })
+
+
+def main():
+    import sys
+    import joblib
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 compiled_forest.py model.pkl [model.npz]")
+        return 1
+
+    model_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else model_path.replace('.pkl', '.npz')
+
+    model = joblib.load(model_path)
+    if hasattr(model, 'compiled'):
+        # RegimeForest: export every member
+        compiled = model.compiled()
+        nodes = sum(member.feature.size for member in compiled.models)
+    else:
+        compiled = export_forest(model)
+        nodes = compiled.feature.size
+    compiled.save(output_path)
+    print(f"Compiled forest saved to {output_path} "
+          f"({compiled.n_estimators} trees, {nodes} nodes)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
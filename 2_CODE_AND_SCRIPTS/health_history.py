@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+ICS Health History
+Rolling history of every health_monitor.py sample in a fixed-size
+ring-buffer file, plus the alert rules evaluated over it.
+
+File layout (little-endian):
+  header   HEADER: magic "ICSH", version, record size, capacity, records
+           written so far, and the layout (service, port, check and rule
+           names, whose order gives the bits of the bitmask fields)
+  records  `capacity` slots of RECORD; sample n lives in slot n % capacity:
+  offset size  field
+  0      8     timestamp, unix seconds (float64)
+  8      40    cpu_temp_c, memory_used_mb, memory_total_mb, disk_percent,
+               log_hours_old, check_ms, msgs_per_s, lag_p95_s, backlog_s,
+               drop_rate (float32, NaN if unknown)
+  48     8     telemetry_bytes: size of the newest store partition + CSV
+  56     1     MQTT ports listening (bitmask)
+  57     1     services active (bitmask)
+  58     1     checks failed (bitmask)
+  60     4     alerts active after this sample (bitmask)
+The file never grows (CAPACITY samples = 7 days at 30 s, 1.3 MB) and a
+sample is one pwrite() of the record plus one of the header's counter.
+
+Alerts fire on sustained conditions and trends, not on single samples:
+  Sustained  metric >= threshold in every sample for `seconds`
+  Trend      least-squares slope over `window` above a rate per hour
+  RateDrop   telemetry write rate over `window` below `ratio` of the rate
+             over the `baseline` before it
+The alert bitmask is stored with each sample, so raise/clear transitions
+survive a monitor restart and show up in queries.
+
+Usage:
+  python3 health_history.py                     # Last hour
+  python3 health_history.py --hours 24 --step 600
+  python3 health_history.py --hours 6 --format csv > health.csv
+  python3 health_history.py --hours 24 --alerts # Alert raise/clear events
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+# Configuration
+HISTORY_FILE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/health_history.bin"
+CAPACITY = 20160  # Samples kept (7 days at a 30 s check interval)
+
+# Schema
+MAGIC = b"ICSH"
+VERSION = 1
+LAYOUT_SIZE = 1024  # Bytes for the layout JSON in the header
+HEADER = struct.Struct(f'<4sHHIQ{LAYOUT_SIZE}s')
+RECORD = struct.Struct('<d10fdBBBxI')
+FLOATS = ['cpu_temp_c', 'memory_used_mb', 'memory_total_mb', 'disk_percent',
+          'log_hours_old', 'check_ms', 'msgs_per_s', 'lag_p95_s', 'backlog_s', 'drop_rate']
+INGESTION = ['msgs_per_s', 'lag_p95_s', 'backlog_s', 'drop_rate']  # From status["ingestion"]
+METRICS = FLOATS + ['memory_percent', 'telemetry_bytes']
+MAX_BITS = {'services': 8, 'ports': 8, 'checks': 8, 'rules': 32}
+_COUNT_OFFSET = 12  # Offset of the records-written counter in HEADER
+
+
+class Sustained:
+    def __init__(self, name, metric, threshold, seconds, message):
+        """
+        Args:
+            name: alert name
+            metric: sample key compared with threshold
+            threshold: alert while metric >= threshold...
+            seconds: ...in every sample for at least this long
+            message: str.format template; sample keys and {value}
+        """
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.seconds = seconds
+        self.window = seconds
+        self.message = message
+
+    def check(self, samples):
+        latest = samples[-1]
+        start = None
+        for sample in reversed(samples):
+            value = sample[self.metric]
+            if not value >= self.threshold:  # NaN (unknown) ends the run too
+                break
+            start = sample['ts']
+        if start is None or latest['ts'] - start < self.seconds:
+            return None
+        return self.message.format(value=latest[self.metric], **latest)
+
+
+class Trend:
+    def __init__(self, name, metric, window, max_per_hour, message):
+        """
+        Args:
+            name: alert name
+            metric: sample key to fit
+            window: seconds of samples in the fit (at least half must be covered)
+            max_per_hour: alert while the slope exceeds this rate per hour
+            message: str.format template; sample keys and {rate}
+        """
+        self.name = name
+        self.metric = metric
+        self.window = window
+        self.max_per_hour = max_per_hour
+        self.message = message
+
+    def check(self, samples):
+        latest = samples[-1]
+        points = [(s['ts'], s[self.metric]) for s in samples
+                  if s['ts'] >= latest['ts'] - self.window and not math.isnan(s[self.metric])]
+        if len(points) < 3 or points[-1][0] - points[0][0] < self.window / 2:
+            return None
+        n = len(points)
+        mean_t = sum(t for t, _ in points) / n
+        mean_v = sum(v for _, v in points) / n
+        var = sum((t - mean_t) ** 2 for t, _ in points)
+        rate = sum((t - mean_t) * (v - mean_v) for t, v in points) / var * 3600
+        if rate <= self.max_per_hour:
+            return None
+        return self.message.format(rate=rate, **latest)
+
+
+class RateDrop:
+    def __init__(self, name, metric, window, baseline, ratio, message):
+        """
+        Args:
+            name: alert name
+            metric: growing counter (a decrease is a reset, e.g. a new partition)
+            window: seconds of recent samples
+            baseline: seconds before `window` giving the normal rate
+            ratio: alert while recent rate < ratio * baseline rate
+            message: str.format template; sample keys, {rate} and {baseline_rate}
+        """
+        self.name = name
+        self.metric = metric
+        self.window = window + baseline
+        self.recent = window
+        self.baseline = baseline
+        self.ratio = ratio
+        self.message = message
+
+    def _rate(self, samples):
+        # Per-second increase; after a reset the new value is the increase
+        if len(samples) < 3:
+            return None
+        increase = 0.0
+        for previous, sample in zip(samples, samples[1:]):
+            step = sample[self.metric] - previous[self.metric]
+            increase += step if step >= 0 else sample[self.metric]
+        seconds = samples[-1]['ts'] - samples[0]['ts']
+        return increase / seconds if seconds > 0 else None
+
+    def check(self, samples):
+        latest = samples[-1]
+        split = latest['ts'] - self.recent
+        start = split - self.baseline
+        usable = [s for s in samples if s['ts'] >= start and not math.isnan(s[self.metric])]
+        if not usable or usable[0]['ts'] > start + self.baseline / 2:
+            return None  # Not enough history for a baseline yet
+        baseline_rate = self._rate([s for s in usable if s['ts'] <= split])
+        rate = self._rate([s for s in usable if s['ts'] >= split])
+        if not baseline_rate or rate is None or rate >= self.ratio * baseline_rate:
+            return None
+        return self.message.format(rate=rate, baseline_rate=baseline_rate, **latest)
+
+
+RULES = [
+    Sustained("service_down", "services_down", 1, 60, "Services not active: {down}"),
+    Sustained("broker_ports", "ports_missing", 1, 60, "MQTT ports not listening: {missing}"),
+    Sustained("checks_failing", "checks_failed", 1, 60, "Health checks failing: {failed}"),
+    Sustained("disk_high", "disk_percent", 80, 600, "Disk usage {value:.0f}% for 10+ min"),
+    Sustained("telemetry_stale", "log_hours_old", 1, 600,
+              "No telemetry written for {value:.1f} hours"),
+    Sustained("cpu_hot", "cpu_temp_c", 75, 300, "CPU at {value:.1f}°C for 5+ min"),
+    Sustained("memory_high", "memory_percent", 90, 600, "Memory {value:.0f}% used for 10+ min"),
+    Sustained("ingest_lag", "lag_p95_s", 5.0, 120,
+              "Telemetry lag p95 {value:.1f} s for 2+ min"),
+    Sustained("ingest_backlog", "backlog_s", 10.0, 120,
+              "Logger/AI node {value:.0f} s behind live telemetry for 2+ min"),
+    Sustained("ingest_drops", "drop_rate", 0.05, 120,
+              "Logger/AI node missing {value:.0%} of telemetry for 2+ min"),
+    Trend("cpu_heating", "cpu_temp_c", 900, 10.0,
+          "CPU temperature rising {rate:.1f}°C/h (now {cpu_temp_c:.1f}°C)"),
+    Trend("memory_growing", "memory_used_mb", 3600, 100.0,
+          "Memory use growing {rate:.0f} MB/h (now {memory_used_mb:.0f} MB)"),
+    Trend("disk_filling", "disk_percent", 3600, 2.0,
+          "Disk filling {rate:.1f}%/h (now {disk_percent:.0f}%)"),
+    RateDrop("telemetry_rate_drop", "telemetry_bytes", 900, 3600, 0.5,
+             "Telemetry write rate {rate:.0f} B/s, under half the last hour's {baseline_rate:.0f} B/s"),
+]
+
+
+def _float(value):
+    return float('nan') if value is None else float(value)
+
+
+def _bits(names, selected):
+    return sum(1 << i for i, name in enumerate(names) if name in selected)
+
+
+def _selected(names, mask):
+    return [name for i, name in enumerate(names) if mask >> i & 1]
+
+
+class HistoryFile:
+    def __init__(self, path=HISTORY_FILE):
+        """
+        Open an existing history file for reading, with the layout stored in it.
+        """
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        header = os.pread(self.fd, HEADER.size, 0)
+        if len(header) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path}: not a health history file")
+        magic, version, size, self.capacity, self.written, layout = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path}: not a health history file (version {version})")
+        self._set_layout(**json.loads(layout.rstrip(b"\0")))
+
+    def _set_layout(self, services, ports, checks, rules):
+        self.services = list(services)
+        self.ports = list(ports)
+        self.checks = list(checks)
+        self.rule_names = list(rules)
+
+    def _layout(self):
+        return json.dumps({'services': self.services, 'ports': self.ports,
+                           'checks': self.checks, 'rules': self.rule_names},
+                          separators=(",", ":")).encode()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _unpack(self, record):
+        values = RECORD.unpack(record)
+        sample = dict(zip(['ts'] + FLOATS + ['telemetry_bytes'], values[:-4]))
+        ports_mask, services_mask, checks_mask, alerts_mask = values[-4:]
+        total = sample['memory_total_mb']
+        sample['memory_percent'] = sample['memory_used_mb'] / total * 100 if total else float('nan')
+        ports = _selected(self.ports, ports_mask)
+        active = _selected(self.services, services_mask)
+        sample['ports'] = ports
+        sample['services'] = {name: name in active for name in self.services}
+        sample['errors'] = _selected(self.checks, checks_mask)
+        sample['alerts'] = _selected(self.rule_names, alerts_mask)
+        # Counts and names for the rules and their messages
+        down = [name for name in self.services if name not in active]
+        missing = [str(port) for port in self.ports if port not in ports]
+        sample['services_down'] = len(down)
+        sample['ports_missing'] = len(missing)
+        sample['checks_failed'] = len(sample['errors'])
+        sample['down'] = ", ".join(down)
+        sample['missing'] = ", ".join(missing)
+        sample['failed'] = ", ".join(sample['errors'])
+        return sample
+
+    def read(self, since=None):
+        """Samples (dicts) oldest first, optionally only those at or after `since`"""
+        count = min(self.written, self.capacity)
+        data = os.pread(self.fd, count * RECORD.size, HEADER.size)
+        first = self.written % self.capacity if self.written > self.capacity else 0
+        samples = []
+        for i in range(count):
+            slot = (first + i) % self.capacity
+            record = data[slot * RECORD.size:(slot + 1) * RECORD.size]
+            if since is None or RECORD.unpack_from(record)[0] >= since:
+                samples.append(self._unpack(record))
+        return samples
+
+
+class HealthHistory(HistoryFile):
+    def __init__(self, path=HISTORY_FILE, services=(), ports=(), checks=(),
+                 rules=RULES, capacity=CAPACITY):
+        """
+        Open the ring buffer at `path` for appending, creating it if needed.
+        A file with a different layout (services, ports, checks, rules,
+        capacity) is moved to `path`.old and a new one started.
+
+        Args:
+            path: history file
+            services: service names, in bit order
+            ports: MQTT ports, in bit order
+            checks: names of the checks that can fail (status["errors"] keys)
+            rules: alert rules evaluated on append()
+            capacity: samples kept
+        """
+        self.path = path
+        self.rules = list(rules)
+        self.capacity = capacity
+        self._set_layout(services, ports, checks, [rule.name for rule in self.rules])
+        for kind, names in (('services', self.services), ('ports', self.ports),
+                            ('checks', self.checks), ('rules', self.rules)):
+            if len(names) > MAX_BITS[kind]:
+                raise ValueError(f"at most {MAX_BITS[kind]} {kind} fit in a history record")
+        self.layout = self._layout()
+        if len(self.layout) > LAYOUT_SIZE:
+            raise ValueError("history layout (names) too long for the header")
+
+        self.written = 0
+        self.fd = None
+        self._open()
+
+        # Samples the rules look at, loaded from the file so alert state and
+        # sustained/trend windows carry over a restart
+        self.window = max((rule.window for rule in self.rules), default=0)
+        self.recent = deque(self.read(since=time.time() - self.window))
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        header = os.pread(fd, HEADER.size, 0)
+        if len(header) == HEADER.size:
+            magic, version, size, capacity, written, layout = HEADER.unpack(header)
+            if (magic, version, size, capacity, layout.rstrip(b"\0")) == \
+                    (MAGIC, VERSION, RECORD.size, self.capacity, self.layout):
+                self.fd, self.written = fd, written
+                return
+            os.close(fd)
+            os.replace(self.path, f"{self.path}.old")
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(fd, HEADER.size + self.capacity * RECORD.size)
+        os.pwrite(fd, HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, 0, self.layout), 0)
+        self.fd = fd
+
+    def _pack(self, status, ts, alerts):
+        values = dict(status.get("metrics", {}), disk_percent=status.get("disk_percent"),
+                      log_hours_old=status.get("log_hours_old"),
+                      check_ms=status.get("check_ms"))
+        ingestion = status.get("ingestion") or {}
+        values.update((name, ingestion.get(name)) for name in INGESTION)
+        active = [name for name, state in status.get("services", {}).items()
+                  if state == "active"]
+        return RECORD.pack(
+            ts,
+            *(_float(values.get(name)) for name in FLOATS),
+            _float(status.get("telemetry_bytes")),
+            _bits(self.ports, status.get("mqtt_ports", [])),
+            _bits(self.services, active),
+            _bits(self.checks, status.get("errors", {})),
+            _bits(self.rule_names, alerts))
+
+    def append(self, status, now=None):
+        """
+        Store one health_monitor status and evaluate the alert rules.
+
+        Returns:
+            (raised, cleared, active): (rule name, message) pairs for alerts
+            that started with this sample, names of alerts that ended, and
+            (rule name, message) pairs for all active alerts
+        """
+        ts = time.time() if now is None else now
+        sample = self._unpack(self._pack(status, ts, []))
+        previous = set(self.recent[-1]['alerts']) if self.recent else set()
+        self.recent.append(sample)
+        while self.recent[0]['ts'] < ts - self.window:
+            self.recent.popleft()
+
+        samples = list(self.recent)
+        active = []
+        for rule in self.rules:
+            message = rule.check(samples)
+            if message is not None:
+                active.append((rule.name, message))
+        sample['alerts'] = [name for name, _ in active]
+
+        slot = self.written % self.capacity
+        os.pwrite(self.fd, self._pack(status, ts, sample['alerts']),
+                  HEADER.size + slot * RECORD.size)
+        self.written += 1
+        os.pwrite(self.fd, struct.pack('<Q', self.written), _COUNT_OFFSET)
+
+        raised = [(name, message) for name, message in active if name not in previous]
+        cleared = [name for name in self.rule_names
+                   if name in previous and name not in sample['alerts']]
+        return raised, cleared, active
+
+
+def _cell(value, fmt):
+    return "-" if value is None or (isinstance(value, float) and math.isnan(value)) \
+        else format(value, fmt)
+
+
+def downsample(samples, step):
+    """Last sample of every `step` seconds"""
+    if not step:
+        return samples
+    kept = {}
+    for sample in samples:
+        kept[int(sample['ts'] // step)] = sample
+    return list(kept.values())
+
+
+def with_rates(samples):
+    """Add telemetry_bps (write rate since the previous sample) to each sample"""
+    previous = None
+    for sample in samples:
+        sample['telemetry_bps'] = float('nan')
+        if previous is not None and sample['ts'] > previous['ts']:
+            step = sample['telemetry_bytes'] - previous['telemetry_bytes']
+            sample['telemetry_bps'] = (step if step >= 0 else sample['telemetry_bytes']) \
+                / (sample['ts'] - previous['ts'])
+        previous = sample
+    return samples
+
+
+def alert_events(samples):
+    """(ts, 'raised'/'cleared', rule name) whenever the active alerts changed"""
+    events = []
+    previous = set()
+    for sample in samples:
+        current = set(sample['alerts'])
+        events += [(sample['ts'], 'raised', name) for name in sorted(current - previous)]
+        events += [(sample['ts'], 'cleared', name) for name in sorted(previous - current)]
+        previous = current
+    return events
+
+
+COLUMNS = [('time', 'ts', None), ('temp_c', 'cpu_temp_c', '.1f'),
+           ('mem_mb', 'memory_used_mb', '.0f'), ('disk_%', 'disk_percent', '.0f'),
+           ('log_h', 'log_hours_old', '.1f'), ('tel_B/s', 'telemetry_bps', '.0f'),
+           ('msg/s', 'msgs_per_s', '.1f'), ('lag95_s', 'lag_p95_s', '.2f'),
+           ('behind_s', 'backlog_s', '.1f'), ('missed', 'drop_rate', '.1%'),
+           ('check_ms', 'check_ms', '.1f')]
+
+
+def print_table(samples, out=sys.stdout):
+    widths = [19, 7, 7, 6, 6, 9, 8, 8, 8, 7, 9]
+    print("  ".join(f"{title:>{w}}" for (title, _, _), w in zip(COLUMNS, widths))
+          + "  ports      services / alerts", file=out)
+    for sample in samples:
+        cells = [datetime.fromtimestamp(sample['ts']).strftime("%Y-%m-%d %H:%M:%S")]
+        cells += [_cell(sample[key], fmt) for _, key, fmt in COLUMNS[1:]]
+        ports = ",".join(str(p) for p in sample['ports']) or "none"
+        notes = [f"down: {sample['down']}"] if sample['down'] else ["ok"]
+        notes += [f"failed: {sample['failed']}"] if sample['failed'] else []
+        notes += [f"ALERT {', '.join(sample['alerts'])}"] if sample['alerts'] else []
+        print("  ".join(f"{c:>{w}}" for c, w in zip(cells, widths))
+              + f"  {ports:<9}  {'; '.join(notes)}", file=out)
+
+
+def print_csv(samples, out=sys.stdout):
+    writer = csv.writer(out, lineterminator="\n")
+    keys = ['ts'] + METRICS + ['telemetry_bps']
+    writer.writerow(['timestamp'] + keys[1:] + ['ports', 'services_down', 'checks_failed', 'alerts'])
+    for sample in samples:
+        writer.writerow([datetime.fromtimestamp(sample['ts']).isoformat()]
+                        + ["" if math.isnan(sample[k]) else round(sample[k], 3) for k in keys[1:]]
+                        + [" ".join(map(str, sample['ports'])), sample['down'].replace(", ", " "),
+                           " ".join(sample['errors']), " ".join(sample['alerts'])])
+
+
+def print_json(samples, out=sys.stdout):
+    for sample in samples:
+        entry = {k: (None if math.isnan(v) else round(v, 3)) if isinstance(v, float) else v
+                 for k, v in sample.items() if k not in ('down', 'missing', 'failed')}
+        entry['ts'] = sample['ts']
+        out.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the health monitor history")
+    parser.add_argument("--file", default=HISTORY_FILE, help="history file")
+    parser.add_argument("--hours", type=float, default=1.0, help="how far back to show")
+    parser.add_argument("--step", type=float, default=0,
+                        help="show one sample per STEP seconds (default: all)")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    parser.add_argument("--alerts", action="store_true",
+                        help="list alert raise/clear events instead of samples")
+    args = parser.parse_args()
+
+    try:
+        history = HistoryFile(args.file)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read history: {e}", file=sys.stderr)
+        return 1
+    samples = with_rates(history.read(since=time.time() - args.hours * 3600))
+    history.close()
+
+    if args.alerts:
+        for ts, change, name in alert_events(samples):
+            print(f"{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S}  {change:<7}  {name}")
+        return 0
+
+    samples = downsample(samples, args.step)
+    if args.format == "csv":
+        print_csv(samples)
+    elif args.format == "json":
+        print_json(samples)
+    else:
+        print_table(samples)
+        print(f"\n{len(samples)} samples, last {args.hours:g} h ({history.written} recorded, "
+              f"{history.capacity} kept)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -3,9 +3,33 @@
 ICS Security System Health Monitor
 Monitors all system services and sends alerts if any fail.
 
-Usage: 
+All checks of a cycle run concurrently (asyncio), each with its own
+deadline (CHECK_TIMEOUT), so one hung probe cannot stretch a cycle. Only
+systemd state needs a subprocess - one batched `systemctl show` for every
+service; everything else is read directly:
+  MQTT ports   /proc/net/tcp, /proc/net/tcp6 (LISTEN sockets)
+  Memory       /proc/meminfo
+  CPU temp     /sys/class/thermal/thermal_zone0/temp
+  Disk         os.statvfs on the data directory
+A probe that fails or misses its deadline is reported as a failed check.
+Blocking probes share a fixed pool of CHECK_WORKERS threads, and a check
+whose previous run has not returned yet is skipped (reported as failed)
+rather than started again, so a probe that hangs ties up one thread, not
+one more every cycle.
+
+Telemetry ingestion (ingestion_probe.py): a passive subscriber on the
+telemetry topics measures msgs/s and end-to-end lag, and compares them with
+what the logger and AI node report on their /metrics endpoints, flagging
+backlogs and drop rates over threshold.
+
+In --daemon/--once mode every sample is appended to a ring-buffer history
+(health_history.py) and alerts come from its rules - sustained thresholds
+and trends - as they are raised and cleared, instead of every bad sample.
+
+Usage:
     python3 health_monitor.py              # Run once
     python3 health_monitor.py --daemon     # Run continuously (for systemd service)
+    python3 health_history.py --hours 6    # Query the recorded history
 
 Install as systemd service:
     sudo cp health_monitor.service /etc/systemd/system/
@@ -13,21 +37,41 @@ Install as systemd service:
     sudo systemctl start health_monitor
 """
 
-import subprocess
-import time
-import json
 import argparse
-import sys
+import asyncio
+import math
 import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
+
+from health_history import HealthHistory
+from ingestion_probe import CONNECT_TIMEOUT, IngestionProbe
 
 # Configuration
 SERVICES = ["mosquitto", "ics_ai_node", "ics_logger"]
 CHECK_INTERVAL = 30  # seconds
+DATA_DIR = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS"
 LOG_FILE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/health_monitor.log"
+TELEMETRY_CSV = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv"
+TELEMETRY_STORE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/telemetry_store"
+MQTT_PORTS = [8883, 1883]
+HISTORY_FILE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/health_history.bin"
 ALERT_SCRIPT = None  # Optional: Path to script for email/SMS alerts
 
+# Probes
+CHECK_TIMEOUT = 5.0  # Deadline per check (seconds)
+CHECK_WORKERS = 8    # Threads running blocking checks (one per check of a cycle)
+PROC_NET_TCP = ["/proc/net/tcp", "/proc/net/tcp6"]
+PROC_MEMINFO = "/proc/meminfo"
+CPU_TEMP_FILE = "/sys/class/thermal/thermal_zone0/temp"
+TCP_LISTEN = "0A"  # Socket state code in /proc/net/tcp
+CHECKS = ["mqtt_ports", "disk", "log_fresh", "metrics", "telemetry",
+          "ingestion"]  # status["errors"] keys
+INGEST_WINDOW = 5.0  # Seconds of live telemetry sampled when there is no baseline yet
+
 # ANSI colors
 GREEN = '\033[92m'
 RED = '\033[91m'
@@ -39,10 +83,10 @@ def log_message(message, level="INFO"):
     """Log message to file and optionally print"""
     timestamp = datetime.now().isoformat()
     log_entry = f"[{timestamp}] [{level}] {message}"
-    
+
     with open(LOG_FILE, 'a') as f:
         f.write(log_entry + "\n")
-    
+
     if level == "ERROR":
         print(f"{RED}{log_entry}{RESET}")
     elif level == "WARNING":
@@ -51,167 +95,372 @@ def log_message(message, level="INFO"):
         print(log_entry)
 
 
-def check_service(service_name):
-    """Check if a systemd service is running"""
+async def check_services(services=SERVICES, timeout=CHECK_TIMEOUT):
+    """ActiveState of every service from one `systemctl show` call"""
     try:
-        result = subprocess.run(
-            ["systemctl", "is-active", service_name],
-            capture_output=True, text=True, timeout=10
+        process = await asyncio.create_subprocess_exec(
+            "systemctl", "show", "--property=Id,ActiveState", *services,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
         )
-        is_active = result.stdout.strip() == "active"
-        return is_active, result.stdout.strip()
-    except Exception as e:
-        return False, f"error: {e}"
+    except OSError as e:
+        return {service: f"error: {e}" for service in services}
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return {service: "error: timeout" for service in services}
+
+    # One "Key=value" block per unit, separated by blank lines
+    states = {}
+    for block in stdout.decode().split("\n\n"):
+        properties = dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+        if "Id" in properties:
+            states[properties["Id"].removesuffix(".service")] = properties.get("ActiveState", "unknown")
+    error = stderr.decode().strip().splitlines()[-1:] or [f"exit code {process.returncode}"]
+    return {service: states.get(service, f"error: {error[0]}") for service in services}
+
+
+def listening_ports(paths=PROC_NET_TCP):
+    """Local TCP ports in LISTEN state (IPv4 and IPv6)"""
+    ports = set()
+    for path in paths:
+        try:
+            with open(path) as f:
+                next(f)  # Header
+                for line in f:
+                    fields = line.split(None, 4)
+                    if fields[3] == TCP_LISTEN:
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+        except FileNotFoundError:
+            continue  # No IPv6
+    return ports
 
 
 def check_mqtt_ports():
     """Check if MQTT ports are listening"""
-    try:
-        result = subprocess.run(
-            ["netstat", "-tlnp"],
-            capture_output=True, text=True, timeout=10
-        )
-        ports = []
-        if "8883" in result.stdout:
-            ports.append(8883)
-        if "1883" in result.stdout:
-            ports.append(1883)
-        return len(ports) > 0, ports
-    except Exception as e:
-        return False, [f"error: {e}"]
-
-
-def check_disk_usage(max_percent=80):
-    """Check disk usage of data directory"""
-    try:
-        result = subprocess.run(
-            ["df", "-h", "--output=pcent", "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS"],
-            capture_output=True, text=True, timeout=10
-        )
-        # Parse the percentage
-        lines = result.stdout.strip().split('\n')
-        if len(lines) >= 2:
-            usage = lines[1].strip().replace('%', '').replace(' ', '')
-            percent = int(usage)
-            return percent < max_percent, percent
-    except Exception as e:
+    listening = listening_ports()
+    ports = [port for port in MQTT_PORTS if port in listening]
+    return len(ports) > 0, ports
+
+
+def check_disk_usage(max_percent=80, path=DATA_DIR):
+    """Check disk usage of data directory (percent as reported by df)"""
+    st = os.statvfs(path)
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    available = st.f_bavail * st.f_frsize
+    if used + available == 0:
         return True, 0
-    return True, 0
+    percent = math.ceil(used * 100 / (used + available))
+    return percent < max_percent, percent
+
+
+def latest_store_partition(store_dir=TELEMETRY_STORE):
+    """ts.bin of the newest telemetry store partition (YYYY/MM/DD/HH), or None"""
+    path = store_dir
+    for _ in range(4):
+        try:
+            entries = sorted(e for e in os.listdir(path) if e.isdigit())
+        except OSError:
+            return None
+        if not entries:
+            return None
+        path = os.path.join(path, entries[-1])
+    ts_file = os.path.join(path, "ts.bin")
+    return ts_file if os.path.exists(ts_file) else None
+
+
+def latest_store_write(store_dir=TELEMETRY_STORE):
+    """mtime of the newest telemetry store partition, or None"""
+    ts_file = latest_store_partition(store_dir)
+    return os.path.getmtime(ts_file) if ts_file else None
+
+
+def telemetry_bytes():
+    """Bytes in the newest store partition's ts.bin plus the CSV (write-rate counter)"""
+    paths = [latest_store_partition(), TELEMETRY_CSV]
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
 
 
 def check_log_file_recent(max_hours=1):
-    """Check if log file has recent entries"""
-    try:
-        log_path = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv"
-        if not os.path.exists(log_path):
-            return True, None
-        
-        file_time = os.path.getmtime(log_path)
-        current_time = time.time()
-        hours_diff = (current_time - file_time) / 3600
-        
-        return hours_diff < max_hours, hours_diff
-    except Exception as e:
+    """Check if telemetry (columnar store or CSV) has recent entries"""
+    write_times = [latest_store_write()]
+    if os.path.exists(TELEMETRY_CSV):
+        write_times.append(os.path.getmtime(TELEMETRY_CSV))
+    write_times = [t for t in write_times if t is not None]
+    if not write_times:
         return True, None
 
+    file_time = max(write_times)
+    current_time = time.time()
+    hours_diff = (current_time - file_time) / 3600
+
+    return hours_diff < max_hours, hours_diff
+
+
+def read_meminfo(path=PROC_MEMINFO):
+    """/proc/meminfo values in kB"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            values[key] = int(value.split()[0])
+    return values
+
 
 def get_system_metrics():
     """Get system metrics (CPU temp, memory, etc.)"""
     metrics = {}
-    
+
     # CPU temperature (RPi)
     try:
-        with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
+        with open(CPU_TEMP_FILE, "r") as f:
             temp_c = int(f.read()) / 1000
             metrics["cpu_temp_c"] = round(temp_c, 1)
-    except:
+    except (OSError, ValueError):
         metrics["cpu_temp_c"] = None
-    
-    # Memory usage
+
+    # Memory usage (used = total - available, as `free` reports it)
     try:
-        result = subprocess.run(
-            ["free", "-m"],
-            capture_output=True, text=True, timeout=10
-        )
-        lines = result.stdout.split('\n')
-        if len(lines) > 1:
-            parts = lines[1].split()
-            if len(parts) >= 6:
-                metrics["memory_used_mb"] = int(parts[2])
-                metrics["memory_total_mb"] = int(parts[1])
-    except:
+        meminfo = read_meminfo()
+        total = meminfo["MemTotal"]
+        available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+        metrics["memory_used_mb"] = (total - available) // 1024
+        metrics["memory_total_mb"] = total // 1024
+    except (OSError, KeyError, ValueError):
         pass
-    
+
     return metrics
 
 
-def run_health_check():
-    """Run a single health check and return status"""
+def _settle(future, result, error):
+    if not future.done():  # Not already abandoned by wait_for
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class CheckBusy(Exception):
+    """The check's previous run has not returned yet"""
+
+
+class CheckRunner:
+    """
+    Runs blocking checks on a fixed pool of daemon threads, one run per
+    check at a time.
+
+    Daemon threads rather than asyncio.to_thread or a ThreadPoolExecutor:
+    those are joined at exit, so a probe stuck in the kernel (e.g. statvfs
+    on a dead mount) would hold up the process exit.
+    """
+
+    def __init__(self, workers=CHECK_WORKERS):
+        """
+        Args:
+            workers: threads in the pool
+        """
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._in_flight = set()  # Checks queued or running
+        self._threads = [threading.Thread(target=self._work, name=f"check-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+        # Statistics
+        self.skipped = 0
+
+    async def run(self, check, *args, timeout=CHECK_TIMEOUT):
+        """check(*args) with a deadline; CheckBusy if its last run is still going"""
+        with self._lock:
+            if check in self._in_flight:
+                self.skipped += 1
+                raise CheckBusy(f"previous {getattr(check, '__name__', check)} "
+                                f"run has not returned")
+            self._in_flight.add(check)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((check, args, loop, future))
+        return await asyncio.wait_for(future, timeout)
+
+    def _work(self):
+        while True:
+            check, args, loop, future = self._jobs.get()
+            result, error = None, None
+            try:
+                result = check(*args)
+            except Exception as e:
+                error = e
+            finally:
+                with self._lock:
+                    self._in_flight.discard(check)
+            try:
+                loop.call_soon_threadsafe(_settle, future, result, error)
+            except RuntimeError:
+                pass  # Loop already closed: the check was given up on
+
+
+_runner = None
+
+
+async def run_check(check, *args, timeout=CHECK_TIMEOUT):
+    """Run a blocking check on the shared CheckRunner with a deadline"""
+    global _runner
+    if _runner is None:
+        _runner = CheckRunner()
+    return await _runner.run(check, *args, timeout=timeout)
+
+
+async def check_ingestion(probe, window=INGEST_WINDOW):
+    """Live telemetry rate, lag and consumer backlog (ingestion_probe.py)"""
+    if not await run_check(probe.start, timeout=CONNECT_TIMEOUT + 1):
+        raise ConnectionError("telemetry tap could not connect to the broker")
+    if not probe.has_baseline:
+        await run_check(probe.measure)
+        await asyncio.sleep(window)
+    return await run_check(probe.measure)
+
+
+async def _skipped():
+    return None
+
+
+async def run_health_check_async(probe=None):
+    """
+    Run all checks concurrently and return (all_healthy, status).
+    Ingestion (rate, lag, backlog) is only checked with an IngestionProbe.
+    """
     status = {
         "timestamp": datetime.now().isoformat(),
         "services": {},
         "mqtt_ports": [],
         "disk_ok": True,
         "log_fresh": True,
-        "metrics": {}
+        "metrics": {},
+        "errors": {}
     }
-    
+
+    started = time.perf_counter()
+    services, ports, disk, log, metrics, written, ingestion = await asyncio.gather(
+        check_services(),
+        run_check(check_mqtt_ports),
+        run_check(check_disk_usage),
+        run_check(check_log_file_recent),
+        run_check(get_system_metrics),
+        run_check(telemetry_bytes),
+        asyncio.wait_for(check_ingestion(probe), INGEST_WINDOW + 3 * CHECK_TIMEOUT)
+        if probe is not None else _skipped(),
+        return_exceptions=True
+    )
+    status["check_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def failed(name, result):
+        if isinstance(result, BaseException):
+            status["errors"][name] = "timeout" if isinstance(result, asyncio.TimeoutError) \
+                else f"{type(result).__name__}: {result}"
+            return True
+        return False
+
     all_healthy = True
-    
-    # Check services
-    for service in SERVICES:
-        is_active, status_str = check_service(service)
-        status["services"][service] = status_str
-        if not is_active:
+
+    # Services
+    status["services"] = services
+    if any(state != "active" for state in services.values()):
+        all_healthy = False
+
+    # MQTT ports
+    if failed("mqtt_ports", ports):
+        all_healthy = False
+    else:
+        ports_ok, status["mqtt_ports"] = ports
+        if not ports_ok:
             all_healthy = False
-    
-    # Check MQTT ports
-    ports_ok, ports = check_mqtt_ports()
-    status["mqtt_ports"] = ports
-    if not ports_ok:
+
+    # Disk usage
+    if failed("disk", disk):
+        status["disk_ok"], status["disk_percent"] = False, None
         all_healthy = False
-    
-    # Check disk usage
-    disk_ok, disk_pct = check_disk_usage()
-    status["disk_ok"] = disk_ok
-    status["disk_percent"] = disk_pct
-    if not disk_ok:
+    else:
+        status["disk_ok"], status["disk_percent"] = disk
+        if not status["disk_ok"]:
+            all_healthy = False
+
+    # Log file freshness
+    if failed("log_fresh", log):
+        status["log_fresh"], status["log_hours_old"] = False, None
         all_healthy = False
-    
-    # Check log file freshness
-    log_fresh, hours = check_log_file_recent()
-    status["log_fresh"] = log_fresh
-    status["log_hours_old"] = round(hours, 1) if hours else None
-    if not log_fresh:
+    else:
+        log_fresh, hours = log
+        status["log_fresh"] = log_fresh
+        status["log_hours_old"] = None if hours is None else round(hours, 1)
+        if not log_fresh:
+            all_healthy = False
+
+    # System metrics
+    if not failed("metrics", metrics):
+        status["metrics"] = metrics
+
+    # Telemetry write counter (for the history's write-rate trend)
+    status["telemetry_bytes"] = None if failed("telemetry", written) else written
+
+    # Telemetry ingestion
+    if failed("ingestion", ingestion):
         all_healthy = False
-    
-    # Get system metrics
-    status["metrics"] = get_system_metrics()
-    
+    else:
+        status["ingestion"] = ingestion
+        if ingestion is not None and ingestion["issues"]:
+            all_healthy = False
+
     return all_healthy, status
 
 
+def open_probe():
+    """IngestionProbe, or None if the tap cannot be set up (e.g. no CA cert)"""
+    try:
+        return IngestionProbe()
+    except (OSError, ValueError) as e:
+        log_message(f"Ingestion checks disabled: {e}", "WARNING")
+        return None
+
+
+def run_health_check(ingestion=True):
+    """Run a single health check and return status"""
+    probe = open_probe() if ingestion else None
+    try:
+        return asyncio.run(run_health_check_async(probe))
+    finally:
+        if probe is not None:
+            probe.stop()
+
+
 def send_alert(status):
     """Send alert when issues detected"""
     issues = []
-    
+
     for service, service_status in status["services"].items():
         if service_status != "active":
             issues.append(f"Service {service}: {service_status}")
-    
-    if status["mqtt_ports"] != [8883, 1883]:
+
+    if status["mqtt_ports"] != MQTT_PORTS:
         issues.append(f"MQTT ports not fully available: {status['mqtt_ports']}")
-    
+
     if not status["disk_ok"]:
         issues.append(f"Disk usage high: {status['disk_percent']}%")
-    
+
     if not status["log_fresh"]:
         issues.append(f"Log file stale: {status['log_hours_old']} hours old")
-    
+
+    for check, error in status.get("errors", {}).items():
+        issues.append(f"Check {check} failed: {error}")
+
+    if status.get("ingestion"):
+        issues += [f"Ingestion: {issue}" for issue in status["ingestion"]["issues"]]
+
     if issues:
         message = f"ICS Security System ALERT:\n" + "\n".join(issues)
         log_message(message, "ERROR")
-        
+
         # TODO: Add email/SMS alert integration here
         # Example: send_email_alert(message)
         # Example: send_sms_alert(message)
@@ -222,34 +471,34 @@ def print_status(status):
     print("\n" + "="*60)
     print("  ICS Security System - Health Status")
     print("="*60)
-    print(f"Timestamp: {status['timestamp']}")
+    print(f"Timestamp: {status['timestamp']} (checks took {status.get('check_ms', 0)} ms)")
     print()
-    
+
     # Services
     print("Services:")
     for service, service_status in status["services"].items():
         icon = "✓" if service_status == "active" else "✗"
         color = GREEN if service_status == "active" else RED
         print(f"  {color}{icon}{RESET} {service}: {service_status}")
-    
+
     # MQTT Ports
     print("\nMQTT Ports:")
     expected_ports = {8883: "TLS (external)", 1883: "Local"}
     for port in status["mqtt_ports"]:
         print(f"  {GREEN}✓{RESET} Port {port}: {expected_ports.get(port, 'Unknown')}")
-    for port in [8883, 1883]:
+    for port in MQTT_PORTS:
         if port not in status["mqtt_ports"]:
             print(f"  {RED}✗{RESET} Port {port}: NOT LISTENING")
-    
+
     # Disk
     disk_status = f"{GREEN}OK{RESET}" if status["disk_ok"] else f"{RED}HIGH{RESET}"
     print(f"\nDisk Usage: {disk_status} ({status['disk_percent']}%)")
-    
+
     # Log freshness
     log_status = f"{GREEN}OK{RESET}" if status["log_fresh"] else f"{RED}STALE{RESET}"
     log_age = status['log_hours_old'] if status['log_hours_old'] else "N/A"
     print(f"Log Freshness: {log_status} ({log_age} hours ago)")
-    
+
     # System metrics
     metrics = status["metrics"]
     print("\nSystem Metrics:")
@@ -260,37 +509,114 @@ def print_status(status):
         mem_pct = (metrics["memory_used_mb"] / metrics["memory_total_mb"]) * 100
         mem_color = GREEN if mem_pct < 70 else YELLOW if mem_pct < 90 else RED
         print(f"  {mem_color}Memory: {metrics['memory_used_mb']}MB / {metrics['memory_total_mb']}MB{RESET}")
-    
+
+    # Telemetry ingestion
+    ingestion = status.get("ingestion")
+    if ingestion:
+        def number(value, fmt):
+            return "N/A" if value is None else format(value, fmt)
+        color = RED if ingestion["issues"] else GREEN
+        print("\nTelemetry Ingestion:")
+        print(f"  {color}Rate: {number(ingestion['msgs_per_s'], '.1f')} msg/s, "
+              f"lag p50/p95/max: {number(ingestion['lag_p50_s'], '.2f')} / "
+              f"{number(ingestion['lag_p95_s'], '.2f')} / {number(ingestion['lag_max_s'], '.2f')} s"
+              f"{RESET}")
+        for name in ("logger", "node"):
+            entry = ingestion.get(name)
+            if entry is None:
+                continue
+            if entry["error"]:
+                print(f"  {YELLOW}{name}: metrics unavailable ({entry['error']}){RESET}")
+                continue
+            drop = "N/A" if entry["drop_rate"] is None else f"{entry['drop_rate']:.1%}"
+            print(f"  {name}: {number(entry['msgs_per_s'], '.1f')} msg/s, "
+                  f"backlog {number(entry['backlog'], '.0f')} "
+                  f"({number(entry['backlog_s'], '.1f')} s), missed {drop}")
+        for issue in ingestion["issues"]:
+            print(f"  {RED}✗{RESET} {issue}")
+
+    # Probes that failed or timed out
+    if status.get("errors"):
+        print("\nFailed Checks:")
+        for check, error in status["errors"].items():
+            print(f"  {RED}✗{RESET} {check}: {error}")
+
     print("="*60 + "\n")
 
 
+def open_history(path):
+    """HealthHistory for the daemon, or None (alert on single samples instead)"""
+    if not path:
+        return None
+    try:
+        return HealthHistory(path, services=SERVICES, ports=MQTT_PORTS, checks=CHECKS)
+    except (OSError, ValueError) as e:
+        log_message(f"History disabled, alerting on single samples: {e}", "WARNING")
+        return None
+
+
+def record_history(history, status):
+    """Append a sample; log alerts that were raised or cleared by it"""
+    raised, cleared, _ = history.append(status)
+    for name, message in raised:
+        log_message(f"ICS Security System ALERT [{name}]: {message}", "ERROR")
+    for name in cleared:
+        log_message(f"Alert cleared [{name}]", "INFO")
+
+
+async def monitor(interval=CHECK_INTERVAL, once=False, history=None, probe=None):
+    """Check every `interval` seconds (measured start to start)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        healthy, status = await run_health_check_async(probe)
+        print_status(status)
+
+        if history is not None:
+            try:
+                await asyncio.to_thread(record_history, history, status)
+            except OSError as e:
+                log_message(f"History write failed: {e}", "WARNING")
+                send_alert(status)
+        elif not healthy:
+            send_alert(status)
+
+        if once:
+            return healthy
+
+        await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+
 def main():
     parser = argparse.ArgumentParser(description="ICS Security System Health Monitor")
     parser.add_argument("--daemon", action="store_true", help="Run continuously as daemon")
     parser.add_argument("--once", action="store_true", help="Run once and exit")
-    
+    parser.add_argument("--history-file", default=HISTORY_FILE,
+                        help="ring-buffer history for --daemon/--once; alerts come from its "
+                             "sustained/trend rules (\"\": none, alert on every bad sample)")
+    parser.add_argument("--no-ingestion", action="store_true",
+                        help="skip the telemetry rate/lag/backlog checks (no MQTT subscription)")
+
     args = parser.parse_args()
-    
+
     log_message("Health monitor started", "INFO")
-    
+
     if args.daemon or args.once:
         # Daemon mode
-        while True:
-            healthy, status = run_health_check()
-            print_status(status)
-            
-            if not healthy:
-                send_alert(status)
-            
-            if args.once:
-                break
-            
-            time.sleep(CHECK_INTERVAL)
+        history = open_history(args.history_file)
+        probe = None if args.no_ingestion else open_probe()
+        try:
+            asyncio.run(monitor(CHECK_INTERVAL, once=args.once, history=history, probe=probe))
+        finally:
+            if history is not None:
+                history.close()
+            if probe is not None:
+                probe.stop()
     else:
         # Single run
-        healthy, status = run_health_check()
+        healthy, status = run_health_check(ingestion=not args.no_ingestion)
         print_status(status)
-        
+
         if not healthy:
             send_alert(status)
             sys.exit(1)
@@ -301,4 +627,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
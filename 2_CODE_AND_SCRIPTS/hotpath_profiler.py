@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+ICS AI Hot-path Profiler
+Switchable instrumentation for finding where the AI node spends its time
+when it falls behind:
+
+  Stage timers   - wrap the hot-path entry points (MQTT callback, decode,
+                   window features, scoring, result handling, intervention)
+                   and record each call's duration in an ics_stage_seconds
+                   histogram (metrics_exporter.py), labelled by stage.
+  Profile capture - for N seconds, either
+                   'sample':   a statistical profiler that snapshots every
+                               thread's stack every few ms (collapsed stacks,
+                               flamegraph.pl/speedscope format), or
+                   'cprofile': cProfile on the hooked entry points, one
+                               profiler per thread, merged into a .prof file
+                   then dumped to 3_DATA_AND_ARTIFACTS/profiles/.
+
+Both work by replacing attributes (bound methods, score_fn, result_fn) with
+timed wrappers and restoring them afterwards, so the hot path runs the
+original, unwrapped code - and pays nothing - while they are off.
+
+Usage:
+  timers = StageTimers(registry)
+  timers.attach([(node.client, 'on_message', 'on_message'),
+                 (node.batcher, 'score_fn', 'score')])
+  timers.detach()
+  capture = ProfileCapture(hooks, directory=PROFILE_DIR)
+  capture.start('sample', seconds=30)      # dumps when done, in the background
+
+Overhead of a timed call (ns):
+  python3 hotpath_profiler.py
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Defaults
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "3_DATA_AND_ARTIFACTS", "profiles")
+PROFILE_SECONDS = 30.0
+PROFILE_MODES = ['sample', 'cprofile']
+SAMPLE_INTERVAL = 0.005   # Seconds between stack snapshots (sample mode)
+MAX_PROFILE_SECONDS = 600.0
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+REPORT_LINES = 40
+
+log = logging.getLogger("ics.profiler")
+
+
+class _Patches:
+    """Attribute replacements that can be undone"""
+
+    def __init__(self):
+        self._applied = []  # (obj, attr, original, wrapper)
+
+    def apply(self, hooks, make_wrapper):
+        for obj, attr, stage in hooks:
+            original = getattr(obj, attr, None) if obj is not None else None
+            if original is None:
+                continue  # e.g. no score_fn in sharded mode
+            wrapper = make_wrapper(original, stage)
+            setattr(obj, attr, wrapper)
+            self._applied.append((obj, attr, original, wrapper))
+
+    def restore(self):
+        for obj, attr, original, wrapper in reversed(self._applied):
+            # Leave attributes replaced since (e.g. score_fn after a model swap)
+            if getattr(obj, attr, None) is wrapper:
+                setattr(obj, attr, original)
+        self._applied = []
+
+    def __bool__(self):
+        return bool(self._applied)
+
+
+class StageTimers:
+    def __init__(self, registry):
+        """
+        Args:
+            registry: MetricsRegistry receiving the ics_stage_seconds histograms
+        """
+        self.registry = registry
+        self._patches = _Patches()
+        self._histograms = {}
+
+    @property
+    def active(self):
+        return bool(self._patches)
+
+    def histogram(self, stage):
+        if stage not in self._histograms:
+            self._histograms[stage] = self.registry.histogram(
+                "ics_stage_seconds", "Time spent per call in each hot-path stage",
+                STAGE_BUCKETS, stage=stage)
+        return self._histograms[stage]
+
+    def attach(self, hooks):
+        """Start timing hooks: iterable of (object, attribute, stage name)"""
+        self.detach()
+        self._patches.apply(hooks, self._timed)
+
+    def detach(self):
+        """Stop timing; the original attributes are put back"""
+        self._patches.restore()
+
+    def _timed(self, fn, stage):
+        # One writer per stage: every hook runs on a single thread
+        observe = self.histogram(stage).observe
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            started = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(clock() - started)
+        return timed
+
+    def summary(self):
+        """[(stage, calls, mean seconds, total seconds)] for stages seen so far"""
+        rows = []
+        for stage, histogram in self._histograms.items():
+            if histogram.count:
+                rows.append((stage, histogram.count, histogram.sum / histogram.count,
+                             histogram.sum))
+        return rows
+
+
+class SamplingProfiler:
+    """Snapshots every thread's Python stack at a fixed interval"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def run(self, seconds):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names.setdefault(thread.ident, thread.name)
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        """Collapsed stacks ("thread;file:func;... count"), heaviest first"""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, lines=REPORT_LINES):
+        """Functions by share of samples on top of the stack (self time)"""
+        leaf = Counter()
+        for stack, count in self.stacks.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaf.values()) or 1
+        out = [f"{self.samples} snapshots every {self.interval * 1000:.1f} ms, "
+               f"{total} thread stacks", "", "  self %  function"]
+        out += [f"  {count / total * 100:6.2f}  {name}" for name, count in leaf.most_common(lines)]
+        return "\n".join(out) + "\n"
+
+
+class _ThreadProfiles:
+    """One cProfile.Profile per thread (a Profile only sees its own thread)"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def wrap(self, fn, stage):
+        def profiled(*args, **kwargs):
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            if getattr(self._local, 'depth', 0):
+                return fn(*args, **kwargs)  # Nested hook: already profiling
+            self._local.depth = 1
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.depth = 0
+        return profiled
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = None
+        for profile in profiles:
+            profile.create_stats()
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+
+class ProfileCapture:
+    def __init__(self, hooks_fn, directory=PROFILE_DIR):
+        """
+        Args:
+            hooks_fn: callable returning the (object, attribute, stage) hooks
+                      to profile in 'cprofile' mode
+            directory: where profiles are written
+        """
+        self.hooks_fn = hooks_fn
+        self.directory = directory
+        self._thread = None
+        self._lock = threading.Lock()
+        self.last_paths = []
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, mode='sample', seconds=PROFILE_SECONDS):
+        """Capture in the background; returns False if one is already running"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"profile mode must be one of {', '.join(PROFILE_MODES)}")
+        seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(target=self._capture, args=(mode, seconds),
+                                            name="profile-capture", daemon=True)
+            self._thread.start()
+        return True
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _capture(self, mode, seconds):
+        log.info(f"Profiling ({mode}) for {seconds:.0f} s")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory,
+                                f"profile_{mode}_{datetime.now():%Y%m%d_%H%M%S}")
+            if mode == 'sample':
+                profiler = SamplingProfiler()
+                profiler.run(seconds)
+                profiler.write(f"{base}.collapsed")
+                report = profiler.report()
+                self.last_paths = [f"{base}.collapsed", f"{base}.txt"]
+            else:
+                profiles = _ThreadProfiles()
+                patches = _Patches()
+                patches.apply(self.hooks_fn(), profiles.wrap)
+                try:
+                    time.sleep(seconds)
+                finally:
+                    patches.restore()
+                stats = profiles.stats()
+                if stats is None:
+                    log.warning("Profile captured no calls (no traffic?)")
+                    return
+                stats.dump_stats(f"{base}.prof")
+                text = io.StringIO()
+                stats.stream = text
+                stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+                report = text.getvalue()
+                self.last_paths = [f"{base}.prof", f"{base}.txt"]
+            with open(f"{base}.txt", "w") as f:
+                f.write(report)
+            log.info(f"Profile written: {', '.join(self.last_paths)}")
+        except Exception:
+            log.exception("Profile capture failed")
+
+
+def benchmark(n=1000000):
+    """Per-call cost of a hook with timers off and on"""
+    from metrics_exporter import MetricsRegistry
+
+    class Target:
+        def work(self):
+            return None
+
+    target = Target()
+    timers = StageTimers(MetricsRegistry())
+
+    def timed(label):
+        work = target.work
+        started = time.perf_counter_ns()
+        for _ in range(n):
+            work()
+        print(f"  {label:<24} {(time.perf_counter_ns() - started) / n:7.1f} ns/call")
+
+    print(f"Hook overhead ({n} calls of an empty method):")
+    timed("timers off")
+    timers.attach([(target, 'work', 'work')])
+    timed("timers on")
+    timers.detach()
+    timed("timers off again")
+
+
+def main():
+    benchmark()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+ICS Telemetry Ingestion Probe
+Passive check of the telemetry pipeline for health_monitor.py: is the broker
+delivering, and are the logger and the AI node keeping up with it?
+
+  Tap      a QoS 0, clean-session subscriber on ics/telemetry/data and
+           ics/telemetry/bin that counts messages and records the end-to-end
+           lag of each (arrival time - payload "timestamp"), keeping only
+           the most recent LAG_SAMPLES lags (bounded memory)
+  Compare  between two measurements, the tap's message count against what
+           the logger (/metrics on 9106) and the AI node (/metrics on 9105)
+           report they received, and their backlogs (logger buffer, node
+           scoring queue) in seconds of traffic at the live rate
+
+Thresholds: p95 lag over LAG_MAX seconds, a backlog over BACKLOG_MAX
+seconds, or a drop rate (share of tapped messages a consumer never
+received) over DROP_RATE_MAX. Drop rates need MIN_MESSAGES tapped messages.
+A consumer whose metrics cannot be scraped is reported, not judged.
+
+Usage:
+  probe = IngestionProbe()
+  probe.start()
+  probe.measure()            # Baseline
+  time.sleep(30)
+  report = probe.measure()   # Rates, lag and comparisons since the baseline
+
+  python3 ingestion_probe.py --seconds 10    # One measurement from the shell
+"""
+
+import argparse
+import json
+import math
+import ssl
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from telemetry_binary import is_binary, unpack
+
+# Configuration
+BROKER = "localhost"
+PORT = 8883
+USERNAME = "naim"
+PASSWORD = "1234"
+CA_CERT = "/etc/mosquitto/ca_certificates/ca.crt"
+CLIENT_ID = "ics_health_tap"
+TOPICS = ["ics/telemetry/data", "ics/telemetry/bin"]
+NODE_METRICS_URL = "http://127.0.0.1:9105/metrics"
+LOGGER_METRICS_URL = "http://127.0.0.1:9106/metrics"
+
+# Thresholds
+LAG_MAX = 5.0          # p95 end-to-end lag (s)
+BACKLOG_MAX = 10.0     # Consumer backlog, in seconds of traffic
+DROP_RATE_MAX = 0.05   # Share of tapped messages a consumer did not receive
+MIN_MESSAGES = 50      # Tapped messages needed to judge drop rates
+
+# Defaults
+LAG_SAMPLES = 10000    # Most recent lags kept between measurements
+CONNECT_TIMEOUT = 5.0
+SCRAPE_TIMEOUT = 2.0
+
+
+def sample_time(payload):
+    """Unix time in a telemetry payload (JSON "timestamp" or binary record), or None"""
+    if is_binary(payload):
+        try:
+            return unpack(payload)[3]
+        except ValueError:
+            return None
+    try:
+        value = json.loads(payload).get("timestamp")
+    except (ValueError, AttributeError):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of a sorted list, nearest rank"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+def parse_metrics(text):
+    """Prometheus text format -> {name: [(labels dict, value)]}"""
+    metrics = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        pairs = {}
+        for item in labels.rstrip("}").split(","):
+            if "=" in item:
+                key, _, label = item.partition("=")
+                pairs[key] = label.strip('"')
+        metrics.setdefault(name, []).append((pairs, float(value)))
+    return metrics
+
+
+def metric_sum(metrics, name, **labels):
+    """Sum of a metric's samples matching labels, or None if it is not exported"""
+    if name not in metrics:
+        return None
+    return sum(value for pairs, value in metrics[name]
+               if all(pairs.get(k) == v for k, v in labels.items()))
+
+
+def scrape(url, timeout=SCRAPE_TIMEOUT):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return parse_metrics(response.read().decode())
+
+
+class TelemetryTap:
+    def __init__(self, topics=TOPICS, lag_samples=LAG_SAMPLES):
+        """
+        Args:
+            topics: telemetry topics to count (QoS 0, nothing is queued for us)
+            lag_samples: most recent lags kept between snapshots
+        """
+        self.topics = topics
+        self.lag_samples = lag_samples
+        self.connected = threading.Event()
+
+        # Written by the MQTT thread only
+        self.messages = 0
+        self.untimed = 0  # Payloads without a usable timestamp
+        # Lags are also swapped out by take_lags() on the caller's thread
+        self._lags = deque(maxlen=lag_samples)
+        self._lags_lock = threading.Lock()
+
+        self.client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=CLIENT_ID,
+            clean_session=True
+        )
+        self.client.username_pw_set(USERNAME, PASSWORD)
+        self.client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc, properties):
+        if rc == 0:
+            client.subscribe([(topic, 0) for topic in self.topics])
+            self.connected.set()
+
+    def on_disconnect(self, client, userdata, flags, rc, properties):
+        self.connected.clear()
+
+    def on_message(self, client, userdata, msg):
+        arrival = time.time()
+        self.messages += 1
+        sent = sample_time(msg.payload)
+        if sent is None:
+            self.untimed += 1
+        else:
+            with self._lags_lock:
+                self._lags.append(arrival - sent)
+
+    def start(self, timeout=CONNECT_TIMEOUT):
+        """Connect in the background; returns whether it connected within timeout"""
+        self.client.connect_async(BROKER, PORT, 60)
+        self.client.loop_start()
+        return self.connected.wait(timeout)
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def take_lags(self):
+        """Sorted lags recorded since the previous call"""
+        fresh = deque(maxlen=self.lag_samples)
+        with self._lags_lock:
+            lags, self._lags = self._lags, fresh
+        return sorted(lags)
+
+
+class IngestionProbe:
+    def __init__(self, tap=None, node_url=NODE_METRICS_URL, logger_url=LOGGER_METRICS_URL):
+        """
+        Args:
+            tap: TelemetryTap (default: a new one on TOPICS)
+            node_url: AI node metrics endpoint (None: do not compare)
+            logger_url: logger metrics endpoint (None: do not compare)
+        """
+        self.tap = tap or TelemetryTap()
+        self.sources = {"logger": logger_url, "node": node_url}
+        self._previous = None  # (time, tap messages, {source: counters})
+        self._started = False
+
+    def start(self, timeout=CONNECT_TIMEOUT):
+        """Start the tap (once; it reconnects by itself); returns whether it is connected"""
+        if not self._started:
+            self._started = True
+            return self.tap.start(timeout)
+        return self.tap.connected.wait(timeout)
+
+    def stop(self):
+        if self._started:
+            self.tap.stop()
+            self._started = False
+
+    @property
+    def has_baseline(self):
+        return self._previous is not None
+
+    def _counters(self, name, url):
+        """{received, dropped, backlog, last_write} as the consumer reports them"""
+        metrics = scrape(url)
+        if name == "logger":
+            return {
+                "received": sum(metric_sum(metrics, "ics_logger_received_total", topic=t) or 0
+                                for t in self.tap.topics),
+                "dropped": 0,
+                "backlog": metric_sum(metrics, "ics_logger_buffered"),
+                "last_write": metric_sum(metrics, "ics_logger_last_write_time_seconds"),
+            }
+        # The node takes telemetry as single messages, or as frames from the bridge
+        received = sum(metric_sum(metrics, "ics_messages_received_total", topic=t) or 0
+                       for t in self.tap.topics)
+        received += metric_sum(metrics, "ics_frame_samples_received_total") or 0
+        return {
+            "received": received,
+            "dropped": metric_sum(metrics, "ics_samples_dropped_total") or 0,
+            "backlog": metric_sum(metrics, "ics_queue_depth"),
+            "last_write": None,
+        }
+
+    def measure(self):
+        """
+        Snapshot the tap and the consumers' counters.
+
+        Returns a report of the interval since the previous call (rates and
+        drop rates are None on the first call, which only sets the baseline):
+          msgs_per_s, lag_p50_s, lag_p95_s, lag_max_s, untimed,
+          backlog_s and drop_rate (worst consumer),
+          logger / node: {msgs_per_s, backlog, backlog_s, drop_rate, error},
+          issues: threshold violations as text
+        """
+        if not self.tap.connected.is_set():
+            raise ConnectionError(f"telemetry tap not connected to {BROKER}:{PORT}")
+        now = time.time()
+        messages = self.tap.messages
+        lags = self.tap.take_lags()
+        counters, errors = {}, {}
+        for name, url in self.sources.items():
+            if url is None:
+                continue
+            try:
+                counters[name] = self._counters(name, url)
+            except (OSError, ValueError) as e:
+                errors[name] = str(getattr(e, "reason", e))
+
+        report = {
+            "msgs_per_s": None,
+            "lag_p50_s": percentile(lags, 50),
+            "lag_p95_s": percentile(lags, 95),
+            "lag_max_s": lags[-1] if lags else None,
+            "untimed": self.tap.untimed,
+            "backlog_s": None,
+            "drop_rate": None,
+            "issues": [],
+        }
+        previous, self._previous = self._previous, (now, messages, counters)
+
+        tapped = rate = None
+        if previous is not None and now > previous[0]:
+            tapped = messages - previous[1]
+            rate = report["msgs_per_s"] = tapped / (now - previous[0])
+
+        for name in self.sources:
+            if self.sources[name] is None:
+                continue
+            entry = report[name] = {"msgs_per_s": None, "backlog": None, "backlog_s": None,
+                                    "drop_rate": None, "error": errors.get(name)}
+            current = counters.get(name)
+            if current is None:
+                continue
+            entry["backlog"] = current["backlog"]
+            before = previous[2].get(name) if previous is not None else None
+            if before is not None and rate is not None:
+                received = current["received"] - before["received"]
+                dropped = current["dropped"] - before["dropped"]
+                if received >= 0:  # Otherwise the consumer restarted in between
+                    entry["msgs_per_s"] = received / (now - previous[0])
+                    if tapped >= MIN_MESSAGES:
+                        entry["drop_rate"] = min(1.0, max(0.0, 1 - (received - dropped) / tapped))
+            backlog_s = None
+            if current["backlog"] is not None and rate:
+                backlog_s = current["backlog"] / rate
+            if current["backlog"] and current["last_write"]:
+                # Records are buffered but nothing has been written for a while
+                backlog_s = max(backlog_s or 0.0, now - current["last_write"])
+            entry["backlog_s"] = backlog_s
+
+        # Worst consumer, and threshold checks
+        consumers = [report[name] for name in self.sources if name in report]
+        backlogs = [c["backlog_s"] for c in consumers if c["backlog_s"] is not None]
+        drops = [c["drop_rate"] for c in consumers if c["drop_rate"] is not None]
+        report["backlog_s"] = max(backlogs) if backlogs else None
+        report["drop_rate"] = max(drops) if drops else None
+
+        issues = report["issues"]
+        if report["lag_p95_s"] is not None and report["lag_p95_s"] > LAG_MAX:
+            issues.append(f"telemetry lag p95 {report['lag_p95_s']:.1f} s (> {LAG_MAX:g} s)")
+        for name in self.sources:
+            entry = report.get(name)
+            if entry is None:
+                continue
+            if entry["backlog_s"] is not None and entry["backlog_s"] > BACKLOG_MAX:
+                issues.append(f"{name} backlog {entry['backlog']:.0f} messages, "
+                              f"{entry['backlog_s']:.1f} s behind (> {BACKLOG_MAX:g} s)")
+            if entry["drop_rate"] is not None and entry["drop_rate"] > DROP_RATE_MAX:
+                issues.append(f"{name} missed {entry['drop_rate']:.1%} of telemetry "
+                              f"(> {DROP_RATE_MAX:.0%})")
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure telemetry rate, lag and consumer backlog")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement window")
+    args = parser.parse_args()
+
+    probe = IngestionProbe()
+    if not probe.start():
+        print(f"✗ Could not connect to {BROKER}:{PORT}")
+        return 1
+    try:
+        probe.measure()
+        time.sleep(args.seconds)
+        report = probe.measure()
+    finally:
+        probe.stop()
+    print(json.dumps(report, indent=2))
+    return 1 if report["issues"] else 0
+
+
+if __name__ == "__main__":
+    exit(main())
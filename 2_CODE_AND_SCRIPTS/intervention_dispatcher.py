@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+ICS AI Intervention Dispatcher
+Publishes security interventions (e.g. pump_shutdown) from a dedicated
+queue and worker thread, so a flood of anomalies cannot stall inference.
+
+Policy, applied in order on the worker thread:
+  1. Coalescing - a command already published less than `cooldown` seconds
+     ago is not re-sent; the suppressed count is reported with the next one.
+  2. Rate limit - a token bucket (`rate` per second, `burst` deep) caps the
+     total publish rate across all commands.
+  3. Publish at QoS 1 on ics/security/intervention.
+
+Dispatch latency (submit -> handed to the MQTT client) is recorded.
+
+Usage:
+  dispatcher = InterventionDispatcher(mqtt_client)
+  dispatcher.start()
+  dispatcher.submit("pump_shutdown", payload_dict)
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+# Defaults
+INTERVENTION_TOPIC = "ics/security/intervention"
+INTERVENTION_QOS = 1
+COOLDOWN = 5.0        # Seconds before the same command is published again
+RATE = 1.0            # Sustained publishes per second (all commands)
+BURST = 3             # Token bucket depth
+QUEUE_SIZE = 1000
+LATENCY_WINDOW = 1024
+
+log = logging.getLogger("ics.dispatcher")
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe (used by the worker only)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class InterventionDispatcher:
+    def __init__(self, client, topic=INTERVENTION_TOPIC, qos=INTERVENTION_QOS,
+                 cooldown=COOLDOWN, rate=RATE, burst=BURST, queue_size=QUEUE_SIZE):
+        """
+        Args:
+            client: connected paho MQTT client used for publishing
+            topic: intervention topic
+            qos: publish QoS
+            cooldown: coalescing window per command (seconds)
+            rate, burst: token bucket parameters
+            queue_size: bound on pending interventions; overflow is dropped
+        """
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.cooldown = cooldown
+        self.bucket = TokenBucket(rate, burst)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._running = False
+        self._last_sent = {}     # command -> monotonic time of last publish
+        self._suppressed = {}    # command -> coalesced count since last publish
+
+        # Statistics
+        self.submitted = 0
+        self.published = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.errors = 0
+        self.queued_offline = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="intervention-dispatcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop after publishing what is already queued"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, command, payload):
+        """Queue an intervention; never blocks. Returns False if dropped."""
+        self.submitted += 1
+        try:
+            self._queue.put_nowait((command, payload, time.perf_counter()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            try:
+                command, payload, submitted = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._dispatch(command, payload, submitted)
+
+    def _dispatch(self, command, payload, submitted):
+        now = time.monotonic()
+        last = self._last_sent.get(command)
+        if last is not None and now - last < self.cooldown:
+            self.coalesced += 1
+            self._suppressed[command] = self._suppressed.get(command, 0) + 1
+            return
+        if not self.bucket.take():
+            self.rate_limited += 1
+            self._suppressed[command] = self._suppressed.get(command, 0) + 1
+            return
+
+        payload = dict(payload, command=command,
+                       suppressed_since_last=self._suppressed.pop(command, 0))
+        try:
+            info = self.client.publish(self.topic, json.dumps(payload), qos=self.qos)
+            if info.rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0:
+                # paho keeps QoS 1 messages and sends them after reconnecting
+                self.queued_offline += 1
+            elif info.rc != mqtt.MQTT_ERR_SUCCESS:
+                raise RuntimeError(mqtt.error_string(info.rc))
+        except Exception as e:
+            self.errors += 1
+            log.warning("Intervention publish failed",
+                        extra={"fields": {"command": command, "error": str(e)}})
+            return
+
+        self._last_sent[command] = now
+        self.published += 1
+        self._latencies.append(time.perf_counter() - submitted)
+
+    def stats(self):
+        """Counters plus dispatch latency percentiles (ms)"""
+        stats = {
+            "submitted": self.submitted,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued_offline": self.queued_offline,
+            "queue_depth": self._queue.qsize(),
+        }
+        if self._latencies:
+            latencies = sorted(self._latencies)
+            pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000.0
+            stats.update(latency_p50_ms=pick(0.50), latency_p95_ms=pick(0.95),
+                         latency_max_ms=latencies[-1] * 1000.0)
+        return stats
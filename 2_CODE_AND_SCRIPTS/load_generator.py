@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+ICS Telemetry Load Generator
+Publishes synthetic telemetry for thousands of virtual devices at a fixed
+total rate, to find where the AI node, logger and broker saturate.
+
+Samples follow the normal rows of normal_training_data.csv: a multivariate
+normal fitted to the analog channels (so their correlation is kept), plus a
+small fixed offset per device so devices are not identical. Devices are
+named pump-0000, pump-0001, ... and publish round-robin.
+
+Attacks (the scenarios of test_attacks.simulate_attacks) can be injected
+into a fraction of the devices for a time window; injected samples carry
+is_anomaly=1 and mode "attack", like the recorded attack data:
+  spoofing   pressure sensor fixed at 5.0 (T0836)
+  injection  motor current doubled (T0831)
+  replay     earlier samples re-sent verbatim, old timestamps included (T0859)
+  flood      random garbage, FLOOD_MULTIPLIER messages per sample (T0819)
+
+Recorded telemetry - a logger CSV (timestamp, topic, data), a flat CSV such
+as normal_training_data.csv, or the telemetry_store directory - can be
+replayed with its original timing, sped up N times.
+
+Targets: a local Mosquitto (plain 1883 by default, --tls for 8883), or
+--stub, an in-process broker (StubBroker) that only counts and delivers to
+in-process subscribers, to measure the generator by itself. StubBroker.client()
+gives a paho-compatible client, so the AI node itself can run on the stub
+(benchmark_suite.py).
+
+Usage:
+  python3 load_generator.py --devices 2000 --rate 5000 --duration 60
+  python3 load_generator.py --rate 20000 --format frame --stub
+  python3 load_generator.py --rate 2000 --attack spoofing:20:10 --attack flood:40:5
+  python3 load_generator.py --replay ../3_DATA_AND_ARTIFACTS/security_logs.csv --speed 10
+"""
+
+import argparse
+import csv
+import json
+import os
+import ssl
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from telemetry_binary import FRAME_TOPIC, TOPIC as BIN_TOPIC, encode, encode_frame
+
+# Configuration
+BROKER = "localhost"
+PORT = 1883
+TLS_PORT = 8883
+USERNAME = "naim"
+PASSWORD = "1234"
+CA_CERT = "/etc/mosquitto/ca_certificates/ca.crt"
+CLIENT_ID = "ics_load_generator"
+TOPIC = "ics/telemetry/data"
+TRAINING_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "3_DATA_AND_ARTIFACTS", "normal_training_data.csv")
+
+# Defaults
+ANALOG = ['flow_rate', 'pressure', 'temperature', 'motor_current']
+FORMATS = {'json': TOPIC, 'bin': BIN_TOPIC, 'frame': FRAME_TOPIC}
+ATTACKS = ['spoofing', 'injection', 'replay', 'flood']
+DEVICE_SPREAD = 0.1     # Per-device offset, as a fraction of each channel's std
+FLOOD_MULTIPLIER = 10   # Garbage messages per flooded sample
+REPLAY_DEPTH = 32       # Past samples per device kept for replay attacks
+TICK = 0.005            # Pacing granularity (s)
+LAG_WARNING = 1.0       # Seconds behind schedule reported as saturation
+STATUS_INTERVAL = 10
+
+
+def parse_time(value):
+    """Epoch seconds from a number or an ISO 8601 string (None if neither)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.timestamp()
+
+
+class TelemetryProfile:
+    def __init__(self, mean, cov, pump_on=1.0):
+        """
+        Args:
+            mean: mean of the ANALOG channels
+            cov: their covariance matrix
+            pump_on: fraction of samples with pump_status 1
+        """
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.cov = np.asarray(cov, dtype=np.float64)
+        self.std = np.sqrt(np.diag(self.cov))
+        self.pump_on = pump_on
+        # Tiny jitter keeps the factorisation valid for (near-)constant channels
+        self._chol = np.linalg.cholesky(self.cov + np.eye(len(self.mean)) * 1e-9)
+
+    @classmethod
+    def from_csv(cls, path=TRAINING_DATA):
+        """Fit the profile to the normal (is_anomaly == 0) rows of a telemetry CSV"""
+        rows = []
+        pump = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if str(row.get('is_anomaly', '0')).strip() not in ('0', '0.0', ''):
+                    continue
+                try:
+                    rows.append([float(row[name]) for name in ANALOG])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if row.get('pump_status') not in (None, ''):
+                    pump.append(float(row['pump_status']))
+        if len(rows) < 2:
+            raise ValueError(f"{path}: not enough normal rows to fit a profile")
+        data = np.array(rows)
+        return cls(data.mean(axis=0), np.cov(data, rowvar=False),
+                   float(np.mean(pump)) if pump else 1.0)
+
+    def device_offsets(self, devices, rng):
+        return rng.normal(0.0, DEVICE_SPREAD, (devices, len(self.mean))) * self.std
+
+    def sample(self, offsets, rng):
+        """One sample per row of offsets (the devices being sampled)"""
+        z = rng.standard_normal((len(offsets), len(self.mean)))
+        return np.maximum(self.mean + offsets + z @ self._chol.T, 0.0)
+
+
+class AttackWindow:
+    def __init__(self, name, start, duration):
+        if name not in ATTACKS:
+            raise ValueError(f"unknown attack '{name}' (choose from {', '.join(ATTACKS)})")
+        self.name = name
+        self.start = start
+        self.end = start + duration
+
+    @classmethod
+    def parse(cls, spec):
+        """'name:start:duration' (seconds from the start of the run)"""
+        try:
+            name, start, duration = spec.split(':')
+            return cls(name, float(start), float(duration))
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"bad attack '{spec}': {e}") from None
+
+    def active(self, elapsed):
+        return self.start <= elapsed < self.end
+
+
+class StubMessage:
+    """The parts of paho's MQTTMessage that on_message callbacks use"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'mid')
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class StubPublishInfo:
+    """paho MQTTMessageInfo stand-in (stub publishes complete immediately)"""
+
+    __slots__ = ('mid', 'rc')
+
+    def __init__(self, mid, rc=mqtt.MQTT_ERR_SUCCESS):
+        self.mid = mid
+        self.rc = rc
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+
+class StubClient:
+    """The subset of paho's Client the node, logger and bridge use, on a StubBroker"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.connected = False
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.connected = True
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0, None)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self):
+        self.connected = False
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        """Accepts a topic or a list of (topic, qos), like paho"""
+        topics = [topic] if isinstance(topic, str) else [t for t, _ in topic]
+        for topic_filter in topics:
+            self.broker.subscribe(topic_filter, self._deliver)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self.connected:
+            return StubPublishInfo(0, mqtt.MQTT_ERR_NO_CONN)
+        rc = self.broker.publish(topic, payload or b'', qos, retain)
+        return StubPublishInfo(self.broker.published, rc)
+
+    def _deliver(self, message):
+        if self.connected and self.on_message is not None:
+            self.on_message(self, None, message)
+
+
+class StubBroker:
+    """
+    In-process stand-in for Mosquitto: publish() hands the message to every
+    matching subscriber synchronously, on the caller's thread.
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+        self._routes = {}  # topic -> matching callbacks (cache)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.bytes = 0
+
+    def client(self):
+        """A paho-compatible client connected through this broker"""
+        return StubClient(self)
+
+    def subscribe(self, topic_filter, callback):
+        """callback(StubMessage) for every message matching topic_filter (wildcards ok)"""
+        with self._lock:
+            self._subscriptions.append((topic_filter, callback))
+            self._routes = {}
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Deliver one message; returns MQTT_ERR_SUCCESS like paho's rc"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        callbacks = self._routes.get(topic)
+        if callbacks is None:
+            with self._lock:
+                callbacks = [callback for topic_filter, callback in self._subscriptions
+                             if mqtt.topic_matches_sub(topic_filter, topic)]
+                self._routes[topic] = callbacks
+        self.published += 1
+        self.bytes += len(payload)
+        if callbacks:
+            message = StubMessage(topic, payload, qos, retain, self.published)
+            for callback in callbacks:
+                callback(message)
+            self.delivered += len(callbacks)
+        return mqtt.MQTT_ERR_SUCCESS
+
+
+class LoadGenerator:
+    def __init__(self, publish_fn, profile, devices=1000, rate=1000.0, fmt='json',
+                 attacks=(), attack_fraction=0.1, frame_size=50, seed=0):
+        """
+        Initialize the generator.
+
+        Args:
+            publish_fn: callable(topic, payload) -> rc (0 on success)
+            profile: TelemetryProfile the normal samples are drawn from
+            devices: number of virtual devices
+            rate: total samples per second over all devices
+            fmt: 'json', 'bin' (telemetry_binary records) or 'frame'
+            attacks: AttackWindow list
+            attack_fraction: fraction of devices an attack targets
+            frame_size: max samples per frame (fmt='frame')
+            seed: random seed (runs are reproducible)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format '{fmt}'")
+        self.publish_fn = publish_fn
+        self.profile = profile
+        self.devices = devices
+        self.rate = rate
+        self.fmt = fmt
+        self.topic = FORMATS[fmt]
+        self.attacks = list(attacks)
+        self.frame_size = frame_size
+
+        self.rng = np.random.default_rng(seed)
+        self.offsets = profile.device_offsets(devices, self.rng)
+        self.targeted = np.zeros(devices, dtype=bool)
+        n_targeted = max(1, int(round(devices * attack_fraction))) if self.attacks else 0
+        self.targeted[self.rng.choice(devices, n_targeted, replace=False)] = True
+        self.device_ids = [f"pump-{i:04d}" for i in range(devices)]
+        self._history = np.zeros((devices, REPLAY_DEPTH, len(ANALOG) + 1))  # ts + ANALOG
+        self._history_count = np.zeros(devices, dtype=np.int64)
+        self._next_device = 0
+
+        # Statistics
+        self.samples = 0
+        self.messages = 0
+        self.errors = 0
+        self.max_lag = 0.0
+        self.attack_samples = {name: 0 for name in ATTACKS}
+
+    def _remember(self, devices, values, ts):
+        slots = self._history_count[devices] % REPLAY_DEPTH
+        self._history[devices, slots, 0] = ts
+        self._history[devices, slots, 1:] = values
+        self._history_count[devices] += 1
+
+    def generate(self, n, ts, elapsed):
+        """
+        Next n samples (round-robin over devices) with active attacks applied.
+        Returns (devices, values, timestamps, attack name per sample or None).
+        """
+        devices = (self._next_device + np.arange(n)) % self.devices
+        self._next_device = int(devices[-1] + 1) % self.devices
+        values = self.profile.sample(self.offsets[devices], self.rng)
+        timestamps = np.full(n, ts)
+        labels = [None] * n
+        self._remember(devices, values, ts)
+
+        for attack in self.attacks:
+            if not attack.active(elapsed):
+                continue
+            hit = np.flatnonzero(self.targeted[devices])
+            if not len(hit):
+                continue
+            if attack.name == 'spoofing':
+                values[hit, ANALOG.index('pressure')] = 5.0
+            elif attack.name == 'injection':
+                values[hit, ANALOG.index('motor_current')] *= 2.0
+            elif attack.name == 'replay':
+                # Oldest remembered sample, before the attack began if possible
+                count = self._history_count[devices[hit]]
+                slots = np.where(count > REPLAY_DEPTH, count % REPLAY_DEPTH, 0)
+                old = self._history[devices[hit], slots]
+                timestamps[hit] = old[:, 0]
+                values[hit] = old[:, 1:]
+            elif attack.name == 'flood':
+                values[hit] = self._garbage(len(hit))
+            for i in hit:
+                labels[i] = attack.name
+            self.attack_samples[attack.name] += len(hit)
+        return devices, values, timestamps, labels
+
+    def _garbage(self, n):
+        """Uniform junk in the ranges test_attacks.py floods with"""
+        return np.column_stack([self.rng.uniform(0, 100, n), self.rng.uniform(0, 50, n),
+                                self.rng.uniform(-10, 100, n), self.rng.uniform(0, 10, n)])
+
+    def _record(self, device, values, ts, label):
+        record = {name: round(float(v), 3) for name, v in zip(ANALOG, values)}
+        record['pump_status'] = int(label is not None or self.rng.random() < self.profile.pump_on)
+        record['mode'] = "normal" if label is None else "attack"
+        record['is_anomaly'] = int(label is not None)
+        record['device_id'] = self.device_ids[device]
+        return record
+
+    def _payloads(self, devices, values, timestamps, labels):
+        """Encode samples in the configured format (frames: several per payload)"""
+        if self.fmt == 'json':
+            iso = {}
+            for device, row, ts, label in zip(devices, values, timestamps, labels):
+                record = self._record(device, row, ts, label)
+                if ts not in iso:
+                    iso[ts] = datetime.fromtimestamp(ts, timezone.utc).isoformat(
+                        timespec='microseconds')
+                record['timestamp'] = iso[ts]
+                yield json.dumps(record)
+            return
+        records = [encode(self._record(device, row, ts, label), int(device), ts=float(ts))
+                   for device, row, ts, label in zip(devices, values, timestamps, labels)]
+        if self.fmt == 'bin':
+            yield from records
+        else:
+            for i in range(0, len(records), self.frame_size):
+                yield encode_frame(records[i:i + self.frame_size])
+
+    def _publish_all(self, payloads):
+        for payload in payloads:
+            if self.publish_fn(self.topic, payload) != 0:
+                self.errors += 1
+            self.messages += 1
+
+    def step(self, n, elapsed):
+        """Generate and publish n samples (plus any flood messages)"""
+        ts = time.time()
+        devices, values, timestamps, labels = self.generate(n, ts, elapsed)
+        self._publish_all(self._payloads(devices, values, timestamps, labels))
+        self.samples += n
+
+        flooded = [i for i, label in enumerate(labels) if label == 'flood']
+        if flooded:
+            extra = len(flooded) * FLOOD_MULTIPLIER
+            flood_devices = np.repeat(devices[flooded], FLOOD_MULTIPLIER)
+            self._publish_all(self._payloads(flood_devices, self._garbage(extra),
+                                             np.full(extra, ts), ['flood'] * extra))
+            self.attack_samples['flood'] += extra
+
+    def run(self, duration=None, stop_event=None):
+        """Publish at `rate` until duration elapses (or stop_event is set)"""
+        started = time.perf_counter()
+        last_status = started
+        max_chunk = max(1, int(self.rate * TICK * 4))
+        try:
+            while duration is None or time.perf_counter() - started < duration:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                now = time.perf_counter()
+                elapsed = now - started
+                due = int(elapsed * self.rate) - self.samples
+                if due <= 0:
+                    time.sleep(min(TICK, (self.samples + 1) / self.rate - elapsed))
+                    continue
+                # How far behind schedule the oldest due sample is
+                self.max_lag = max(self.max_lag, due / self.rate)
+                self.step(min(due, max_chunk), elapsed)
+                if now - last_status > STATUS_INTERVAL:
+                    self.log_status(elapsed)
+                    last_status = now
+        except KeyboardInterrupt:
+            print("\n\nStopping load generator...")
+        return self.stats(time.perf_counter() - started)
+
+    def stats(self, elapsed):
+        return {
+            "devices": self.devices,
+            "format": self.fmt,
+            "target_rate": self.rate,
+            "samples": self.samples,
+            "messages": self.messages,
+            "errors": self.errors,
+            "elapsed_s": elapsed,
+            "achieved_rate": self.samples / elapsed if elapsed > 0 else 0.0,
+            "max_lag_s": self.max_lag,
+            "saturated": self.max_lag > LAG_WARNING,
+            "attack_samples": {k: v for k, v in self.attack_samples.items() if v},
+        }
+
+    def log_status(self, elapsed):
+        rate = self.samples / elapsed if elapsed > 0 else 0.0
+        print(f"  {elapsed:6.1f}s  {self.samples} samples, {rate:.0f}/s "
+              f"(target {self.rate:.0f}/s), lag {self.max_lag * 1000:.0f} ms, "
+              f"errors {self.errors}")
+
+
+def load_recording(path):
+    """
+    Read recorded telemetry as a time-ordered list of (ts, topic, payload):
+    a logger CSV (timestamp, topic, data), a flat telemetry CSV, or a
+    telemetry_store directory.
+    """
+    messages = []
+    if os.path.isdir(path):
+        from telemetry_store import TelemetryStore, MISSING_INT
+        data = TelemetryStore(path).read()
+        names = [name for name in data if name != 'ts']
+        for i, ts in enumerate(data['ts']):
+            record = {}
+            for name in names:
+                value = data[name][i].item()
+                if value == value and not (data[name].dtype.kind == 'i' and value == MISSING_INT):
+                    record[name] = value
+            messages.append((float(ts), TOPIC, json.dumps(record).encode()))
+        return messages
+
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        logged = {'topic', 'data'} <= set(reader.fieldnames or ())
+        for row in reader:
+            ts = parse_time(row.get('timestamp'))
+            if ts is None:
+                continue
+            if logged:
+                messages.append((ts, row['topic'], row['data'].encode()))
+                continue
+            record = {}
+            for key, value in row.items():
+                if value in (None, ''):
+                    continue
+                try:
+                    number = float(value)
+                    record[key] = int(number) if number.is_integer() and '.' not in value else number
+                except ValueError:
+                    record[key] = value
+            messages.append((ts, TOPIC, json.dumps(record).encode()))
+    messages.sort(key=lambda message: message[0])
+    return messages
+
+
+def replay(publish_fn, messages, speed=1.0, stop_event=None):
+    """
+    Re-publish recorded messages keeping their spacing, `speed` times faster
+    (speed 0 = as fast as possible). Returns stats like LoadGenerator.stats().
+    """
+    if not messages:
+        raise ValueError("nothing to replay")
+    first = messages[0][0]
+    started = time.perf_counter()
+    sent = errors = 0
+    max_lag = 0.0
+    try:
+        for ts, topic, payload in messages:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if speed > 0:
+                delay = (ts - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            if publish_fn(topic, payload) != 0:
+                errors += 1
+            sent += 1
+    except KeyboardInterrupt:
+        print("\n\nStopping replay...")
+    elapsed = time.perf_counter() - started
+    return {
+        "samples": sent,
+        "messages": sent,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "recorded_s": messages[-1][0] - first,
+        "speed": speed,
+        "achieved_rate": sent / elapsed if elapsed > 0 else 0.0,
+        "max_lag_s": max_lag,
+        "saturated": max_lag > LAG_WARNING,
+    }
+
+
+def connect(host=BROKER, port=None, tls=False, qos=0):
+    """Connected paho client with a background loop; returns (client, publish_fn)"""
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                         client_id=f"{CLIENT_ID}_{os.getpid()}")
+    if tls:
+        client.username_pw_set(USERNAME, PASSWORD)
+        client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
+    client.max_queued_messages_set(0)
+    client.connect(host, port or (TLS_PORT if tls else PORT), 60)
+    client.loop_start()
+
+    def publish(topic, payload):
+        return client.publish(topic, payload, qos=qos).rc
+
+    return client, publish
+
+
+def print_stats(stats):
+    print(f"\n--- Load Generator Results ---")
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"  {key:<16} {value}")
+    if stats.get('saturated'):
+        print(f"  ⚠ Fell more than {LAG_WARNING:.0f}s behind schedule: the publisher "
+              f"(or the broker) is saturated at this rate")
+    print(f"------------------------------\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ICS telemetry load generator / replay")
+    parser.add_argument("--devices", type=int, default=1000,
+                        help="Virtual devices (default: 1000)")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="Total samples per second (default: 1000)")
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="Seconds to run (default: 60)")
+    parser.add_argument("--format", choices=list(FORMATS), default="json",
+                        help="json (ics/telemetry/data), bin or frame")
+    parser.add_argument("--frame-size", type=int, default=50,
+                        help="Samples per frame with --format frame (default: 50)")
+    parser.add_argument("--attack", type=AttackWindow.parse, action="append", default=[],
+                        metavar="NAME:START:DURATION",
+                        help=f"Inject an attack ({', '.join(ATTACKS)}); repeatable")
+    parser.add_argument("--attack-fraction", type=float, default=0.1,
+                        help="Fraction of devices attacked (default: 0.1)")
+    parser.add_argument("--profile", default=TRAINING_DATA,
+                        help="CSV whose normal rows define the sample distribution")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="Replay a logger CSV, telemetry CSV or telemetry_store dir")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed-up (0 = as fast as possible; default: 1)")
+    parser.add_argument("--stub", action="store_true",
+                        help="Publish to an in-process stub broker instead of MQTT")
+    parser.add_argument("--host", default=BROKER)
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"Broker port (default: {PORT}, or {TLS_PORT} with --tls)")
+    parser.add_argument("--tls", action="store_true",
+                        help="Connect with TLS and the node's credentials")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH",
+                        help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    client = None
+    if args.stub:
+        broker = StubBroker()
+        publish = broker.publish
+        print("Publishing to the in-process stub broker")
+    else:
+        try:
+            client, publish = connect(args.host, args.port, args.tls, args.qos)
+        except Exception as e:
+            print(f"✗ Could not connect to MQTT broker at {args.host}: {e}")
+            return 1
+        print(f"✓ Connected to MQTT broker at {args.host}")
+
+    try:
+        if args.replay:
+            messages = load_recording(args.replay)
+            print(f"Replaying {len(messages)} messages from {args.replay} at {args.speed}x")
+            stats = replay(publish, messages, args.speed)
+        else:
+            profile = TelemetryProfile.from_csv(args.profile)
+            generator = LoadGenerator(publish, profile, args.devices, args.rate, args.format,
+                                      args.attack, args.attack_fraction, args.frame_size,
+                                      args.seed)
+            print(f"Generating {args.rate:.0f} samples/s from {args.devices} devices "
+                  f"({args.format}) for {args.duration:.0f}s")
+            for attack in args.attack:
+                print(f"  Attack {attack.name}: {attack.start:.0f}-{attack.end:.0f}s on "
+                      f"{generator.targeted.sum()} devices")
+            stats = generator.run(args.duration)
+    finally:
+        if client is not None:
+            # QoS 0 messages still in paho's buffer would be lost on disconnect
+            deadline = time.time() + 10
+            while client.want_write() and time.time() < deadline:
+                time.sleep(0.05)
+            client.loop_stop()
+            client.disconnect()
+
+    print_stats(stats)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats, f, indent=2)
+        print(f"✓ Results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
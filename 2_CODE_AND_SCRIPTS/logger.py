@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+ICS Telemetry Logger
+Subscribes to ics/telemetry/data (JSON) and ics/telemetry/bin (struct-packed,
+see telemetry_binary.py) and persists every message, either to the
+time-partitioned columnar store (telemetry_store.py, default) or to the
+legacy security_logs.csv (columns: timestamp, topic, data). Binary records
+are written to the CSV as JSON, so the file format does not change.
+
+Records are buffered in memory and written in bulk - one write per batch
+(per column file, for the columnar store) instead of one per message. A batch
+is flushed when FLUSH_RECORDS messages are buffered or FLUSH_INTERVAL seconds
+have passed, whichever comes first.
+
+Durability:
+  - The MQTT session is persistent (fixed client id, QoS 1) and messages are
+    acknowledged only after the batch holding them has been written, so the
+    broker redelivers anything still buffered if the logger is killed.
+    Publishers using QoS 0 cannot be redelivered; their loss window is at
+    most one flush interval.
+  - The broker stops delivering QoS 1 messages once max_inflight_messages
+    (mosquitto default: 20) are unacknowledged, so a batch is also flushed
+    as soon as INFLIGHT_WINDOW unacknowledged messages are buffered. Raise
+    the broker limit to INFLIGHT_WINDOW (MQTT_SETUP_COMMANDS.md), or pass
+    --inflight-window 20 against a default broker (smaller batches).
+  - SIGTERM/SIGINT flush and fsync before exit; SIGHUP (sent by logrotate)
+    flushes and reopens the CSV file.
+  - A failed write keeps its batch for the next flush, up to MAX_BUFFERED
+    records; beyond that the oldest are dropped (and counted) so a full or
+    broken disk cannot exhaust memory. Dropped records are never
+    acknowledged, so QoS 1 publishers get them redelivered on reconnect.
+
+Metrics (received per topic, written, buffered, write errors, dropped, last
+write time) are served at http://127.0.0.1:9106/metrics (--metrics-port, 0
+disables); health_monitor.py compares them with the live telemetry rate.
+
+Usage:
+  python3 logger.py                          # Run as the ics_logger service
+  python3 logger.py --format csv             # Legacy security_logs.csv
+  python3 logger.py --fsync always           # fsync after every batch
+  python3 logger.py --format csv --output /tmp/test.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import signal
+import ssl
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from metrics_exporter import MetricsRegistry, MetricsServer
+from telemetry_binary import is_binary, decode as decode_binary, to_record
+
+# Configuration
+BROKER = "localhost"
+PORT = 8883
+USERNAME = "naim"
+PASSWORD = "1234"
+CA_CERT = "/etc/mosquitto/ca_certificates/ca.crt"
+CLIENT_ID = "ics_logger"
+TOPIC = "ics/telemetry/data"
+BIN_TOPIC = "ics/telemetry/bin"
+
+LOG_PATH = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv"
+STORE_DIR = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/telemetry_store"
+COLUMNS = ["timestamp", "topic", "data"]
+FORMATS = ["columnar", "csv"]
+
+# Write policy
+FLUSH_RECORDS = 1000   # Flush once this many records are buffered
+FLUSH_INTERVAL = 1.0   # ...or after this many seconds
+MAX_BUFFERED = 100000  # Records kept while writes fail; the oldest are dropped beyond this
+INFLIGHT_WINDOW = 1000  # Broker's max_inflight_messages (1_SETUP_DOCS/MQTT_SETUP_COMMANDS.md)
+FSYNC_INTERVAL = 5.0   # fsync period for the 'interval' policy
+FSYNC_POLICIES = ["always", "interval", "never"]
+METRICS_PORT = 9106
+METRICS_BIND = "127.0.0.1"
+
+
+class CsvSink:
+    """Appends rows to security_logs.csv with one write() per batch"""
+
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        self._fd = None
+
+    def open(self):
+        """Open the log file for appending, writing the header if it is new"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            self._write(",".join(COLUMNS) + "\n")
+
+    def reopen(self):
+        """Reopen the log file (after logrotate moved it)"""
+        self.close()
+        self.open()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def write(self, rows, fsync=False):
+        """
+        Write (receive_time, topic, payload bytes) rows. All or nothing: on
+        OSError the file is truncated back to where the batch started, so
+        the retried batch is not appended twice.
+        """
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerows((datetime.fromtimestamp(ts).isoformat(), topic, self._text(payload))
+                         for ts, topic, payload in rows)
+        offset = os.fstat(self._fd).st_size
+        try:
+            self._write(out.getvalue())
+            if fsync:
+                os.fsync(self._fd)
+        except OSError:
+            try:
+                os.ftruncate(self._fd, offset)
+            except OSError:
+                pass  # Nothing more we can do; the error below is what counts
+            raise
+        return len(rows)
+
+    @staticmethod
+    def _text(payload):
+        """CSV 'data' column: JSON text (binary records are converted)"""
+        if is_binary(payload):
+            try:
+                return json.dumps(decode_binary(payload))
+            except ValueError:
+                pass
+        return payload.decode(errors="replace")
+
+    def _write(self, text):
+        """Write the whole string, looping only on short writes"""
+        data = memoryview(text.encode())
+        while data:
+            n = os.write(self._fd, data)
+            data = data[n:]
+
+
+class ColumnarSink:
+    """Decodes payloads and appends them to the partitioned TelemetryStore"""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.store = None
+        self.invalid = 0
+
+    def open(self):
+        # Imported here so --format csv never needs numpy
+        from telemetry_store import TelemetryStore
+        self.store = TelemetryStore(self.root)
+
+    def reopen(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, rows, fsync=False):
+        """Write (receive_time, topic, payload bytes) rows as typed columns"""
+        timestamps, records = [], []
+        for ts, _, payload in rows:
+            try:
+                record = to_record(payload)
+            except ValueError:
+                self.invalid += 1
+                continue
+            if isinstance(record, dict):
+                timestamps.append(ts)
+                records.append(record)
+            else:
+                self.invalid += 1
+        return self.store.append(timestamps, records, fsync=fsync)
+
+
+class TelemetryLogger:
+    def __init__(self, sink, flush_records=FLUSH_RECORDS,
+                 flush_interval=FLUSH_INTERVAL, fsync_policy="interval", metrics_port=None,
+                 metrics_bind=METRICS_BIND, max_buffered=MAX_BUFFERED,
+                 inflight_window=INFLIGHT_WINDOW):
+        """
+        Initialize the telemetry logger.
+
+        Args:
+            sink: CsvSink or ColumnarSink that batches are written to
+            flush_records: buffered records that trigger an early flush
+            flush_interval: maximum seconds between flushes
+            fsync_policy: 'always' (every batch), 'interval' (every
+                          FSYNC_INTERVAL seconds) or 'never' (leave it to the OS)
+            metrics_port: serve Prometheus metrics on this port (None: off)
+            metrics_bind: address the metrics endpoint listens on
+            max_buffered: records kept for retry while writes fail
+            inflight_window: unacknowledged QoS 1 messages that trigger an
+                             early flush (the broker's max_inflight_messages)
+        """
+        self.sink = sink
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.max_buffered = max_buffered
+        self.inflight_window = inflight_window
+        self.running = False
+
+        # Buffered (row, mid, qos) tuples, swapped out wholesale on flush
+        self._buffer = []
+        self._unacked = 0  # Buffered messages with qos > 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reopen = False
+        self._flusher = None
+        self._last_fsync = time.monotonic()
+
+        # Statistics
+        self.received = 0
+        self.written = 0
+        self.flushes = 0
+        self.write_errors = 0
+        self.dropped = 0
+        self.flusher_errors = 0
+        self.last_write = 0.0
+
+        self.metrics_port = metrics_port
+        self.metrics_bind = metrics_bind
+        self.metrics_server = None
+        self.setup_metrics()
+
+        # MQTT setup: persistent session, acknowledge only after writing
+        self.client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=CLIENT_ID,
+            clean_session=False,
+            manual_ack=True
+        )
+        self.client.username_pw_set(USERNAME, PASSWORD)
+        self.client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def setup_metrics(self):
+        """Per-topic receive counters (MQTT thread) and scrape-time callbacks"""
+        self.metrics = registry = MetricsRegistry()
+        self.received_metrics = {
+            topic: registry.counter("ics_logger_received_total", "MQTT messages received",
+                                    topic=topic)
+            for topic in (TOPIC, BIN_TOPIC)}
+        registry.counter_fn("ics_logger_written_total", "Records handed to the sink",
+                            lambda: self.written)
+        registry.gauge_fn("ics_logger_buffered", "Records received but not yet written",
+                          lambda: len(self._buffer))
+        registry.counter_fn("ics_logger_flushes_total", "Batches written", lambda: self.flushes)
+        registry.counter_fn("ics_logger_write_errors_total", "Failed batch writes",
+                            lambda: self.write_errors)
+        registry.counter_fn("ics_logger_dropped_total",
+                            "Records dropped because writes kept failing",
+                            lambda: self.dropped)
+        registry.counter_fn("ics_logger_flusher_errors_total",
+                            "Unexpected errors in the flusher thread",
+                            lambda: self.flusher_errors)
+        registry.counter_fn("ics_logger_invalid_total", "Payloads the sink could not decode",
+                            lambda: getattr(self.sink, 'invalid', 0))
+        registry.gauge_fn("ics_logger_last_write_time_seconds",
+                          "Time of the last successful batch write (unix)",
+                          lambda: self.last_write)
+
+    def start_metrics(self):
+        """Serve the metrics endpoint, if configured"""
+        if self.metrics_port is None:
+            return
+        server = MetricsServer(self.metrics, port=self.metrics_port, bind=self.metrics_bind)
+        try:
+            server.start()
+        except OSError as e:
+            print(f"⚠ Metrics endpoint unavailable on {self.metrics_bind}:{self.metrics_port}: {e}")
+            return
+        self.metrics_server = server
+        print(f"  Metrics at http://{self.metrics_bind}:{server.port}/metrics")
+
+    def request_reopen(self, signum=None, frame=None):
+        """SIGHUP handler: ask the flusher thread to reopen the log file"""
+        self._reopen = True
+        self._wakeup.set()
+
+    def reopen_log(self):
+        """Flush and reopen the output (after logrotate moved it)"""
+        self.flush(force_fsync=True)
+        self.sink.reopen()
+        print(f"✓ Reopened log output")
+
+    def on_connect(self, client, userdata, flags, rc, properties):
+        """MQTT connection callback"""
+        if rc == 0:
+            print(f"✓ Connected to MQTT broker at {BROKER}:{PORT}")
+            client.subscribe([(TOPIC, 1), (BIN_TOPIC, 1)])
+            print(f"  Subscribed to: {TOPIC}, {BIN_TOPIC}")
+        else:
+            print(f"✗ MQTT connection failed with code {rc}")
+
+    def on_message(self, client, userdata, msg):
+        """MQTT message callback - buffer only, never touches the disk"""
+        row = (time.time(), msg.topic, msg.payload)
+
+        with self._lock:
+            self._buffer.append((row, msg.mid, msg.qos))
+            self.received += 1
+            pending = len(self._buffer)
+            if msg.qos > 0:
+                self._unacked += 1
+            unacked = self._unacked
+        self.received_metrics[msg.topic].inc()
+
+        # The broker sends no more QoS 1 messages until these are acked
+        if pending >= self.flush_records or unacked >= self.inflight_window:
+            self._wakeup.set()
+
+    def flush(self, force_fsync=False):
+        """Write all buffered records as one batch"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._unacked = 0
+        if not batch:
+            return 0
+
+        now = time.monotonic()
+        fsync = (force_fsync or self.fsync_policy == "always" or
+                 (self.fsync_policy == "interval" and now - self._last_fsync >= FSYNC_INTERVAL))
+
+        try:
+            self.sink.write([row for row, _, _ in batch], fsync=fsync)
+        except OSError as e:
+            # Put the batch back so it is retried, and leave it unacknowledged
+            self.write_errors += 1
+            with self._lock:
+                self._buffer[:0] = batch
+                overflow = len(self._buffer) - self.max_buffered
+                if overflow > 0:
+                    # Bounded memory: drop the oldest (the broker still holds QoS 1 copies)
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+                self._unacked = sum(1 for _, _, qos in self._buffer if qos > 0)
+            print(f"⚠ Write failed, {len(batch)} records kept in buffer"
+                  f"{f', {overflow} oldest dropped' if overflow > 0 else ''}: {e}")
+            return 0
+
+        if fsync:
+            self._last_fsync = now
+
+        # Records are on disk (or in the page cache): release them at the broker
+        for _, mid, qos in batch:
+            if qos > 0:
+                self.client.ack(mid, qos)
+
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_write = time.time()
+        return len(batch)
+
+    def _flush_loop(self):
+        """Background flusher: size- or interval-triggered"""
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                if self._reopen:
+                    self._reopen = False
+                    self.reopen_log()
+                else:
+                    self.flush()
+            except Exception as e:
+                # Keep flushing: a dead flusher would buffer (and never ack) forever
+                self.flusher_errors += 1
+                print(f"⚠ Flusher error: {type(e).__name__}: {e}")
+
+    def log_status(self):
+        """Log periodic status"""
+        print(f"\n--- Logger Status ---")
+        print(f"  Received: {self.received}")
+        print(f"  Written: {self.written}")
+        print(f"  Flushes: {self.flushes}")
+        if self.flushes:
+            print(f"  Avg batch: {self.written / self.flushes:.1f} records")
+        if getattr(self.sink, 'invalid', 0):
+            print(f"  Invalid payloads: {self.sink.invalid}")
+        print(f"  Write errors: {self.write_errors}")
+        if self.dropped or self.flusher_errors:
+            print(f"  Dropped: {self.dropped}, flusher errors: {self.flusher_errors}")
+        print(f"---------------------\n")
+
+    def shutdown(self, signum=None, frame=None):
+        """Stop the MQTT loop; remaining records are flushed by start()"""
+        self.running = False
+        self._wakeup.set()
+        self.client.disconnect()
+
+    def start(self):
+        """Start the logger"""
+        print(f"Starting telemetry logger -> {type(self.sink).__name__}")
+        print(f"  Flush: {self.flush_records} records / {self.flush_interval}s, "
+              f"fsync: {self.fsync_policy}")
+
+        self.sink.open()
+        self.start_metrics()
+        self.running = True
+        self._flusher = threading.Thread(target=self._flush_loop, name="log-flusher",
+                                         daemon=True)
+        self._flusher.start()
+
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGHUP, self.request_reopen)
+
+        try:
+            self.client.connect(BROKER, PORT, 60)
+            self.client.loop_forever()
+        except KeyboardInterrupt:
+            print("\n\nShutting down telemetry logger...")
+            self.shutdown()
+        except Exception as e:
+            print(f"\n✗ Error: {e}")
+            self.shutdown()
+        finally:
+            self._flusher.join(self.flush_interval + 1)
+            self.flush(force_fsync=True)
+            self.sink.close()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            self.log_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ICS Telemetry Logger")
+    parser.add_argument("--format", choices=FORMATS, default="columnar",
+                        help="columnar telemetry store (default) or legacy CSV")
+    parser.add_argument("--output", default=None,
+                        help=f"CSV file or store directory "
+                             f"(default: {STORE_DIR} or {LOG_PATH})")
+    parser.add_argument("--flush-records", type=int, default=FLUSH_RECORDS,
+                        help="Flush after this many buffered records")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="Maximum seconds between flushes")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="interval",
+                        help="fsync policy for written batches")
+    parser.add_argument("--max-buffered", type=int, default=MAX_BUFFERED,
+                        help="Records kept for retry while writes fail (oldest dropped beyond)")
+    parser.add_argument("--inflight-window", type=int, default=INFLIGHT_WINDOW,
+                        help="Flush once this many QoS 1 messages await an ack "
+                             "(the broker's max_inflight_messages)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Prometheus metrics port (default: {METRICS_PORT}, 0 disables)")
+    parser.add_argument("--metrics-bind", default=METRICS_BIND,
+                        help=f"Metrics listen address (default: {METRICS_BIND})")
+
+    args = parser.parse_args()
+
+    if args.format == "csv":
+        sink = CsvSink(args.output or LOG_PATH)
+    else:
+        sink = ColumnarSink(args.output or STORE_DIR)
+
+    logger = TelemetryLogger(sink, args.flush_records,
+                             args.flush_interval, args.fsync,
+                             metrics_port=args.metrics_port or None,
+                             metrics_bind=args.metrics_bind,
+                             max_buffered=args.max_buffered,
+                             inflight_window=args.inflight_window)
+    logger.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+ICS AI Metrics Exporter
+Prometheus text-format metrics for the AI node, served over HTTP
+(/metrics) and/or written to a node_exporter textfile-collector file.
+No prometheus_client dependency.
+
+Cheap updates: every metric has a single writer thread (e.g. the MQTT
+thread for received counts, the batcher thread for latencies), so an update
+is a plain attribute increment with no lock; scrapes read the values
+without stopping the writers. Values the node already counts (normal and
+anomaly counts, dispatcher stats, queue depth) are not counted twice: they
+are registered as callbacks evaluated at scrape time and cost nothing on
+the hot path.
+
+Usage:
+  registry = MetricsRegistry()
+  received = registry.counter("ics_messages_received_total", "Messages", topic="ics/telemetry/data")
+  latency = registry.histogram("ics_scoring_latency_seconds", "Latency", LATENCY_BUCKETS)
+  registry.gauge_fn("ics_queue_depth", "Queued samples", batcher.qsize)
+  received.inc(); latency.observe_many(latencies)
+  MetricsServer(registry, port=9105).start()          # curl localhost:9105/metrics
+
+Microbenchmark (ns per update):
+  python3 metrics_exporter.py
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Defaults
+METRICS_PORT = 9105
+METRICS_BIND = "127.0.0.1"   # Scrape locally (or through a reverse proxy)
+TEXTFILE_INTERVAL = 15.0     # Seconds between textfile exports
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = logging.getLogger("ics.metrics")
+
+
+def _labels(labels, extra=None):
+    items = dict(labels, **(extra or {}))
+    if not items:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for v in items.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(items, escaped)) + "}"
+
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    if value in (float('inf'), float('-inf')):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter; inc() from one thread only"""
+
+    kind = "counter"
+    __slots__ = ('labels', 'value')
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self, name):
+        return [(name, self.labels, self.value)]
+
+
+class Gauge:
+    """Value set by its owner thread"""
+
+    kind = "gauge"
+    __slots__ = ('labels', 'value')
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        return [(name, self.labels, self.value)]
+
+
+class Callback:
+    """Counter or gauge whose value is read from fn() at scrape time"""
+
+    __slots__ = ('labels', 'fn', 'kind')
+
+    def __init__(self, labels, fn, kind):
+        self.labels = labels
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self, name):
+        try:
+            value = self.fn()
+        except Exception:
+            value = float('nan')
+        return [(name, self.labels, value)]
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe*() from one thread only"""
+
+    kind = "histogram"
+    __slots__ = ('labels', 'bounds', 'counts', 'sum', 'count', '_bulk', '_edges')
+
+    def __init__(self, labels, buckets):
+        self.labels = labels
+        self.bounds = sorted(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot: > largest bound
+        self.sum = 0.0
+        self.count = 0
+        self._bulk = None   # numpy counts for observe_many (added to counts when read)
+        self._edges = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_many(self, values):
+        """Observe a batch (list or array) with one vectorized bucket pass"""
+        import numpy as np
+        if self._bulk is None:
+            self._edges = np.asarray(self.bounds, dtype=np.float64)
+            self._bulk = np.zeros(len(self.counts), dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        self._bulk += np.bincount(self._edges.searchsorted(values), minlength=len(self.counts))
+        self.sum += values.sum()
+        self.count += values.size
+
+    def samples(self, name):
+        rows = []
+        cumulative = 0
+        counts = list(self.counts)  # Snapshot; the writer may be mid-update
+        if self._bulk is not None:
+            counts = [a + int(b) for a, b in zip(counts, self._bulk)]
+        for bound, n in zip(self.bounds, counts):
+            cumulative += n
+            rows.append((f"{name}_bucket", dict(self.labels, le=_number(bound)), cumulative))
+        rows.append((f"{name}_bucket", dict(self.labels, le="+Inf"), cumulative + counts[-1]))
+        rows.append((f"{name}_sum", self.labels, float(self.sum)))
+        rows.append((f"{name}_count", self.labels, cumulative + counts[-1]))
+        return rows
+
+
+class MetricsRegistry:
+    """Metric families by name; each family holds one child per label set"""
+
+    def __init__(self):
+        self._families = {}  # name -> (kind, help, {label tuple: metric})
+        self._lock = threading.Lock()  # Registration and rendering only
+
+    def _child(self, name, help_text, kind, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError(f"metric {name} already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name, help_text, **labels):
+        return self._child(name, help_text, "counter", labels, lambda: Counter(labels))
+
+    def gauge(self, name, help_text, **labels):
+        return self._child(name, help_text, "gauge", labels, lambda: Gauge(labels))
+
+    def histogram(self, name, help_text, buckets, **labels):
+        return self._child(name, help_text, "histogram", labels,
+                           lambda: Histogram(labels, buckets))
+
+    def counter_fn(self, name, help_text, fn, **labels):
+        """Counter read from fn() when scraped (for values counted elsewhere)"""
+        return self._child(name, help_text, "counter", labels,
+                           lambda: Callback(labels, fn, "counter"))
+
+    def gauge_fn(self, name, help_text, fn, **labels):
+        """Gauge read from fn() when scraped"""
+        return self._child(name, help_text, "gauge", labels,
+                           lambda: Callback(labels, fn, "gauge"))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            families = [(name, kind, help_text, list(children.values()))
+                        for name, (kind, help_text, children) in self._families.items()]
+        lines = []
+        for name, kind, help_text, children in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in children:
+                for sample, labels, value in metric.samples(name):
+                    lines.append(f"{sample}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomically write render() for node_exporter's textfile collector"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the journal
+
+
+class MetricsServer:
+    def __init__(self, registry, port=METRICS_PORT, bind=METRICS_BIND,
+                 textfile=None, textfile_interval=TEXTFILE_INTERVAL):
+        """
+        Args:
+            registry: MetricsRegistry to expose
+            port: HTTP port (None: no HTTP endpoint)
+            bind: address to listen on
+            textfile: also write the metrics to this .prom file periodically
+            textfile_interval: seconds between textfile writes
+        """
+        self.registry = registry
+        self.port = port
+        self.bind = bind
+        self.textfile = textfile
+        self.textfile_interval = textfile_interval
+        self._httpd = None
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start serving; raises OSError if the port cannot be bound"""
+        if self.port is not None:
+            handler = type("MetricsHandler", (_Handler,), {"registry": self.registry})
+            self._httpd = ThreadingHTTPServer((self.bind, self.port), handler)
+            self._httpd.daemon_threads = True
+            self.port = self._httpd.server_address[1]
+            self._threads.append(threading.Thread(target=self._httpd.serve_forever,
+                                                  name="metrics-http", daemon=True))
+        if self.textfile:
+            self._threads.append(threading.Thread(target=self._textfile_loop,
+                                                  name="metrics-textfile", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        for thread in self._threads:
+            thread.join(2.0)
+        if self.textfile:
+            self._write_textfile()
+
+    def _write_textfile(self):
+        try:
+            self.registry.write_textfile(self.textfile)
+        except OSError as e:
+            log.warning(f"Metrics textfile write failed: {e}")
+
+    def _textfile_loop(self):
+        while not self._stop.wait(self.textfile_interval):
+            self._write_textfile()
+
+
+def benchmark(n=1000000):
+    """Per-update cost of the hot-path operations"""
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "Benchmark counter")
+    histogram = registry.histogram("bench_seconds", "Benchmark histogram", LATENCY_BUCKETS)
+    values = [0.003] * 64
+
+    def timed(label, fn, per):
+        started = time.perf_counter_ns()
+        fn()
+        print(f"  {label:<36} {(time.perf_counter_ns() - started) / per:7.1f} ns")
+
+    def loop_inc():
+        inc = counter.inc
+        for _ in range(n):
+            inc()
+
+    def loop_observe():
+        observe = histogram.observe
+        for _ in range(n):
+            observe(0.003)
+
+    def loop_many():
+        observe_many = histogram.observe_many
+        for _ in range(n // 64):
+            observe_many(values)
+
+    print(f"Metric update cost ({n} updates):")
+    timed("Counter.inc()", loop_inc, n)
+    timed("Histogram.observe()", loop_observe, n)
+    timed("Histogram.observe_many() per value", loop_many, n // 64 * 64)
+    started = time.perf_counter_ns()
+    registry.render()
+    print(f"  {'render()':<36} {(time.perf_counter_ns() - started) / 1000:7.1f} us")
+
+
+def main():
+    benchmark()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+ICS AI Model Watcher
+Polls the trained model files and calls back once a new version has been
+completely written, so the AI node can hot-swap it without a restart.
+
+A change is reported only after the files' (mtime, size) signature has
+stayed the same for one extra poll, which avoids picking up a model that
+train_model.py is still writing.
+
+Usage:
+  watcher = ModelWatcher([MODEL_PATH, COMPILED_MODEL_PATH, METADATA_PATH],
+                         on_change=node.reload_model)
+  watcher.start()
+"""
+
+import logging
+import os
+import threading
+
+# Defaults
+POLL_INTERVAL = 10.0  # seconds
+
+log = logging.getLogger("ics.watcher")
+
+
+class ModelWatcher:
+    def __init__(self, paths, on_change, interval=POLL_INTERVAL):
+        """
+        Args:
+            paths: files whose modification should trigger a reload
+            on_change: callable run on the watcher thread after a change settles
+            interval: seconds between polls
+        """
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._current = self.signature()
+
+    def signature(self):
+        """(mtime, size) of every watched file, None for missing ones"""
+        sig = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+
+    def _run(self):
+        pending = None
+        while not self._stop.wait(self.interval):
+            sig = self.signature()
+            if sig == self._current:
+                pending = None
+            elif sig == pending:
+                # Unchanged for a full poll: the writer is done
+                self._current = sig
+                pending = None
+                try:
+                    self.on_change()
+                except Exception:
+                    log.exception("Model reload callback failed")
+            else:
+                pending = sig
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+ICS AI Per-regime Isolation Forests
+One small forest per operating regime of the transfer system - transfer
+phase (A->B / B->A), valve pre-open transient and safety trip - instead of
+one large forest that has to cover them all, plus a global fallback forest
+for samples whose regime had too little training data (or whose state flags
+are missing or out of range).
+
+Routing is an O(1) table lookup per sample: the regime columns of the
+feature matrix are combined into a mixed-radix code (REGIME_LEVELS values
+each), and `table[code]` is the index of the forest that scores it. A batch
+is split by forest only when it actually mixes regimes.
+
+RegimeForest scores with any members that have decision_function(), so the
+same class wraps the sklearn forests train_model.py fits (pickled in the
+.pkl) and their compiled_forest exports (saved in the .npz, and hosted in
+shared memory by shared_forest.py for sharded scoring).
+
+Usage:
+  model = RegimeForest(models, table, columns)         # models[-1] = fallback
+  model.decision_function(X)                           # Routed per sample
+  model.compiled().save("isolation_forest_model.npz")
+  model = load_forest("isolation_forest_model.npz")    # compiled_forest.py
+
+Per-sample scoring cost against one global forest:
+  python3 regime_forest.py
+"""
+
+import numpy as np
+
+from compiled_forest import CompiledForest, export_forest
+
+# Regime definition: feature columns and number of values each can take
+REGIME_KEYS = ['phase', 'valve_opening', 'safety_trip']
+REGIME_LEVELS = [2, 2, 2]
+MIN_REGIME_ROWS = 200     # Training rows needed before a regime gets its own forest
+REGIME_ESTIMATORS = 25    # Trees per regime forest
+
+
+def regime_codes(values, levels=REGIME_LEVELS):
+    """
+    Mixed-radix regime code for each row of `values` (rows x regime keys),
+    or -1 where a value is missing, fractional or out of range.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    levels = np.asarray(levels)
+    valid = ((values >= 0) & (values < levels) & (values == np.floor(values))).all(axis=1)
+    strides = np.cumprod(np.concatenate(([1], levels[:0:-1])))[::-1]
+    codes = np.where(valid[:, None], values, 0).astype(np.intp) @ strides
+    codes[~valid] = -1
+    return codes
+
+
+def regime_name(code, keys=REGIME_KEYS, levels=REGIME_LEVELS):
+    """'phase=0,valve_opening=1,safety_trip=0' for a regime code"""
+    parts = []
+    for key, level in zip(reversed(keys), reversed(levels)):
+        code, value = divmod(code, level)
+        parts.append(f"{key}={value}")
+    return ",".join(reversed(parts))
+
+
+class RegimeForest:
+    def __init__(self, models, table, columns, keys=REGIME_KEYS, levels=REGIME_LEVELS):
+        """
+        Args:
+            models: forests (decision_function(X)); the last one is the fallback
+            table: model index for every regime code (prod(levels) entries)
+            columns: feature-matrix column of each regime key
+            keys: regime key names, in code order
+            levels: number of values of each key
+        """
+        self.models = list(models)
+        self.table = np.asarray(table, dtype=np.intp)
+        self.columns = np.asarray(columns, dtype=np.intp)
+        self.keys = list(keys)
+        self.levels = [int(level) for level in levels]
+        if self.table.size != int(np.prod(self.levels)):
+            raise ValueError(f"regime table has {self.table.size} entries, "
+                             f"expected {int(np.prod(self.levels))}")
+        self.fallback = len(self.models) - 1
+        self.n_features_in_ = self.models[0].n_features_in_
+        self.n_estimators = sum(model.n_estimators for model in self.models)
+        self.contamination = self.models[0].get_params().get('contamination')
+
+    def get_params(self):
+        """Subset of sklearn's get_params() used for logging"""
+        return {'n_estimators': self.n_estimators, 'contamination': self.contamination,
+                'regimes': self.fallback}
+
+    def route(self, X):
+        """Index of the forest that scores each row"""
+        codes = regime_codes(X[:, self.columns], self.levels)
+        return np.where(codes >= 0, self.table[codes], self.fallback)
+
+    def decision_function(self, X):
+        """Anomaly score from each row's regime forest (< 0 means anomaly)"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected "
+                             f"(n_samples, {self.n_features_in_})")
+        index = self.route(X)
+        if index.size and (index == index[0]).all():
+            # Common case: a batch from one regime
+            return self.models[index[0]].decision_function(X)
+        scores = np.empty(len(X))
+        for model in np.unique(index):
+            rows = index == model
+            scores[rows] = self.models[model].decision_function(X[rows])
+        return scores
+
+    def predict(self, X):
+        """Return -1 for anomalies and 1 for normal samples"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def regimes(self):
+        """{regime name: model index} for the regimes with their own forest"""
+        return {regime_name(code, self.keys, self.levels): int(model)
+                for code, model in enumerate(self.table) if model != self.fallback}
+
+    # ------------------------------------------------------------------
+    # Compiled form
+    # ------------------------------------------------------------------
+    def compiled(self):
+        """Same routing with every member exported to a CompiledForest"""
+        return RegimeForest([model if isinstance(model, CompiledForest) else export_forest(model)
+                             for model in self.models],
+                            self.table, self.columns, self.keys, self.levels)
+
+    def arrays(self):
+        """Routing arrays plus each member's arrays, prefixed m<index>_"""
+        arrays = {'regime_table': self.table.astype(np.int32),
+                  'regime_columns': self.columns.astype(np.int32),
+                  'regime_levels': np.asarray(self.levels, dtype=np.int32),
+                  'regime_keys': np.asarray(self.keys)}
+        for i, model in enumerate(self.models):
+            arrays.update({f"m{i}_{name}": value for name, value in model.arrays().items()})
+        return arrays
+
+    def save(self, path):
+        """Save as one uncompressed .npz (compiled members only)"""
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        members = {}
+        for name in arrays:
+            if name.startswith("m") and "_" in name and name[1:name.index("_")].isdigit():
+                index, field = name[1:].split("_", 1)
+                members.setdefault(int(index), {})[field] = arrays[name]
+        models = [CompiledForest(members[i]) for i in sorted(members)]
+        return cls(models, arrays['regime_table'], arrays['regime_columns'],
+                   [str(key) for key in arrays['regime_keys']], arrays['regime_levels'])
+
+
+def benchmark(n_rows=20000, batch=64, seed=42):
+    """Per-sample scoring cost: one 100-tree forest vs. 8 regime forests of 25"""
+    import time
+    from sklearn.ensemble import IsolationForest
+
+    rng = np.random.default_rng(seed)
+    states = rng.integers(0, 2, (n_rows, 3)).astype(np.float64)
+    analog = rng.normal(size=(n_rows, 4)) + states @ rng.normal(size=(3, 4)) * 3
+    X = np.hstack([analog, states, rng.integers(0, 2, (n_rows, 2))])
+    columns = [4, 5, 6]
+
+    single = export_forest(IsolationForest(n_estimators=100, random_state=0).fit(X))
+    codes = regime_codes(X[:, columns])
+    models, table = [], np.full(8, -1)
+    for code in range(8):
+        table[code] = len(models)
+        models.append(export_forest(IsolationForest(n_estimators=REGIME_ESTIMATORS,
+                                                    random_state=0).fit(X[codes == code])))
+    models.append(export_forest(IsolationForest(n_estimators=REGIME_ESTIMATORS,
+                                                random_state=0).fit(X)))
+    regime = RegimeForest(models, table, columns)
+
+    def timed(label, model, rows):
+        started = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            model.decision_function(rows[i:i + batch])
+        print(f"  {label:<40} {(time.perf_counter() - started) / len(rows) * 1e6:7.1f} us")
+
+    one_regime = X[codes == 0]
+    print(f"Scoring cost per sample (batches of {batch}):")
+    timed("global forest, 100 trees", single, X)
+    timed("regime forests, 8 x 25 trees (mixed)", regime, X)
+    timed("regime forests, single-regime batches", regime, one_regime)
+    print(f"  nodes: global {single.feature.size}, "
+          f"regimes {sum(m.feature.size for m in models)}; max depth global "
+          f"{single.max_depth}, regimes {max(m.max_depth for m in models)}")
+
+
+def main():
+    benchmark()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+ICS AI Security Node - Sharded Multi-process Inference
+Spreads JSON decoding, feature extraction and scoring over N worker
+processes so the node can use every core of the Pi 5; the MQTT (I/O)
+process only routes raw payloads and dispatches results.
+
+Messages are partitioned by device number modulo N (the binary record's, or
+window_features.device_key of the JSON "device_id", found without decoding),
+so each device's samples - JSON, binary or framed - reach the same worker in
+order and its sliding-window state lives in exactly one process. Payloads without a device ID all go to
+one shard. Multi-sample frames are split by device number into one sub-frame
+per shard and sent at once. Per-shard batches are flushed on size or age,
+like MicroBatcher, and scored results are merged back on a single thread in
+the I/O process for intervention dispatch.
+
+The model is hosted once in shared memory (shared_forest.py): workers map
+the same read-only tree arrays, so each extra worker costs almost no model
+memory, and a hot-swap is a new file plus a generation pointer flip.
+
+A payload that cannot be decoded is counted as invalid and skipped; it never
+takes its worker down. A worker that dies anyway (killed, out of memory) is
+respawned by the flusher thread with a fresh inbox - its devices lose their
+window state and whatever was queued for it, but keep being scored.
+
+Usage (from the AI node):
+  shards = ShardedScorer(4, model, FEATURES, window_config, on_scored)
+  shards.start()
+  shards.submit(msg.payload)
+
+Benchmark (throughput vs. worker count):
+  python3 sharded_inference.py isolation_forest_model.npz --workers 1,2,4
+"""
+
+import json
+import logging
+import multiprocessing as mp
+import queue
+import re
+import signal
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from batch_inference import BATCH_SIZE, BATCH_MAX_DELAY, QUEUE_SIZE, LATENCY_WINDOW
+from shared_forest import SharedModelHost, SharedModelReader
+from telemetry_binary import PREFIX as BINARY_PREFIX, decode_frame, frame_from_array, \
+    is_frame
+from window_features import device_key
+
+# Defaults
+DEVICE_PATTERN = re.compile(rb'"device_id"\s*:\s*"?([^",}\s]*)')
+RESULT_POLL = 0.5  # Seconds the merger waits before re-checking for shutdown
+WORKER_CHECK_INTERVAL = 1.0  # Seconds between liveness checks of the workers
+
+log = logging.getLogger("ics.shards")
+
+
+def load_scoring_model(path):
+    """Load a compiled (.npz) or joblib (.pkl) Isolation Forest"""
+    if path.endswith('.npz'):
+        from compiled_forest import load_forest
+        return load_forest(path)
+    import joblib
+    return joblib.load(path)
+
+
+def shard_of(payload, n_shards):
+    """Stable shard index for a raw JSON or binary payload"""
+    if payload[:1] == BINARY_PREFIX:
+        # Same rule as frames, which are split by device number (split_frame)
+        return int.from_bytes(payload[2:4], 'little') % n_shards
+    # A JSON device_id goes where its device number's frames go
+    match = DEVICE_PATTERN.search(payload)
+    return device_key(match.group(1)) % n_shards if match else 0
+
+
+def split_frame(payload, n_shards):
+    """[(shard, sub-frame payload)] for a frame, samples kept in order"""
+    records = decode_frame(payload)
+    shards = records['device'] % n_shards
+    first = shards[0] if len(shards) else 0
+    if (shards == first).all():
+        return [(int(first), bytes(payload))]
+    return [(int(shard), frame_from_array(records[shards == shard]))
+            for shard in np.unique(shards)]
+
+
+def _worker(shard, inbox, outbox, generation, prefix, fields, window_config):
+    """Scoring process: decode, build features, score, send back results"""
+    from window_features import WindowFeatureEngine, TelemetryFeatures
+    from telemetry_decoder import TelemetryDecoder
+
+    # Ctrl-C goes to the whole process group; the I/O process coordinates shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shared = SharedModelReader(generation, prefix)
+    shared.current()
+    engine = WindowFeatureEngine.from_config(window_config) if window_config else None
+    features = TelemetryFeatures(fields, engine)
+    decoder = TelemetryDecoder(fields)
+
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        payloads, arrivals = message
+        frames = {k: decoder.decode_frame(payload) for k, payload in enumerate(payloads)
+                  if is_frame(payload)}
+        n_rows = len(payloads) + sum(len(frame) - 1 for frame in frames.values())
+        X = np.empty((n_rows, features.n_features))
+        records, times, invalid = [], [], 0
+        for k, (payload, ts) in enumerate(zip(payloads, arrivals)):
+            frame = frames.get(k)
+            if frame is not None:
+                block = X[len(records):len(records) + len(frame)]
+                decoder.frame_into(frame, block)
+                features.fill_window_rows(frame.array['device'].tolist(), block,
+                                          frame.array['ts'].tolist())
+                records.extend(frame)
+                times.extend([ts] * len(frame))
+                continue
+            row = X[len(records)]
+            try:
+                record = decoder.decode_into(payload, row)
+                features.fill_window(record, row, ts)
+            except Exception:
+                # One bad payload must not take down the shard's devices
+                invalid += 1
+                continue
+            records.append(record)
+            times.append(ts)
+
+        scores = np.empty(0)
+        error = None
+        if records:
+            try:
+                scores = shared.current().decision_function(X[:len(records)])
+            except Exception as e:
+                error = str(e)
+        # Only anomalous samples travel back with their decoded message
+        anomalies = [(int(i), decoder.as_dict(records[i])) for i in np.flatnonzero(scores < 0)]
+        outbox.put((shard, scores, anomalies, times, invalid, error))
+
+    outbox.put((shard, None, None, None, 0, None))
+
+
+class ShardedScorer:
+    def __init__(self, n_workers, model, fields, window_config, result_fn,
+                 max_batch=BATCH_SIZE, max_delay=BATCH_MAX_DELAY, queue_size=QUEUE_SIZE):
+        """
+        Initialize the sharded scorer.
+
+        Args:
+            n_workers: number of scoring processes
+            model: CompiledForest, RegimeForest or fitted IsolationForest, shared
+                   with the workers
+            fields: telemetry keys of the feature row (FEATURES)
+            window_config: 'window' block of the model metadata, or None
+            result_fn: callable(scores, contexts, latencies) run on the merger
+                       thread; contexts holds the decoded message for anomalous
+                       samples (score < 0) and None for the others
+            max_batch: flush a shard when this many payloads are buffered
+            max_delay: flush a shard when its oldest payload has waited this long (s)
+            queue_size: payloads in flight per shard before new ones are dropped
+        """
+        self.n_workers = n_workers
+        self.model = model
+        self.fields = list(fields)
+        self.window_config = window_config
+        self.result_fn = result_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_batches = max(1, queue_size // max_batch)
+
+        self._ctx = mp.get_context("spawn")
+        self._host = SharedModelHost(self._ctx)
+        self._inboxes = []
+        self._outbox = None
+        self._workers = []
+        self._buffers = [[] for _ in range(n_workers)]
+        self._lock = threading.Lock()
+        self._running = False
+        self._flusher = None
+        self._merger = None
+        self._checked = 0.0
+
+        # Statistics
+        self.batches = 0
+        self.samples = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.errors = 0
+        self.restarts = 0
+        self.per_shard = [0] * n_workers
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        """Spawn the workers and start the flusher and merger threads"""
+        if self._workers:
+            return
+        # Workers and this process all score with the one mapped copy
+        self.model = self._host.publish(self.model)
+        self._outbox = self._ctx.Queue()
+        for shard in range(self.n_workers):
+            inbox, worker = self._spawn(shard)
+            self._inboxes.append(inbox)
+            self._workers.append(worker)
+
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, name="shard-flusher",
+                                         daemon=True)
+        self._merger = threading.Thread(target=self._merge_loop, name="shard-merger",
+                                        daemon=True)
+        self._flusher.start()
+        self._merger.start()
+
+    def _spawn(self, shard):
+        """Start a scoring process for one shard; returns (inbox, process)"""
+        inbox = self._ctx.Queue(maxsize=self.queue_batches)
+        worker = self._ctx.Process(
+            target=_worker, name=f"scorer-{shard}", daemon=True,
+            args=(shard, inbox, self._outbox, self._host.generation,
+                  self._host.prefix, self.fields, self.window_config))
+        worker.start()
+        return inbox, worker
+
+    def _check_workers(self):
+        """Respawn any worker that died; its devices keep being scored"""
+        for shard, worker in enumerate(self._workers):
+            if worker.is_alive() or not self._running:
+                continue
+            log.error(f"Scoring worker {shard} exited (code {worker.exitcode}), restarting")
+            inbox, replacement = self._spawn(shard)
+            with self._lock:
+                # A fresh inbox: the dead process may have held the old one's lock
+                old, self._inboxes[shard] = self._inboxes[shard], inbox
+                self._workers[shard] = replacement
+            old.cancel_join_thread()
+            old.close()
+            self.restarts += 1
+
+    def stop(self, timeout=5.0):
+        """Flush buffered payloads, let workers finish their queues, then stop"""
+        if not self._workers:
+            return
+        self._running = False
+        self._flusher.join(timeout)
+        self._flush(force=True)
+        for inbox in self._inboxes:
+            inbox.put(None)
+        self._merger.join(timeout)
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers, self._inboxes = [], []
+        self._host.close()
+
+    def submit(self, payload):
+        """
+        Route one raw telemetry payload (bytes) to its device's shard.
+        Safe to call from the paho thread; never blocks. Frames are split
+        per shard and sent right away (ValueError if malformed).
+        """
+        if is_frame(payload):
+            parts = split_frame(payload, self.n_workers)
+            arrival = time.time()
+            with self._lock:
+                for shard, part in parts:
+                    self._buffers[shard].append((part, arrival))
+                    self._send(shard)
+            return
+        shard = shard_of(payload, self.n_workers)
+        with self._lock:
+            buffer = self._buffers[shard]
+            buffer.append((payload, time.time()))
+            if len(buffer) >= self.max_batch:
+                self._send(shard)
+
+    def swap_model(self, model):
+        """Publish a new model; each worker switches before its next batch"""
+        self.model = self._host.publish(model)
+        return self.model
+
+    def worker_pids(self):
+        return [worker.pid for worker in self._workers]
+
+    def qsize(self):
+        """Approximate payloads waiting in the I/O process"""
+        return sum(len(b) for b in self._buffers)
+
+    def _send(self, shard):
+        """Hand one shard's buffer to its worker (caller holds the lock)"""
+        buffer, self._buffers[shard] = self._buffers[shard], []
+        payloads = [payload for payload, _ in buffer]
+        arrivals = [ts for _, ts in buffer]
+        try:
+            self._inboxes[shard].put_nowait((payloads, arrivals))
+        except queue.Full:
+            self.dropped += len(buffer)
+
+    def _flush(self, force=False):
+        """Send every shard buffer whose oldest payload is past max_delay"""
+        deadline = time.time() - self.max_delay
+        with self._lock:
+            for shard, buffer in enumerate(self._buffers):
+                if buffer and (force or buffer[0][1] <= deadline):
+                    self._send(shard)
+
+    def _flush_loop(self):
+        while self._running:
+            time.sleep(self.max_delay / 2)
+            self._flush()
+            now = time.monotonic()
+            if now - self._checked >= WORKER_CHECK_INTERVAL:
+                self._checked = now
+                try:
+                    self._check_workers()
+                except Exception:
+                    log.exception("Worker restart failed")
+
+    def _merge_loop(self):
+        """Collect scored batches from all workers and pass them on in one thread"""
+        remaining = self.n_workers
+        while remaining:
+            try:
+                shard, scores, anomalies, times, invalid, error = self._outbox.get(
+                    timeout=RESULT_POLL)
+            except queue.Empty:
+                if not self._running and not any(w.is_alive() for w in self._workers):
+                    break
+                continue
+            if scores is None:
+                remaining -= 1
+                continue
+
+            self.invalid += invalid
+            if error is not None:
+                self.errors += 1
+                log.error(f"Shard {shard} inference error ({len(times)} samples): {error}")
+                continue
+            if not len(scores):
+                continue
+
+            done = time.time()
+            latencies = [done - ts for ts in times]
+            contexts = [None] * len(scores)
+            for i, data in anomalies:
+                contexts[i] = data
+            self._latencies.extend(latencies)
+            self.batches += 1
+            self.samples += len(scores)
+            self.per_shard[shard] += len(scores)
+
+            try:
+                self.result_fn(scores, contexts, latencies)
+            except Exception:
+                # Keep merging: a dead merger would strand every worker's results
+                self.errors += 1
+                log.exception(f"Result handler error (shard {shard}, {len(scores)} samples)")
+
+    def stats(self):
+        """Return batch and latency statistics (latencies in ms)"""
+        latencies = np.fromiter(self._latencies, dtype=np.float64) * 1000.0
+        stats = {
+            "batches": self.batches,
+            "samples": self.samples,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "queue_depth": self.qsize(),
+            "mean_batch_size": (self.samples / self.batches) if self.batches else 0.0,
+            "workers_alive": sum(w.is_alive() for w in self._workers),
+            "per_shard": list(self.per_shard),
+            "model_generation": self._host.generation.value,
+            "model_bytes": self._host.nbytes,
+        }
+        if latencies.size:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats.update(latency_p50_ms=p50, latency_p95_ms=p95,
+                         latency_p99_ms=p99, latency_max_ms=latencies.max())
+        return stats
+
+
+def make_payloads(n, devices, seed=0):
+    """Synthetic telemetry payloads spread over `devices` device IDs"""
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for i in range(n):
+        payloads.append(json.dumps({
+            "device_id": f"pump-{i % devices:03d}",
+            "flow_rate": round(float(rng.normal(50, 5)), 2),
+            "pressure": round(float(rng.normal(5, 0.5)), 2),
+            "temperature": round(float(rng.normal(60, 3)), 2),
+            "motor_current": round(float(rng.normal(10, 1)), 2),
+            "phase": int(rng.integers(0, 3)),
+            "valve_opening": int(rng.integers(0, 100)),
+            "safety_trip": 0, "a_high": 0, "b_low": 0,
+        }).encode())
+    return payloads
+
+
+def pss_kb(pid):
+    """Proportional set size of a process (shared pages split between users)"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def benchmark(model_path, worker_counts, messages, devices, window_config=None):
+    """Push `messages` payloads through each worker count and report msg/s"""
+    from ai_security_node_final import FEATURES
+
+    model = load_scoring_model(model_path)
+    payloads = make_payloads(messages, devices)
+    results = []
+    for n_workers in worker_counts:
+        done = threading.Event()
+        scored = [0]
+
+        def on_scored(scores, contexts, latencies):
+            scored[0] += len(scores)
+            if scored[0] >= messages:
+                done.set()
+
+        shards = ShardedScorer(n_workers, model, FEATURES, window_config, on_scored,
+                               queue_size=messages)
+        shards.start()
+        # Warm up: wait until every worker has loaded the model and scored once
+        for i in range(n_workers * shards.max_batch):
+            shards.submit(payloads[i % len(payloads)])
+        while shards.samples < n_workers * shards.max_batch:
+            if shards.stats()['workers_alive'] < n_workers:
+                shards.stop()
+                raise RuntimeError("a scoring worker exited during warm-up")
+            time.sleep(0.01)
+        scored[0] = 0
+
+        started = time.perf_counter()
+        for payload in payloads:
+            shards.submit(payload)
+        done.wait(timeout=600)
+        elapsed = time.perf_counter() - started
+        stats = shards.stats()
+        memory = [pss_kb(pid) for pid in shards.worker_pids()]
+        shards.stop()
+
+        rate = scored[0] / elapsed
+        results.append((n_workers, rate))
+        print(f"  {n_workers} worker(s): {rate:>10,.0f} msg/s  "
+              f"p95 {stats.get('latency_p95_ms', 0):7.1f} ms  dropped {stats['dropped']}")
+        if None not in memory:
+            print(f"    worker PSS: {', '.join(f'{kb / 1024:.1f}' for kb in memory)} MB "
+                  f"(shared model file {stats['model_bytes'] / 1024:.0f} KB)")
+
+    base = results[0][1]
+    print(f"\n  Speed-up vs {results[0][0]} worker(s): " +
+          ", ".join(f"{n}: {rate / base:.2f}x" for n, rate in results))
+    print(f"  (CPU cores available: {mp.cpu_count()})")
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sharded inference throughput benchmark")
+    parser.add_argument("model", help="Compiled .npz or joblib .pkl model")
+    parser.add_argument("--workers", default="1,2,4",
+                        help="Comma-separated worker counts to compare")
+    parser.add_argument("--messages", type=int, default=200000,
+                        help="Messages per run")
+    parser.add_argument("--devices", type=int, default=64,
+                        help="Distinct device IDs in the synthetic stream")
+    parser.add_argument("--metadata", default=None,
+                        help="Model metadata JSON (to enable window features)")
+    args = parser.parse_args()
+
+    window_config = None
+    if args.metadata:
+        with open(args.metadata) as f:
+            window_config = json.load(f).get('window')
+
+    print(f"Benchmarking {args.model}: {args.messages} messages, {args.devices} devices")
+    benchmark(args.model, [int(n) for n in args.workers.split(',')],
+              args.messages, args.devices, window_config)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
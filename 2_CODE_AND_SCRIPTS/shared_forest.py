@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+ICS AI Shared-memory Model Hosting
+Publishes a CompiledForest (or a RegimeForest of them) as one flat file on
+tmpfs (/dev/shm) that every scoring worker memory-maps read-only, so N
+workers share a single physical copy of the tree arrays instead of each
+unpickling their own.
+
+File layout: MAGIC, 8-byte header length, JSON header (scalars and the
+dtype/shape/offset of each array), then the arrays, 64-byte aligned and in
+the exact dtypes CompiledForest uses, so mapping them copies nothing. A
+RegimeForest stores its routing in the header and each member's arrays
+under an m<index>_ prefix.
+
+Hot-swap: the host writes generation g+1 to a new file and then flips a
+shared integer (the generation pointer). Workers compare the pointer before
+each batch and map the new file when it changes; the previous file is
+unlinked right away, which is safe because existing mappings stay valid.
+
+Usage:
+  host = SharedModelHost(mp.get_context("spawn"))
+  host.publish(model)                                   # I/O process
+  reader = SharedModelReader(host.generation, host.prefix)
+  reader.current().decision_function(X)                 # worker process
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from compiled_forest import CompiledForest, ARRAYS
+from regime_forest import RegimeForest
+
+# Defaults
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+MAGIC = b"ICSFRST1"
+ALIGN = 64
+
+# Array dtypes as CompiledForest holds them (no conversion when mapped)
+DTYPES = {
+    'roots': np.intp,
+    'feature': np.intp,
+    'threshold': np.float64,
+    'left': np.intp,
+    'right': np.intp,
+    'missing_left': np.bool_,
+    'leaf_value': np.float64,
+}
+
+
+def as_compiled(model):
+    """Return model in compiled form (exporting sklearn models)"""
+    if isinstance(model, CompiledForest):
+        return model
+    if isinstance(model, RegimeForest):
+        return model.compiled()
+    from compiled_forest import export_forest
+    return export_forest(model)
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _scalars(forest):
+    return {
+        'max_depth': forest.max_depth,
+        'denominator': forest.denominator,
+        'offset': forest.offset_,
+        'n_features': forest.n_features_in_,
+        'n_estimators': forest.n_estimators,
+        'contamination': forest.contamination,
+    }
+
+
+def _arrays(forest, prefix=""):
+    return {prefix + name: np.ascontiguousarray(getattr(forest, name), dtype=DTYPES[name])
+            for name in ARRAYS}
+
+
+def write_forest(forest, path):
+    """Write a CompiledForest or RegimeForest in the mappable layout (atomic replace)"""
+    if isinstance(forest, RegimeForest):
+        arrays = {}
+        for i, model in enumerate(forest.models):
+            arrays.update(_arrays(model, f"m{i}_"))
+        header = {
+            'regime': {'table': forest.table.tolist(), 'columns': forest.columns.tolist(),
+                       'keys': forest.keys, 'levels': forest.levels},
+            'models': [_scalars(model) for model in forest.models],
+        }
+    else:
+        arrays = _arrays(forest)
+        header = _scalars(forest)
+    header['arrays'] = {}
+    # Offsets depend on the header size, so size the header with placeholders first
+    for name, array in arrays.items():
+        header['arrays'][name] = [array.dtype.str, list(array.shape), 0]
+    start = _aligned(len(MAGIC) + 8 + len(json.dumps(header)) + 32 * len(arrays))
+    offset = start
+    for name, array in arrays.items():
+        header['arrays'][name][2] = offset
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps(header).encode()
+    if len(MAGIC) + 8 + len(encoded) > start:
+        raise ValueError("forest header does not fit before the first array")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+        for name, array in arrays.items():
+            f.seek(header['arrays'][name][2])
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp, path)
+    return offset
+
+
+def map_forest(path):
+    """Map a forest file read-only; the arrays are views into the mapping"""
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        buf.close()
+        raise ValueError(f"{path} is not a shared forest file")
+    (size,) = struct.unpack_from("<Q", buf, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(buf[start:start + size])
+
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(buf, dtype, count, offset).reshape(shape)
+    if 'regime' not in header:
+        fields = {key: value for key, value in header.items() if key != 'arrays'}
+        return CompiledForest({**fields, **arrays})
+
+    models = []
+    for i, scalars in enumerate(header['models']):
+        prefix = f"m{i}_"
+        models.append(CompiledForest({**scalars, **{name: arrays[prefix + name]
+                                                    for name in ARRAYS}}))
+    regime = header['regime']
+    return RegimeForest(models, regime['table'], regime['columns'],
+                        regime['keys'], regime['levels'])
+
+
+class SharedModelHost:
+    def __init__(self, ctx, directory=SHM_DIR):
+        """
+        Args:
+            ctx: multiprocessing context the workers are started from
+            directory: where forest files live (tmpfs keeps them in RAM)
+        """
+        self.generation = ctx.Value('q', 0, lock=False)
+        self.prefix = os.path.join(directory, f"ics_forest_{os.getpid()}_{id(self):x}")
+        self.model = None
+        self.nbytes = 0
+
+    def path(self, generation):
+        return f"{self.prefix}.{generation}.bin"
+
+    def publish(self, model):
+        """Write the next generation, flip the pointer, return the mapped model"""
+        current = self.generation.value
+        new = current + 1
+        self.nbytes = write_forest(as_compiled(model), self.path(new))
+        self.model = map_forest(self.path(new))
+        self.generation.value = new
+        if current:
+            self._unlink(current)
+        return self.model
+
+    def close(self):
+        """Remove the current file (mappings held by workers stay valid)"""
+        if self.generation.value:
+            self._unlink(self.generation.value)
+
+    def _unlink(self, generation):
+        try:
+            os.unlink(self.path(generation))
+        except FileNotFoundError:
+            pass
+
+
+class SharedModelReader:
+    def __init__(self, generation, prefix):
+        """
+        Args:
+            generation: the host's shared generation pointer
+            prefix: the host's file prefix
+        """
+        self.generation = generation
+        self.prefix = prefix
+        self.loaded = 0
+        self.model = None
+
+    def current(self):
+        """Model for the newest generation (remaps only when it changed)"""
+        generation = self.generation.value
+        if generation != self.loaded:
+            try:
+                self.model = map_forest(f"{self.prefix}.{generation}.bin")
+                self.loaded = generation
+            except FileNotFoundError:
+                # Superseded while we looked; the next batch picks up the newer one
+                if self.model is None:
+                    raise
+        return self.model
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+ICS AI Streaming Anomaly Detector
+Adaptive per-sensor baseline that keeps learning after deployment, so slow
+normal drift (ambient temperature, pump wear) does not turn into a growing
+stream of false positives the way it does for a forest trained once.
+
+For each operating regime (phase x valve_opening x safety_trip, see
+regime_forest.py) and each analog channel it keeps an exponentially
+weighted centre and mean absolute deviation. A sample's score is its
+largest robust z-score across channels; above Z_THRESHOLD it is anomalous.
+Updates are Huber-clipped at HUBER_K deviations, so a single spike (or an
+attack) can move the baseline only a bounded step, while a genuine level
+shift is absorbed over a few half-lives. Samples the final verdict flags
+as anomalous are not learned at all, so a sustained attack cannot teach
+itself into the baseline (a genuine step larger than the threshold needs a
+fresh baseline: delete the checkpoint).
+
+Cost is O(1) per sample and memory is fixed: (regimes + 1) x channels
+floats, whatever the uptime. Batches are scored against the baseline as it
+stood before the batch, then folded in with one vectorised update per
+regime (the EWMA weight for k samples is 1 - (1 - alpha)^k).
+
+The state is checkpointed to an .npz every CHECKPOINT_INTERVAL seconds by
+a background thread (start()/stop(); atomic replace) and restored at
+startup, so a restart resumes warm without file I/O on the scoring thread.
+
+decision_function() follows the IsolationForest convention (< 0 means
+anomaly), so the AI node can score with it instead of the forest or use it
+to confirm the forest's verdicts (--detector streaming|both). confirm()
+only overrides the forest for regimes whose baseline is warm; until then
+(and for regimes too rare to ever warm up) the forest score stands.
+
+Usage:
+  python3 streaming_detector.py [--state PATH]    # Show a checkpoint's baselines
+  python3 streaming_detector.py --demo            # Drift vs. a fixed baseline
+"""
+
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from regime_forest import REGIME_KEYS, REGIME_LEVELS, regime_codes, regime_name
+
+# Configuration
+CHANNELS = ['flow_rate', 'pressure', 'temperature', 'motor_current']
+STATE_PATH = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/streaming_detector_state.npz"
+HALF_LIFE = 20000          # Samples for an old observation's weight to halve
+WARMUP = 500               # Samples per regime before it scores anything
+Z_THRESHOLD = 6.0          # Robust z-score that counts as anomalous
+HUBER_K = 3.0              # Updates are clipped at this many deviations
+MIN_SCALE = 1e-3           # Floor for the deviation (flat-lined sensors)
+CHECKPOINT_INTERVAL = 60   # Seconds between state checkpoints
+
+MAD_TO_SIGMA = np.sqrt(np.pi / 2)  # Mean absolute deviation -> std. deviation (normal data)
+
+log = logging.getLogger("ics.streaming")
+
+
+class StreamingDetector:
+    def __init__(self, features, channels=CHANNELS, keys=REGIME_KEYS, levels=REGIME_LEVELS,
+                 half_life=HALF_LIFE, warmup=WARMUP, threshold=Z_THRESHOLD,
+                 state_path=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        """
+        Args:
+            features: column names of the feature rows passed to decision_function
+            channels: analog columns to baseline
+            keys: regime columns (one baseline per combination, plus one for
+                  rows with missing or out-of-range flags)
+            levels: number of values of each regime key
+            half_life: samples for an observation's weight to halve
+            warmup: samples a regime needs before it is scored
+            threshold: robust z-score above which a sample is anomalous
+            state_path: checkpoint file (None: no checkpoints)
+            checkpoint_interval: seconds between checkpoints
+        """
+        features = list(features)
+        self.channel_names = list(channels)
+        self.channels = np.array([features.index(name) for name in channels])
+        self.keys = list(keys)
+        self.levels = [int(level) for level in levels]
+        self.regime_columns = np.array([features.index(key) for key in keys])
+        self.half_life = half_life
+        self.alpha = 1.0 - 0.5 ** (1.0 / half_life)
+        self.warmup = warmup
+        self.threshold = threshold
+        self.state_path = state_path
+        self.checkpoint_interval = checkpoint_interval
+
+        # Fixed-size state: one row per regime code, the last for invalid flags
+        n_baselines = int(np.prod(self.levels)) + 1
+        self.count = np.zeros(n_baselines, dtype=np.int64)
+        self.center = np.zeros((n_baselines, len(self.channels)))
+        self.scale = np.zeros((n_baselines, len(self.channels)))
+
+        # The scoring thread updates the state; the checkpoint thread copies it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.scored = 0
+        self.anomalies = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+
+    def route(self, X):
+        """Baseline index of each row"""
+        codes = regime_codes(X[:, self.regime_columns], self.levels)
+        return np.where(codes >= 0, codes, self.count.size - 1)
+
+    def zscores(self, X):
+        """
+        Largest robust z-score across channels for each row (no update),
+        with each row's baseline index and whether that baseline is warm.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        baseline = self.route(X)
+        sigma = np.maximum(self.scale[baseline] * MAD_TO_SIGMA, MIN_SCALE)
+        z = np.abs(X[:, self.channels] - self.center[baseline]) / sigma
+        # Missing readings do not count against a sample
+        z = np.where(np.isnan(z), 0.0, z).max(axis=1)
+        warm = self.count[baseline] >= self.warmup
+        z[~warm] = 0.0
+        return z, baseline, warm
+
+    def _score(self, X):
+        """Own scores of a batch (before it is learned), baselines and warm mask"""
+        z, baseline, warm = self.zscores(X)
+        scores = 1.0 - z / self.threshold
+        self.scored += len(scores)
+        self.anomalies += int((scores < 0).sum())
+        return scores, baseline, warm
+
+    def decision_function(self, X):
+        """
+        Score a batch against the current baselines, then learn from the rows
+        it did not flag. 1 - z / threshold, so < 0 means anomaly (1 while a
+        regime warms up).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        scores, baseline, _ = self._score(X)
+        self.learn(X, baseline, scores >= 0)
+        return scores
+
+    def confirm(self, scores, X):
+        """
+        Combine forest scores with this detector's: where the regime's
+        baseline is warm a sample stays anomalous only if both flag it,
+        elsewhere the forest decides alone. Rows the combined score flags
+        are not learned.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        own, baseline, warm = self._score(X)
+        combined = np.where(warm, np.maximum(scores, own), scores)
+        self.learn(X, baseline, combined >= 0)
+        return combined
+
+    def learn(self, X, baseline, normal):
+        """Fold the rows marked normal into their baselines"""
+        values = X[normal][:, self.channels]
+        baseline = baseline[normal]
+        with self._lock:
+            if baseline.size and (baseline == baseline[0]).all():
+                self._update(baseline[0], values)
+            else:
+                for b in np.unique(baseline):
+                    self._update(b, values[baseline == b])
+
+    def _update(self, b, values):
+        """Fold k samples of one regime into its baseline"""
+        values = values[~np.isnan(values).any(axis=1)]
+        k = len(values)
+        if not k:
+            return
+        n = self.count[b]
+        center, scale = self.center[b], self.scale[b]
+        if n < self.warmup:
+            # Plain cumulative mean / mean absolute deviation until warm
+            weight = k / (n + k)
+            center = center + weight * (values.mean(axis=0) - center)
+            deviation = np.abs(values - center).mean(axis=0)
+        else:
+            weight = 1.0 - (1.0 - self.alpha) ** k
+            limit = HUBER_K * np.maximum(scale * MAD_TO_SIGMA, MIN_SCALE)
+            deviation = np.minimum(np.abs(values - center), limit).mean(axis=0)
+            center = center + weight * np.clip(values - center, -limit, limit).mean(axis=0)
+        self.center[b] = center
+        self.scale[b] = scale + weight * (deviation - scale)
+        self.count[b] = n + k
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def start(self):
+        """Checkpoint every checkpoint_interval seconds on a background thread"""
+        if not self.state_path or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._checkpoint_loop,
+                                        name="streaming-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the checkpoint thread (checkpoint() once more for the final state)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _checkpoint_loop(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                self.checkpoint_errors += 1
+                log.exception("Streaming detector checkpoint failed")
+
+    def checkpoint(self):
+        """Write the state to state_path (atomic replace); False on error"""
+        with self._lock:
+            count, center, scale = self.count.copy(), self.center.copy(), self.scale.copy()
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, count=count, center=center, scale=scale,
+                         channels=np.asarray(self.channel_names),
+                         keys=np.asarray(self.keys),
+                         levels=np.asarray(self.levels),
+                         half_life=self.half_life, saved_at=time.time())
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            self.checkpoint_errors += 1
+            log.warning(f"Streaming detector checkpoint failed: {e}")
+            return False
+        self.checkpoints += 1
+        return True
+
+    def restore(self):
+        """Load a checkpoint written with the same layout; False if cold start"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        try:
+            with np.load(self.state_path, allow_pickle=False) as data:
+                layout = ([str(c) for c in data['channels']], [str(k) for k in data['keys']],
+                          [int(level) for level in data['levels']])
+                if layout != (self.channel_names, self.keys, self.levels):
+                    log.warning(f"Streaming detector state {self.state_path} has layout "
+                                f"{layout}; starting cold")
+                    return False
+                self.count = data['count'].astype(np.int64)
+                self.center = data['center'].astype(np.float64)
+                self.scale = data['scale'].astype(np.float64)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Streaming detector state {self.state_path} unreadable ({e}); "
+                        f"starting cold")
+            return False
+        return True
+
+    def warm_baselines(self):
+        return int((self.count >= self.warmup).sum())
+
+    def stats(self):
+        return {
+            'warm_baselines': self.warm_baselines(),
+            'samples_learned': int(self.count.sum()),
+            'scored': self.scored,
+            'anomalies': self.anomalies,
+            'checkpoints': self.checkpoints,
+            'checkpoint_errors': self.checkpoint_errors,
+        }
+
+    def baselines(self):
+        """[(regime, samples, {channel: (center, sigma)})] for every baseline"""
+        names = [regime_name(code, self.keys, self.levels) for code in range(self.count.size - 1)]
+        names.append("invalid flags")
+        return [(name, int(self.count[b]),
+                 {channel: (float(self.center[b, i]), float(self.scale[b, i] * MAD_TO_SIGMA))
+                  for i, channel in enumerate(self.channel_names)})
+                for b, name in enumerate(names)]
+
+
+def show_state(path):
+    """Print the baselines stored in a checkpoint"""
+    detector = StreamingDetector(CHANNELS + REGIME_KEYS, state_path=path)
+    if not detector.restore():
+        print(f"No usable streaming detector state at {path}")
+        return 1
+    print(f"Streaming detector state: {path} "
+          f"(saved {time.ctime(os.path.getmtime(path))})")
+    for name, count, channels in detector.baselines():
+        if not count:
+            continue
+        warm = "warm" if count >= detector.warmup else "warming"
+        print(f"\n  {name}  ({count} samples, {warm})")
+        for channel, (center, sigma) in channels.items():
+            print(f"    {channel:<14} {center:10.3f} +/- {sigma:.3f}")
+    return 0
+
+
+def demo(n=200000, batch=50, seed=0):
+    """Slow temperature drift: adaptive baseline vs. one frozen after warm-up"""
+    rng = np.random.default_rng(seed)
+    features = CHANNELS + REGIME_KEYS
+    X = np.column_stack([rng.normal(10, 0.5, n), rng.normal(3, 0.2, n),
+                         rng.normal(40, 1.0, n), rng.normal(5, 0.3, n),
+                         np.zeros((n, 3))])
+    X[:, 2] += np.linspace(0, 15, n)           # +15 degC over the run
+    spikes = rng.choice(np.arange(n // 2, n), 20, replace=False)
+    X[spikes, 1] += 5                          # Pressure spikes to detect
+
+    adaptive = StreamingDetector(features)
+    frozen = StreamingDetector(features)
+    flagged = {'adaptive': np.zeros(n, bool), 'frozen': np.zeros(n, bool)}
+    started = time.perf_counter()
+    for i in range(0, n, batch):
+        flagged['adaptive'][i:i + batch] = adaptive.decision_function(X[i:i + batch]) < 0
+    elapsed = time.perf_counter() - started
+    for i in range(0, n, batch):
+        scores = frozen.decision_function(X[i:i + batch]) if i < 5000 else \
+            1.0 - frozen.zscores(X[i:i + batch])[0] / frozen.threshold
+        flagged['frozen'][i:i + batch] = scores < 0
+
+    print(f"{n} samples, temperature drifting +15 degC, {len(spikes)} pressure spikes:")
+    for name, hits in flagged.items():
+        false_positives = hits.sum() - hits[spikes].sum()
+        print(f"  {name:<9} spikes caught {hits[spikes].sum():>2}/{len(spikes)}, "
+              f"false positives {false_positives}")
+    print(f"  update cost {elapsed / n * 1e6:.1f} us/sample (batches of {batch}), "
+          f"state {adaptive.center.nbytes + adaptive.scale.nbytes + adaptive.count.nbytes} bytes")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ICS streaming anomaly detector")
+    parser.add_argument("--state", default=STATE_PATH,
+                        help=f"Checkpoint file (default: {STATE_PATH})")
+    parser.add_argument("--demo", action="store_true",
+                        help="Run a synthetic drift demonstration instead")
+    args = parser.parse_args()
+
+    if args.demo:
+        demo()
+        return 0
+    return show_state(args.state)
+
+
+if __name__ == "__main__":
+    exit(main())
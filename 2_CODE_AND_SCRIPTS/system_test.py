@@ -24,6 +24,9 @@ YELLOW = '\033[93m'
 BLUE = '\033[94m'
 RESET = '\033[0m'
 
+PROJECT_DIR = "/home/naim/pipeline_project"
+STORE_CMD = f"cd {PROJECT_DIR} && venv/bin/python3 2_CODE_AND_SCRIPTS/telemetry_store.py"
+
 class ICSSystemTester:
     def __init__(self, rpi_ip="10.27.38.206", username="naim", password="1234"):
         self.rpi_ip = rpi_ip
@@ -54,7 +57,7 @@ class ICSSystemTester:
             )
             return result.returncode == 0, result.stdout.strip(), result.stderr.strip()
         except Exception as e:
-            return False, "", str(e))
+            return False, "", str(e)
     
     def test_rpi_connectivity(self):
         """Test if RPi is reachable"""
@@ -116,28 +119,38 @@ timeout 3 mosquitto_sub -t ics/telemetry/data -u naim -P 1234 --cafile /etc/mosq
         self.results.append(("System Services", all_running))
         return all_running
     
+    def store_rows(self):
+        """Total rows in the logger's telemetry store, or None if unreadable"""
+        success, stdout, _ = self.ssh_command(f"{STORE_CMD} info")
+        if not success:
+            return None
+        for line in stdout.splitlines():
+            if line.startswith("Total:"):
+                return int(line.split()[1])
+        return None
+    
     def test_data_logging(self):
         """Test if data is being logged"""
         self.print_header("Data Logging Test")
         
-        # Check log file exists
-        success, stdout, _ = self.ssh_command("ls -la /home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv")
+        # The logger writes the columnar telemetry store by default
+        rows = self.store_rows()
+        success = rows is not None
         if success:
-            self.print_success("Log file exists")
+            self.print_success("Telemetry store readable")
             
-            # Check file size
-            if "0 " in stdout:
-                self.print_info("Log file is empty (no data yet)")
+            if rows == 0:
+                self.print_info("Telemetry store is empty (no data yet)")
             else:
-                self.print_success("Log file has data")
+                self.print_success(f"Telemetry store has {rows} rows")
             
-            # Get last few lines
-            success, stdout, _ = self.ssh_command("tail -5 /home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv")
-            if success and stdout:
+            # Newest partition's last row
+            ok, stdout, _ = self.ssh_command(f"{STORE_CMD} tail -n 1")
+            if ok and stdout:
                 self.print_info("Last log entry:")
-                print(f"  {stdout[:100]}...")
+                print(f"  {stdout.splitlines()[-1][:100]}...")
         else:
-            self.print_error("Log file not found")
+            self.print_error("Telemetry store not found")
         
         self.results.append(("Data Logging", success))
         return success
@@ -158,17 +171,20 @@ timeout 3 mosquitto_sub -t ics/telemetry/data -u naim -P 1234 --cafile /etc/mosq
             "is_anomaly": 0
         }
         
+        rows_before = self.store_rows()
         cmd = f'''mosquitto_pub -h localhost -p 8883 -u {self.username} -P {self.password} --cafile /etc/mosquitto/ca_certificates/ca.crt -t ics/telemetry/data -m '{json.dumps(test_data)}' '''
         
         success, _, _ = self.ssh_command(cmd)
         if success:
             self.print_success("Test message published successfully")
             
-            # Verify it was logged
-            time.sleep(1)
-            success, stdout, _ = self.ssh_command("tail -1 /home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv")
-            if success and "test" in stdout:
+            # Verify it was logged (the logger flushes at least once a second)
+            time.sleep(2)
+            rows_after = self.store_rows()
+            if rows_before is not None and rows_after is not None and rows_after > rows_before:
                 self.print_success("Test message logged successfully")
+            else:
+                self.print_info("Test message not (yet) in the telemetry store")
         else:
             self.print_error("Failed to publish test message")
         
@@ -215,6 +231,7 @@ timeout 3 mosquitto_sub -t ics/telemetry/data -u naim -P 1234 --cafile /etc/mosq
             "is_anomaly": 1
         }
         
+        rows_before = self.store_rows()
         cmd = f'''mosquitto_pub -h localhost -p 8883 -u {self.username} -P {self.password} --cafile /etc/mosquitto/ca_certificates/ca.crt -t ics/telemetry/data -m '{json.dumps(attack_data)}' '''
         
         success, _, _ = self.ssh_command(cmd)
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+ICS Binary Telemetry Encoding
+Fixed-layout, struct-packed alternative to the JSON telemetry message, for
+publishers on the parallel topic ics/telemetry/bin. The JSON topic stays
+as it is (Node-RED and the SCADA side keep reading it).
+
+Record layout (little-endian, 33 bytes vs ~180 for JSON):
+  offset size  field
+  0      1     magic 0xB1 (never a valid first byte of JSON)
+  1      1     version (1)
+  2      2     device id (uint16)
+  4      8     timestamp, unix seconds (float64)
+  12     16    flow_rate, pressure, temperature, motor_current (float32)
+  28     5     phase, valve_opening, safety_trip, a_high, b_low (uint8)
+Missing analog values are NaN, missing discrete values 0xFF.
+
+Because of the magic byte, consumers can accept either format on any topic:
+is_binary() tells them apart and to_record() returns a dict for both.
+Records concatenated back to back can be decoded in one vectorized NumPy
+call (decode_array), which is where the fixed layout pays off most.
+
+Frames (ics/telemetry/frame) carry N samples in one publish, each a full
+record with its own device id and timestamp:
+  offset size  field
+  0      1     magic 0xB2
+  1      1     version (1)
+  2      2     record count (uint16)
+  4      33*N  records
+
+Device numbers: a numeric device_id (binary publishers) is its own number.
+A name gets the number assigned in REGISTRY_FILE, else its trailing digits
+('pump-007' -> 7) or a crc32 of the name, checked for collisions: when
+'tank-007' derives a number 'pump-007' already holds, its messages are
+rejected (ValueError) rather than merged into pump-007's state, until it is
+given its own number in the file ({"tank-007": 1007}).
+
+Usage:
+  payload = encode({'flow_rate': 12.5, 'phase': 2, ...}, device=3)
+  record = decode(payload)
+  frame = encode_frame([encode(sample, device=3, ts=t) for sample, t in samples])
+  python3 telemetry_binary.py --messages 100000   # size / decode benchmark
+"""
+
+import json
+import math
+import struct
+import threading
+import time
+
+# Schema
+TOPIC = "ics/telemetry/bin"
+MAGIC = 0xB1
+PREFIX = bytes([MAGIC])
+VERSION = 1
+ANALOG = ['flow_rate', 'pressure', 'temperature', 'motor_current']
+DISCRETE = ['phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
+FIELDS = ANALOG + DISCRETE
+MISSING = 0xFF
+RECORD = struct.Struct('<BBHd4f5B')
+
+FRAME_TOPIC = "ics/telemetry/frame"
+FRAME_MAGIC = 0xB2
+FRAME_PREFIX = bytes([FRAME_MAGIC])
+FRAME_HEADER = struct.Struct('<BBH')
+MAX_FRAME_RECORDS = 0xFFFF
+
+# Device numbers
+MAX_DEVICE = 0xFFFF
+REGISTRY_FILE = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/devices.json"  # Explicit assignments
+
+_FIRST_VALUE = 4  # Index of flow_rate in RECORD.unpack() output
+_KEY_INDEX = {'device_id': 2, 'timestamp': 3,
+              **{name: _FIRST_VALUE + i for i, name in enumerate(FIELDS)}}
+
+
+def is_binary(payload):
+    return payload[:1] == PREFIX
+
+
+def is_frame(payload):
+    return payload[:1] == FRAME_PREFIX
+
+
+class DeviceRegistry:
+    """Collision-checked device_id -> uint16 device number mapping"""
+
+    def __init__(self, assignments=None):
+        """
+        Args:
+            assignments: optional {device_id: number} that take precedence
+                         over derived numbers
+        """
+        self._numbers = {}  # device_id -> number
+        self._owners = {}   # number -> device_id
+        self._lock = threading.Lock()
+        for device_id, number in (assignments or {}).items():
+            self.assign(device_id, number)
+
+    @classmethod
+    def load(cls, path):
+        """Registry with the assignments of a JSON file (empty if it does not exist)"""
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+    def assign(self, device_id, number):
+        """Give a device_id a number; ValueError if either is already taken"""
+        device_id, number = str(device_id), int(number)
+        if not 0 <= number <= MAX_DEVICE:
+            raise ValueError(f"device number {number} is outside 0..{MAX_DEVICE}")
+        with self._lock:
+            owner = self._owners.get(number, device_id)
+            if owner != device_id:
+                raise ValueError(f"device number {number} of {device_id!r} is already "
+                                 f"used by {owner!r}; assign one in {REGISTRY_FILE}")
+            if self._numbers.get(device_id, number) != number:
+                raise ValueError(f"device {device_id!r} already has number "
+                                 f"{self._numbers[device_id]}")
+            self._numbers[device_id] = number
+            self._owners[number] = device_id
+        return number
+
+    def number(self, device_id):
+        """uint16 device number (0 for None); ValueError on a collision"""
+        try:
+            return self._numbers[device_id]
+        except (KeyError, TypeError):
+            pass
+        if device_id is None:
+            return 0
+        text = str(device_id)
+        if text.isdigit():
+            # Already a device number (binary records, stored as text)
+            if int(text) > MAX_DEVICE:
+                raise ValueError(f"device number {text} is outside 0..{MAX_DEVICE}")
+            return int(text)
+        digits = text[len(text.rstrip('0123456789')):]
+        if digits and int(digits) <= MAX_DEVICE:
+            return self.assign(text, int(digits))
+        import zlib
+        return self.assign(text, zlib.crc32(text.encode()) & MAX_DEVICE)
+
+
+_registry = None
+
+
+def registry():
+    """The process-wide DeviceRegistry, loaded from REGISTRY_FILE on first use"""
+    global _registry
+    if _registry is None:
+        _registry = DeviceRegistry.load(REGISTRY_FILE)
+    return _registry
+
+
+def device_number(device_id):
+    """uint16 device number for a JSON device_id ('pump-007' -> 7, see DeviceRegistry)"""
+    return registry().number(device_id)
+
+
+def encode(record, device=0, ts=None):
+    """
+    Pack a telemetry dict (JSON field names) into one binary record.
+    ValueError if a field does not fit its binary type (a non-number, or a
+    discrete value outside 0..MISSING-1).
+    """
+    try:
+        analog = []
+        for name in ANALOG:
+            value = record.get(name)
+            analog.append(math.nan if value is None else float(value))
+        discrete = []
+        for name in DISCRETE:
+            value = record.get(name)
+            if value is None:
+                discrete.append(MISSING)
+                continue
+            value = int(value)
+            if not 0 <= value < MISSING:
+                raise ValueError(f"{name}={value} is outside 0..{MISSING - 1}")
+            discrete.append(value)
+        return RECORD.pack(MAGIC, VERSION, device, time.time() if ts is None else ts,
+                           *analog, *discrete)
+    except (TypeError, ValueError, OverflowError, struct.error) as e:
+        raise ValueError(f"binary telemetry: {e}") from None
+
+
+def unpack(payload):
+    """Raw RECORD tuple; ValueError for anything that is not a v1 record"""
+    try:
+        values = RECORD.unpack(payload)
+    except struct.error as e:
+        raise ValueError(f"binary telemetry: {e}") from None
+    if values[0] != MAGIC or values[1] != VERSION:
+        raise ValueError(f"binary telemetry: unsupported header {values[0]:#x}/{values[1]}")
+    return values
+
+
+def decode(payload):
+    """Decode a binary record into the same dict shape as the JSON message"""
+    return _record(unpack(payload))
+
+
+def _record(values):
+    record = {'device_id': values[2], 'timestamp': values[3]}
+    for name, value in zip(ANALOG, values[_FIRST_VALUE:_FIRST_VALUE + len(ANALOG)]):
+        if value == value:  # Not NaN
+            record[name] = value
+    for name, value in zip(DISCRETE, values[_FIRST_VALUE + len(ANALOG):]):
+        if value != MISSING:
+            record[name] = value
+    return record
+
+
+def record_dtype():
+    """NumPy dtype matching RECORD (numpy is only needed for array decoding)"""
+    import numpy as np
+    return np.dtype([('magic', 'u1'), ('version', 'u1'), ('device', '<u2'), ('ts', '<f8'),
+                     ('analog', '<f4', len(ANALOG)), ('discrete', 'u1', len(DISCRETE))])
+
+
+def decode_array(buffer):
+    """Decode concatenated records into a structured array (zero-copy view)"""
+    import numpy as np
+    if len(buffer) % RECORD.size:
+        raise ValueError(f"binary telemetry: {len(buffer)} bytes is not a whole "
+                         f"number of {RECORD.size}-byte records")
+    records = np.frombuffer(buffer, record_dtype())
+    if not ((records['magic'] == MAGIC) & (records['version'] == VERSION)).all():
+        raise ValueError("binary telemetry: unsupported record header")
+    return records
+
+
+def encode_frame(records):
+    """Concatenate encoded records into one frame payload"""
+    if len(records) > MAX_FRAME_RECORDS:
+        raise ValueError(f"a frame holds at most {MAX_FRAME_RECORDS} records")
+    return FRAME_HEADER.pack(FRAME_MAGIC, VERSION, len(records)) + b''.join(records)
+
+
+def frame_from_array(records):
+    """Frame payload for a decode_array()/decode_frame() array (or a slice of one)"""
+    return FRAME_HEADER.pack(FRAME_MAGIC, VERSION, len(records)) + records.tobytes()
+
+
+def frame_body(payload):
+    """Validate a frame header and return (count, records bytes)"""
+    try:
+        magic, version, count = FRAME_HEADER.unpack_from(payload)
+    except struct.error as e:
+        raise ValueError(f"telemetry frame: {e}") from None
+    if magic != FRAME_MAGIC or version != VERSION:
+        raise ValueError(f"telemetry frame: unsupported header {magic:#x}/{version}")
+    body = memoryview(payload)[FRAME_HEADER.size:]
+    if len(body) != count * RECORD.size:
+        raise ValueError(f"telemetry frame: {count} records declared, "
+                         f"{len(body)} bytes of records")
+    return count, body
+
+
+def decode_frame(payload):
+    """Structured array of a frame's records (see decode_array)"""
+    return decode_array(frame_body(payload)[1])
+
+
+class FrameRecords:
+    """A frame's records: `array` for vectorized use, items as BinaryRecords"""
+
+    def __init__(self, payload):
+        self.count, self.body = frame_body(payload)
+        self.array = decode_array(self.body)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return BinaryRecord(RECORD.unpack_from(self.body, i * RECORD.size))
+
+    def __iter__(self):
+        return map(BinaryRecord, RECORD.iter_unpack(self.body))
+
+
+def to_record(payload):
+    """Decode a telemetry payload in either format into a dict"""
+    if is_binary(payload):
+        return decode(payload)
+    return json.loads(payload)
+
+
+def to_records(payload):
+    """Decode a record, frame or JSON payload into a list of dicts"""
+    if is_frame(payload):
+        return [record.as_dict() for record in FrameRecords(payload)]
+    return [to_record(payload)]
+
+
+class BinaryRecord:
+    """Undecoded view of one record with dict-style get() (no dict is built)"""
+
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None):
+        i = _KEY_INDEX.get(key)
+        if i is None:
+            return default
+        value = self.values[i]
+        if value != value or (i >= _FIRST_VALUE + len(ANALOG) and value == MISSING):
+            return default
+        return value
+
+    def as_dict(self):
+        return _record(self.values)
+
+
+class BinaryCodec:
+    def __init__(self, fields=FIELDS):
+        """
+        Args:
+            fields: feature row order (e.g. FEATURES); names not in the
+                    binary schema are filled with 0
+        """
+        self.fields = list(fields)
+        self.n_fields = len(self.fields)
+        self._index = [_FIRST_VALUE + FIELDS.index(name) if name in FIELDS else None
+                       for name in self.fields]
+
+    def decode_into(self, payload, row):
+        """Write the record's fields into row[:n_fields]; returns a BinaryRecord"""
+        values = unpack(payload)
+        record = BinaryRecord(values)
+        analog_sum = sum(values[_FIRST_VALUE:_FIRST_VALUE + len(ANALOG)])
+        if analog_sum == analog_sum and MISSING not in values[_FIRST_VALUE + len(ANALOG):]:
+            row[:self.n_fields] = [0.0 if i is None else values[i] for i in self._index]
+        else:
+            # Missing values read as 0, like absent keys in JSON
+            get = record.get
+            row[:self.n_fields] = [float(get(name) or 0) for name in self.fields]
+        return record
+
+    def decode_array_into(self, records, X):
+        """Fill X[:len(records), :n_fields] from decode_array() output"""
+        import numpy as np
+        n = len(records)
+        if self.fields[:len(FIELDS)] == FIELDS:
+            # Schema order (FEATURES): two block copies, then patch missing values
+            X[:n, :len(ANALOG)] = records['analog']
+            X[:n, len(ANALOG):len(FIELDS)] = records['discrete']
+            X[:n, len(FIELDS):self.n_fields] = 0.0
+            block = X[:n, :len(FIELDS)]
+            missing = np.isnan(block)
+            missing[:, len(ANALOG):] |= records['discrete'] == MISSING
+            if missing.any():
+                block[missing] = 0.0
+            return n
+        for k, name in enumerate(self.fields):
+            if name in ANALOG:
+                column = records['analog'][:, ANALOG.index(name)]
+                X[:n, k] = np.where(np.isnan(column), 0.0, column)
+            elif name in DISCRETE:
+                column = records['discrete'][:, DISCRETE.index(name)]
+                X[:n, k] = np.where(column == MISSING, 0, column)
+            else:
+                X[:n, k] = 0.0
+        return n
+
+
+def benchmark(messages):
+    """Compare payload size and decode-into-row cost for JSON and binary"""
+    import numpy as np
+    from sharded_inference import make_payloads
+    from telemetry_decoder import TelemetryDecoder, available_backends
+
+    json_payloads = make_payloads(min(messages, 10000), 16)
+    bin_payloads = []
+    for payload in json_payloads:
+        record = json.loads(payload)
+        bin_payloads.append(encode(record, int(record['device_id'].split('-')[1])))
+    repeat = max(1, messages // len(json_payloads))
+    total = repeat * len(json_payloads)
+    row = np.empty(len(FIELDS))
+
+    def run(fn, payloads):
+        started = time.perf_counter_ns()
+        for _ in range(repeat):
+            for payload in payloads:
+                fn(payload)
+        return (time.perf_counter_ns() - started) / total
+
+    json_bytes = sum(map(len, json_payloads)) / len(json_payloads)
+    bin_bytes = sum(map(len, bin_payloads)) / len(bin_payloads)
+    print(f"Payload size: JSON {json_bytes:.0f} B, binary {bin_bytes:.0f} B "
+          f"({json_bytes / bin_bytes:.1f}x smaller)")
+    print(f"Decode into a feature row ({total} messages):")
+    for name in available_backends():
+        decoder = TelemetryDecoder(FIELDS, backend=name)
+        ns = run(lambda payload: decoder.decode_into(payload, row), json_payloads)
+        print(f"  JSON ({name}){'':<{20 - len(name)}} {ns:8.0f} ns/msg")
+    decoder = TelemetryDecoder(FIELDS)
+    ns = run(lambda payload: decoder.decode_into(payload, row), bin_payloads)
+    print(f"  {'binary':<27} {ns:8.0f} ns/msg")
+
+    # 64 records per buffer, as in a scoring batch
+    codec = BinaryCodec(FIELDS)
+    X = np.empty((64, len(FIELDS)))
+    buffers = [b''.join(bin_payloads[i:i + 64]) for i in range(0, len(bin_payloads), 64)]
+    started = time.perf_counter_ns()
+    for _ in range(repeat):
+        for buffer in buffers:
+            codec.decode_array_into(decode_array(buffer), X)
+    ns = (time.perf_counter_ns() - started) / total
+    print(f"  {'binary, 64-record arrays':<27} {ns:8.0f} ns/msg")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Binary telemetry size/decode benchmark")
+    parser.add_argument("--messages", type=int, default=100000,
+                        help="Payloads to decode per format")
+    args = parser.parse_args()
+
+    benchmark(args.messages)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
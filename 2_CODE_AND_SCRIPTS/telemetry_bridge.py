@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+ICS Telemetry Frame Bridge
+Aggregates single-sample telemetry - JSON on ics/telemetry/data and binary
+records on ics/telemetry/bin - into multi-sample frames on
+ics/telemetry/frame (format in telemetry_binary.py). Subscribers then get one
+MQTT callback per frame instead of one per sample, and the AI node scores a
+frame as one batch.
+
+A frame is published when MAX_SAMPLES samples are buffered or the oldest has
+waited MAX_DELAY seconds, whichever comes first. Every sample keeps its own
+timestamp (the message's "timestamp", else its arrival time) and device
+number (telemetry_binary.device_number of its "device_id").
+
+Run the AI node with --frames-only while the bridge is up, otherwise it
+scores every sample twice (once per topic). The logger keeps reading the
+single-sample topics.
+
+Usage:
+  python3 telemetry_bridge.py                                # Bridge the live topics
+  python3 telemetry_bridge.py --max-samples 100 --max-delay 0.05
+  python3 telemetry_bridge.py --simulate --devices 20 --rate 1000   # Synthetic PLCs
+"""
+
+import argparse
+import json
+import signal
+import ssl
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from telemetry_binary import FRAME_TOPIC, MAX_FRAME_RECORDS, TOPIC as BIN_TOPIC, \
+    device_number, encode, encode_frame, is_binary, unpack
+
+# Configuration
+BROKER = "localhost"
+PORT = 8883
+USERNAME = "naim"
+PASSWORD = "1234"
+CA_CERT = "/etc/mosquitto/ca_certificates/ca.crt"
+CLIENT_ID = "ics_telemetry_bridge"
+TOPIC = "ics/telemetry/data"
+
+# Frame policy
+MAX_SAMPLES = 50    # Publish once this many samples are buffered
+MAX_DELAY = 0.1     # ...or when the oldest has waited this long (s)
+FRAME_QOS = 0       # Same as the single-sample telemetry
+STATUS_INTERVAL = 60
+
+
+def sample_time(value, default):
+    """Unix time of a message's "timestamp" (number or ISO 8601 string)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+def to_binary(payload, arrival=None):
+    """One binary record for a JSON or binary single-sample payload"""
+    if is_binary(payload):
+        unpack(payload)  # Validate; the record is forwarded as is
+        return bytes(payload)
+    try:
+        record = json.loads(payload)
+    except ValueError:
+        raise ValueError("telemetry payload is not JSON") from None
+    if not isinstance(record, dict):
+        raise ValueError("telemetry payload is not a JSON object")
+    arrival = time.time() if arrival is None else arrival
+    return encode(record, device_number(record.get('device_id')),
+                  ts=sample_time(record.get('timestamp'), arrival))
+
+
+class FrameAggregator:
+    def __init__(self, publish_fn, max_samples=MAX_SAMPLES, max_delay=MAX_DELAY):
+        """
+        Initialize the aggregator.
+
+        Args:
+            publish_fn: callable(frame_payload) for each finished frame
+            max_samples: publish when this many samples are buffered
+            max_delay: publish when the oldest sample has waited this long (s)
+        """
+        if not 1 <= max_samples <= MAX_FRAME_RECORDS:
+            raise ValueError(f"max_samples must be 1..{MAX_FRAME_RECORDS}")
+        self.publish_fn = publish_fn
+        self.max_samples = max_samples
+        self.max_delay = max_delay
+
+        self._records = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        # Statistics
+        self.samples = 0
+        self.frames = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the age-based flusher thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name="frame-flusher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop the flusher and publish what is buffered"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def add(self, record):
+        """Buffer one encoded binary record (safe from any thread)"""
+        with self._lock:
+            if not self._records:
+                self._oldest = time.monotonic()
+            self._records.append(record)
+            self.samples += 1
+            if len(self._records) < self.max_samples:
+                return
+            records, self._records = self._records, []
+        self._publish(records)
+
+    def flush(self, max_age=0.0):
+        """Publish the buffer if its oldest sample is at least max_age old"""
+        with self._lock:
+            if not self._records or time.monotonic() - self._oldest < max_age:
+                return
+            records, self._records = self._records, []
+        self._publish(records)
+
+    def _publish(self, records):
+        try:
+            self.publish_fn(encode_frame(records))
+            self.frames += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠ Frame publish failed ({len(records)} samples): {e}")
+
+    def _flush_loop(self):
+        while self._running:
+            time.sleep(self.max_delay / 2)
+            self.flush(self.max_delay)
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "frames": self.frames,
+            "errors": self.errors,
+            "mean_frame_size": (self.samples / self.frames) if self.frames else 0.0,
+        }
+
+
+class TelemetryBridge:
+    def __init__(self, max_samples=MAX_SAMPLES, max_delay=MAX_DELAY):
+        self.client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=CLIENT_ID
+        )
+        self.client.username_pw_set(USERNAME, PASSWORD)
+        self.client.tls_set(ca_certs=CA_CERT, cert_reqs=ssl.CERT_REQUIRED)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+        self.aggregator = FrameAggregator(self.publish_frame, max_samples, max_delay)
+        self.invalid = 0
+        self.last_log_time = time.time()
+
+    def publish_frame(self, frame):
+        self.client.publish(FRAME_TOPIC, frame, qos=FRAME_QOS)
+
+    def on_connect(self, client, userdata, flags, rc, properties):
+        """MQTT connection callback"""
+        if rc == 0:
+            print(f"✓ Connected to MQTT broker at {BROKER}:{PORT}")
+            client.subscribe([(TOPIC, 0), (BIN_TOPIC, 0)])
+            print(f"  Subscribed to: {TOPIC}, {BIN_TOPIC} -> publishing {FRAME_TOPIC}")
+        else:
+            print(f"✗ MQTT connection failed with code {rc}")
+
+    def on_message(self, client, userdata, msg):
+        """MQTT message callback - convert and buffer the sample"""
+        try:
+            self.aggregator.add(to_binary(msg.payload))
+        except ValueError:
+            self.invalid += 1
+        if time.time() - self.last_log_time > STATUS_INTERVAL:
+            self.log_status()
+            self.last_log_time = time.time()
+
+    def log_status(self):
+        """Log periodic status"""
+        stats = self.aggregator.stats()
+        print(f"\n--- Bridge Status ---")
+        print(f"  Samples in: {stats['samples']}")
+        print(f"  Frames out: {stats['frames']} (avg {stats['mean_frame_size']:.1f} samples)")
+        if stats['frames']:
+            print(f"  Subscriber callbacks: {stats['samples'] / stats['frames']:.1f}x fewer")
+        print(f"  Invalid payloads: {self.invalid}")
+        print(f"  Publish errors: {stats['errors']}")
+        print(f"---------------------\n")
+
+    def shutdown(self, signum=None, frame=None):
+        self.client.disconnect()
+
+    def simulate(self, devices, rate, duration=None):
+        """Feed synthetic samples from `devices` PLCs at `rate` samples/s"""
+        import random
+
+        print(f"Simulating {devices} devices at {rate} samples/s")
+        self.client.connect(BROKER, PORT, 60)
+        self.client.loop_start()
+        self.aggregator.start()
+        interval = devices / rate  # One sample per device per tick
+        started = next_tick = time.time()
+        try:
+            while duration is None or time.time() - started < duration:
+                now = time.time()
+                for device in range(devices):
+                    self.aggregator.add(encode({
+                        "flow_rate": random.gauss(50, 5),
+                        "pressure": random.gauss(5, 0.5),
+                        "temperature": random.gauss(60, 3),
+                        "motor_current": random.gauss(10, 1),
+                        "phase": random.randint(0, 2),
+                        "valve_opening": random.randint(0, 100),
+                        "safety_trip": 0, "a_high": 0, "b_low": 0,
+                    }, device, ts=now))
+                if now - self.last_log_time > STATUS_INTERVAL:
+                    self.log_status()
+                    self.last_log_time = now
+                next_tick += interval
+                time.sleep(max(0.0, next_tick - time.time()))
+        except KeyboardInterrupt:
+            print("\n\nStopping simulation...")
+        finally:
+            self.aggregator.stop()
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.log_status()
+
+    def start(self):
+        """Bridge the live single-sample topics"""
+        print(f"Starting telemetry bridge: frames of up to {self.aggregator.max_samples} "
+              f"samples / {self.aggregator.max_delay * 1000:.0f} ms")
+        signal.signal(signal.SIGTERM, self.shutdown)
+        self.aggregator.start()
+        try:
+            self.client.connect(BROKER, PORT, 60)
+            self.client.loop_forever()
+        except KeyboardInterrupt:
+            print("\n\nShutting down telemetry bridge...")
+            self.shutdown()
+        except Exception as e:
+            print(f"\n✗ Error: {e}")
+        finally:
+            self.aggregator.stop()
+            self.log_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ICS Telemetry Frame Bridge")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES,
+                        help=f"Samples per frame (default: {MAX_SAMPLES})")
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY,
+                        help=f"Max seconds a sample waits for its frame (default: {MAX_DELAY})")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Publish frames of synthetic samples instead of bridging")
+    parser.add_argument("--devices", type=int, default=10,
+                        help="Simulated devices (default: 10)")
+    parser.add_argument("--rate", type=float, default=500.0,
+                        help="Simulated samples per second, all devices (default: 500)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop the simulation after this many seconds")
+    args = parser.parse_args()
+
+    bridge = TelemetryBridge(args.max_samples, args.max_delay)
+    if args.simulate:
+        bridge.simulate(args.devices, args.rate, args.duration)
+    else:
+        bridge.start()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
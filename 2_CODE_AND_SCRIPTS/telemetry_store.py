@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+ICS Telemetry Store
+Time-partitioned, columnar telemetry storage written by logger.py and read
+by train_model.py.
+
+Layout (one directory per hour, one append-only file per column):
+  telemetry_store/
+    schema.json
+    2025/12/15/16/ts.bin
+    2025/12/15/16/flow_rate.bin
+    ...
+
+Each column file is a raw little-endian array with the dtype from SCHEMA,
+so a reader can load a time range and a subset of columns with one
+np.fromfile() per (partition, column) and never parses the rest.
+
+Columns stay row-aligned: append() records every column's length first and
+truncates them all back if any write fails, and the first append to a
+partition after (re)start truncates every column to the common row count,
+so a torn write from a crash never shifts later rows. Readers also stop at
+the shortest column.
+
+Missing values: float columns hold NaN, integer flag columns hold -1 and
+device_id holds b''. Partitions written before a column in ADDED_COLUMNS
+existed read it as missing, and are padded before the next append.
+
+Usage:
+  python3 telemetry_store.py info                       # Partitions and row counts
+  python3 telemetry_store.py tail -n 20                 # Last rows
+  python3 telemetry_store.py export out.csv --hours 24  # Export to CSV
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Configuration
+STORE_DIR = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/telemetry_store"
+FEATURES = ['flow_rate', 'pressure', 'temperature', 'motor_current',
+            'phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
+
+# Column name -> dtype. 'ts' is the receive time in epoch seconds (UTC).
+SCHEMA = {
+    'ts': '<f8',
+    'flow_rate': '<f4',
+    'pressure': '<f4',
+    'temperature': '<f4',
+    'motor_current': '<f4',
+    'phase': 'i1',
+    'valve_opening': 'i1',
+    'safety_trip': 'i1',
+    'a_high': 'i1',
+    'b_low': 'i1',
+    'is_anomaly': 'i1',
+    'device_id': 'S32',   # str(device_id) as published (window_features.device_key on read)
+}
+ADDED_COLUMNS = {'device_id'}  # Absent from older partitions
+MISSING_INT = -1
+PARTITION_SECONDS = 3600
+
+
+def _missing(dtype):
+    """Fill value for a column's missing entries"""
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'S':
+        return b''
+    return MISSING_INT
+
+
+def _text(value):
+    """Encode a JSON value for a bytes column ('' if absent)"""
+    return b'' if value is None else str(value).encode()
+
+
+def _number(value):
+    """Coerce a JSON value to a float, or NaN if it is not a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TelemetryStore:
+    def __init__(self, root=STORE_DIR):
+        """
+        Open (or create on first write) a store rooted at `root`.
+        """
+        self.root = root
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in SCHEMA.items()}
+        self._repaired = set()  # Partitions already aligned by this writer
+        self._schema_checked = False
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def _partition_dir(self, hour_start):
+        t = datetime.fromtimestamp(hour_start, tz=timezone.utc)
+        return os.path.join(self.root, f"{t:%Y}", f"{t:%m}", f"{t:%d}", f"{t:%H}")
+
+    def _write_schema(self):
+        """Write schema.json, or rewrite it once if SCHEMA gained columns"""
+        if self._schema_checked:
+            return
+        path = os.path.join(self.root, "schema.json")
+        schema = {'columns': SCHEMA, 'missing_int': MISSING_INT,
+                  'partition_seconds': PARTITION_SECONDS}
+        current = None
+        if os.path.exists(path):
+            with open(path) as f:
+                current = json.load(f)
+        if current != schema:
+            os.makedirs(self.root, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(schema, f, indent=2)
+        self._schema_checked = True
+
+    def _column_paths(self, part):
+        return {name: os.path.join(part, f"{name}.bin") for name in self.dtypes}
+
+    def repair(self, part):
+        """
+        Truncate every column of a partition to its common row count, and
+        pad columns added to SCHEMA since the partition was written.
+        """
+        n = self._row_count(part)
+        for name, path in self._column_paths(part).items():
+            dtype = self.dtypes[name]
+            if not os.path.exists(path):
+                if name in ADDED_COLUMNS and n:
+                    with open(path, 'wb') as f:
+                        f.write(np.full(n, _missing(dtype), dtype=dtype).tobytes())
+                continue
+            if os.path.getsize(path) != n * dtype.itemsize:
+                os.truncate(path, n * dtype.itemsize)
+        self._repaired.add(part)
+
+    def _rollback(self, written):
+        """Truncate the columns of each touched partition back to their old sizes"""
+        for part, sizes in written:
+            try:
+                for path, size in sizes.items():
+                    if os.path.exists(path):
+                        os.truncate(path, size)
+            except OSError:
+                # Could not restore; the next append re-aligns the partition
+                self._repaired.discard(part)
+
+    def append(self, timestamps, records, fsync=False):
+        """
+        Append decoded telemetry records. All or nothing: if a write fails,
+        every column is truncated back to its previous length and the error
+        is re-raised, so the caller can retry the whole batch.
+
+        Args:
+            timestamps: receive times (epoch seconds), one per record
+            records: telemetry dicts as published on ics/telemetry/data
+            fsync: fsync every column file that was written
+
+        Returns:
+            number of rows written
+        """
+        if not records:
+            return 0
+        self._write_schema()
+
+        ts = np.asarray(timestamps, dtype=self.dtypes['ts'])
+        columns = {'ts': ts}
+        for name, dtype in self.dtypes.items():
+            if name == 'ts':
+                continue
+            if dtype.kind == 'S':
+                columns[name] = np.array([_text(r.get(name)) for r in records], dtype=dtype)
+                continue
+            values = np.array([_number(r.get(name)) for r in records], dtype=np.float64)
+            if dtype.kind != 'f':
+                values = np.where(np.isnan(values), MISSING_INT, values)
+            columns[name] = values.astype(dtype)
+
+        # Group rows by hour; a batch normally falls in a single partition
+        hours = (ts // PARTITION_SECONDS).astype(np.int64)
+        written = []
+        try:
+            for hour in np.unique(hours):
+                mask = hours == hour
+                part = self._partition_dir(int(hour) * PARTITION_SECONDS)
+                os.makedirs(part, exist_ok=True)
+                if part not in self._repaired:
+                    self.repair(part)
+                paths = self._column_paths(part)
+                written.append((part, {path: os.path.getsize(path) if os.path.exists(path) else 0
+                                       for path in paths.values()}))
+                for name, values in columns.items():
+                    with open(paths[name], 'ab') as f:
+                        f.write(values[mask].tobytes())
+                        if fsync:
+                            f.flush()
+                            os.fsync(f.fileno())
+        except BaseException:
+            self._rollback(written)
+            raise
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def partitions(self, start=None, end=None):
+        """
+        List (hour_start, path) for partitions overlapping [start, end).
+
+        start/end are epoch seconds or None for an open bound.
+        """
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            rel = os.path.relpath(dirpath, self.root).split(os.sep)
+            if len(rel) != 4 or 'ts.bin' not in filenames:
+                continue
+            try:
+                t = datetime(*map(int, rel), tzinfo=timezone.utc).timestamp()
+            except ValueError:
+                continue
+            if start is not None and t + PARTITION_SECONDS <= start:
+                continue
+            if end is not None and t >= end:
+                continue
+            found.append((t, dirpath))
+        return found
+
+    def _row_count(self, path):
+        """Rows readable in a partition (shortest column wins)"""
+        counts = []
+        for name, dtype in self.dtypes.items():
+            col = os.path.join(path, f"{name}.bin")
+            if os.path.exists(col):
+                counts.append(os.path.getsize(col) // dtype.itemsize)
+            elif name not in ADDED_COLUMNS:
+                counts.append(0)
+        return min(counts)
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Load a time range and a column subset.
+
+        Args:
+            start, end: epoch seconds (or datetime) bounds, [start, end)
+            columns: column names to load (default: all of SCHEMA)
+
+        Returns:
+            dict of column name -> numpy array, all the same length
+        """
+        start = start.timestamp() if isinstance(start, datetime) else start
+        end = end.timestamp() if isinstance(end, datetime) else end
+        columns = list(columns or self.dtypes)
+        unknown = set(columns) - set(self.dtypes)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+
+        chunks = {name: [] for name in columns}
+        for hour_start, path in self.partitions(start, end):
+            part = self._read_partition(hour_start, path, start, end, columns)
+            if part is not None:
+                for name in columns:
+                    chunks[name].append(part[name])
+
+        return {name: (np.concatenate(parts) if parts else np.empty(0, self.dtypes[name]))
+                for name, parts in chunks.items()}
+
+    def _read_partition(self, hour_start, path, start, end, columns):
+        """Rows of one partition inside [start, end), or None if it has none"""
+        n = self._row_count(path)
+        if n == 0:
+            return None
+
+        # Only partitions cut by the range need the timestamp column
+        mask = None
+        if ((start is not None and hour_start < start) or
+                (end is not None and hour_start + PARTITION_SECONDS > end)):
+            ts = np.fromfile(os.path.join(path, "ts.bin"), dtype=self.dtypes['ts'], count=n)
+            mask = np.ones(n, dtype=bool)
+            if start is not None:
+                mask &= ts >= start
+            if end is not None:
+                mask &= ts < end
+
+        part = {}
+        for name in columns:
+            col = os.path.join(path, f"{name}.bin")
+            dtype = self.dtypes[name]
+            if os.path.exists(col):
+                values = np.fromfile(col, dtype=dtype, count=n)
+            else:
+                values = np.full(n, _missing(dtype), dtype=dtype)  # Older partition
+            part[name] = values if mask is None else values[mask]
+        return part
+
+    def iter_read(self, start=None, end=None, columns=None):
+        """
+        Yield read() results one hourly partition at a time, so a caller can
+        stream the whole history with memory bounded by one partition.
+        """
+        start = start.timestamp() if isinstance(start, datetime) else start
+        end = end.timestamp() if isinstance(end, datetime) else end
+        columns = list(columns or self.dtypes)
+        unknown = set(columns) - set(self.dtypes)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        # One directory walk for the whole range, not one per partition
+        for hour_start, path in self.partitions(start, end):
+            chunk = self._read_partition(hour_start, path, start, end, columns)
+            if chunk is not None and len(chunk[columns[0]]):
+                yield chunk
+
+    def read_frame(self, start=None, end=None, columns=None):
+        """Like read(), as a DataFrame: -1 flags as NaN, device IDs as str (or None)"""
+        import pandas as pd
+
+        data = self.read(start, end, columns)
+        df = pd.DataFrame(data)
+        for name in df.columns:
+            kind = self.dtypes[name].kind
+            if kind == 'S':
+                df[name] = [value.decode(errors='replace') or None for value in df[name]]
+            elif kind != 'f':
+                df[name] = df[name].where(df[name] != MISSING_INT)
+        if 'ts' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['ts'], unit='s', utc=True)
+        return df
+
+    def last_write_time(self):
+        """mtime of the newest partition's timestamp column, or None"""
+        parts = self.partitions()
+        if not parts:
+            return None
+        return os.path.getmtime(os.path.join(parts[-1][1], "ts.bin"))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ICS Telemetry Store")
+    parser.add_argument("--store", default=STORE_DIR, help="Store root directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="List partitions and row counts")
+    tail = sub.add_parser("tail", help="Print the most recent rows")
+    tail.add_argument("-n", type=int, default=10)
+    export = sub.add_parser("export", help="Export a time range to CSV")
+    export.add_argument("output")
+    export.add_argument("--hours", type=float, default=None,
+                        help="Only the last N hours (default: everything)")
+
+    args = parser.parse_args()
+    store = TelemetryStore(args.store)
+
+    if args.command == "info":
+        total = 0
+        for hour_start, path in store.partitions():
+            n = store._row_count(path)
+            total += n
+            print(f"  {datetime.fromtimestamp(hour_start, tz=timezone.utc):%Y-%m-%d %H:00} UTC"
+                  f"  {n:>10} rows")
+        print(f"Total: {total} rows")
+    elif args.command == "tail":
+        parts = store.partitions()
+        start = parts[-1][0] - PARTITION_SECONDS if parts else None
+        print(store.read_frame(start=start).tail(args.n).to_string(index=False))
+    elif args.command == "export":
+        start = time.time() - args.hours * 3600 if args.hours else None
+        df = store.read_frame(start=start)
+        df.to_csv(args.output, index=False)
+        print(f"Exported {len(df)} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import numpy as np
+
+from batch_inference import MicroBatcher
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.done = threading.Event()
+
+    def __call__(self, scores, contexts, latencies):
+        self.batches.append(list(contexts))
+        self.done.set()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_flush_on_size():
+    recorder = Recorder()
+    batcher = MicroBatcher(lambda X: X[:, 0], recorder, n_features=2,
+                           max_batch=4, max_delay=10.0)
+    for i in range(8):
+        batcher.submit(np.array([i, 0.0]), i)
+    batcher.start()
+    assert wait_for(lambda: len(recorder.batches) == 2, timeout=1.0)  # Long before max_delay
+    batcher.stop()
+    assert recorder.batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert batcher.stats()["mean_batch_size"] == 4.0
+
+
+def test_flush_on_timeout():
+    recorder = Recorder()
+    batcher = MicroBatcher(lambda X: X[:, 0], recorder, n_features=2,
+                           max_batch=64, max_delay=0.05)
+    batcher.start()
+    started = time.perf_counter()
+    for i in range(3):
+        batcher.submit(np.array([i, 0.0]), i)
+    assert recorder.done.wait(1.0)
+    waited = time.perf_counter() - started
+    batcher.stop()
+    assert recorder.batches == [[0, 1, 2]]
+    assert 0.04 <= waited < 0.5
+    assert batcher.stats()["latency_max_ms"] >= 40.0
+
+
+def test_block_is_scored_on_its_own():
+    recorder = Recorder()
+    batcher = MicroBatcher(lambda X: X[:, 0], recorder, n_features=2,
+                           max_batch=64, max_delay=0.05)
+    batcher.submit(np.array([0.0, 0.0]), "row")
+    batcher.submit_block(np.ones((3, 2)), ["a", "b", "c"])
+    batcher.start()
+    assert wait_for(lambda: len(recorder.batches) == 2)
+    batcher.stop()
+    assert recorder.batches == [["row"], ["a", "b", "c"]]
+
+
+def test_scoring_errors_do_not_stop_the_worker():
+    recorder = Recorder()
+
+    def score(X):
+        if X[0, 0] < 0:
+            raise ValueError("bad row")
+        return X[:, 0]
+
+    batcher = MicroBatcher(score, recorder, n_features=1, max_batch=1)
+    batcher.start()
+    batcher.submit(np.array([-1.0]), "bad")
+    batcher.submit(np.array([1.0]), "good")
+    assert wait_for(lambda: recorder.batches == [["good"]])
+    batcher.stop()
+    assert batcher.stats()["errors"] == 1
+
+
+def test_stats_while_scoring():
+    batcher = MicroBatcher(lambda X: X[:, 0], lambda *args: None, n_features=1,
+                           max_batch=2, max_delay=0.0)
+    batcher.start()
+    failures = []
+
+    def poll():
+        for _ in range(2000):
+            try:
+                batcher.stats()
+            except RuntimeError as e:  # deque mutated during iteration
+                failures.append(e)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    for i in range(20000):
+        batcher.submit(np.array([float(i)]))
+    poller.join()
+    batcher.stop()
+    assert failures == []
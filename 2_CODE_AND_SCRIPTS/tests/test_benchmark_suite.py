@@ -0,0 +1,37 @@
+import numpy as np
+
+from benchmark_suite import compare, percentiles, run_once, train_models
+from load_generator import TelemetryProfile
+
+# Normal pressure well away from the 5.0 a spoofed sensor reports
+PROFILE = TelemetryProfile(mean=[10.0, 50.0, 40.0, 2.0], cov=np.diag([1.0, 4.0, 4.0, 0.01]))
+
+
+def result(throughput, p95):
+    return {"runs": [{"n_estimators": 50, "batch_size": 64, "rate": 1000, "workers": 0,
+                      "format": "json", "throughput": throughput,
+                      "detect_ms": {"p50": 1.0, "p95": p95, "p99": 5.0}}]}
+
+
+def test_percentiles():
+    stats = percentiles([0.001] * 99 + [0.1])
+    assert stats["p50"] == 1.0 and stats["max"] == 100.0 and stats["count"] == 100
+    assert percentiles([]) is None
+
+
+def test_compare_flags_regressions_only(capsys):
+    assert compare(result(1000.0, 2.0), result(950.0, 2.1)) == 0  # Within 10%
+    assert compare(result(1000.0, 2.0), result(800.0, 3.0)) == 2
+    assert compare(result(1000.0, 2.0), result(2000.0, 1.0)) == 0  # Faster is fine
+    assert "regression" in capsys.readouterr().out
+
+
+def test_end_to_end_run(tmp_path):
+    paths, timings = train_models(PROFILE, [10], str(tmp_path), rows=500)
+    assert timings[0]["n_estimators"] == 10
+    run = run_once(paths[10], PROFILE, 10, batch_size=16, rate=400, duration=0.5,
+                   devices=10)  # One spoofed device: a tenth of the samples
+    assert run["published"] > 0
+    assert run["scored"] == run["published"] and run["dropped"] == 0
+    assert run["interventions"] > 0  # The spoofed devices are caught
+    assert run["detect_ms"]["count"] == run["scored"]
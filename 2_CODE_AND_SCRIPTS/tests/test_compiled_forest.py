@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from compiled_forest import CompiledForest, export_forest, load_forest
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 9))
+    X[:20] += 6  # A few clear outliers
+    return X
+
+
+@pytest.fixture(scope="module")
+def model(data):
+    return IsolationForest(n_estimators=50, contamination=0.01, random_state=0).fit(data)
+
+
+def test_scores_match_sklearn(model, data):
+    compiled = export_forest(model)
+    np.testing.assert_array_equal(compiled.decision_function(data),
+                                  model.decision_function(data))
+    np.testing.assert_array_equal(compiled.predict(data), model.predict(data))
+
+
+def test_missing_values_follow_sklearn(model, data):
+    X = data[:200].copy()
+    X[::3, 1] = np.nan
+    np.testing.assert_array_equal(export_forest(model).decision_function(X),
+                                  model.decision_function(X))
+
+
+def test_save_load_round_trip(model, data, tmp_path):
+    path = tmp_path / "model.npz"
+    export_forest(model).save(path)
+    for loaded in (CompiledForest.load(path), load_forest(path)):
+        assert isinstance(loaded, CompiledForest)
+        assert loaded.n_features_in_ == 9
+        assert loaded.n_estimators == 50
+        assert loaded.get_params()['contamination'] == 0.01
+        np.testing.assert_array_equal(loaded.decision_function(data),
+                                      model.decision_function(data))
+
+
+def test_auto_contamination_round_trip(data, tmp_path):
+    model = IsolationForest(n_estimators=10, random_state=0).fit(data)
+    path = tmp_path / "auto.npz"
+    export_forest(model).save(path)
+    loaded = load_forest(path)
+    assert loaded.contamination == "auto"
+    np.testing.assert_array_equal(loaded.predict(data), model.predict(data))
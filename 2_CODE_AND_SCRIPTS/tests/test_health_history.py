@@ -0,0 +1,51 @@
+import asyncio
+import math
+
+import health_monitor
+from health_history import HEADER, VERSION, HealthHistory, HistoryFile
+
+SERVICES = ["mosquitto", "ics_ai_node"]
+
+
+def status(**values):
+    base = {"services": {name: "active" for name in SERVICES}, "mqtt_ports": [8883],
+            "errors": {}, "metrics": {"memory_used_mb": 100.0, "memory_total_mb": 400.0}}
+    base.update(values)
+    return base
+
+
+def test_zero_is_kept_and_none_is_unknown(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = HealthHistory(path, SERVICES, [8883], health_monitor.CHECKS)
+    history.append(status(log_hours_old=0.0, disk_percent=0.0), now=1000.0)
+    history.append(status(log_hours_old=None), now=1030.0)
+    history.close()
+
+    with open(path, "rb") as f:
+        assert HEADER.unpack(f.read(HEADER.size))[1] == VERSION == 1
+    reader = HistoryFile(path)
+    fresh, unknown = reader.read()
+    reader.close()
+    assert fresh['log_hours_old'] == 0.0 and fresh['disk_percent'] == 0.0
+    assert math.isnan(unknown['log_hours_old'])
+    assert fresh['memory_percent'] == 25.0
+
+
+def test_sustained_alert_raises_and_clears(tmp_path):
+    history = HealthHistory(str(tmp_path / "history.bin"), SERVICES, [8883])
+    raised = []
+    for i in range(25):
+        raised += history.append(status(disk_percent=90.0), now=1000.0 + i * 30)[0]
+    assert [name for name, _ in raised] == ["disk_high"]  # Once, after 10 min
+    _, cleared, active = history.append(status(disk_percent=50.0), now=1800.0)
+    assert cleared == ["disk_high"] and active == []
+
+
+def test_fresh_telemetry_reports_zero_hours(monkeypatch):
+    # A log written moments ago is 0.0 hours old, not unknown
+    monkeypatch.setattr(health_monitor, "check_log_file_recent", lambda: (True, 0.01))
+    _, result = asyncio.run(health_monitor.run_health_check_async())
+    assert result["log_hours_old"] == 0.0
+    monkeypatch.setattr(health_monitor, "check_log_file_recent", lambda: (True, None))
+    _, result = asyncio.run(health_monitor.run_health_check_async())
+    assert result["log_hours_old"] is None
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from health_monitor import CheckBusy, CheckRunner
+
+
+def test_check_result_and_error():
+    runner = CheckRunner(workers=2)
+
+    def broken():
+        raise OSError("no such file")
+
+    async def cycle():
+        assert await runner.run(lambda a, b: a + b, 2, 3) == 5
+        with pytest.raises(OSError):
+            await runner.run(broken)
+
+    asyncio.run(cycle())
+
+
+def test_hung_check_is_skipped_not_restarted():
+    runner = CheckRunner(workers=2)
+    release = threading.Event()
+    started = []
+
+    def hung():
+        started.append(1)
+        release.wait(5)
+        return "done"
+
+    def quick():
+        return "ok"
+
+    async def cycle():
+        return await asyncio.gather(runner.run(hung, timeout=0.05),
+                                    runner.run(quick, timeout=1.0),
+                                    return_exceptions=True)
+
+    threads = threading.active_count()
+    first = asyncio.run(cycle())
+    assert isinstance(first[0], asyncio.TimeoutError) and first[1] == "ok"
+    for _ in range(5):
+        hung_result, quick_result = asyncio.run(cycle())
+        assert isinstance(hung_result, CheckBusy) and quick_result == "ok"
+    assert len(started) == 1 and runner.skipped == 5
+    assert threading.active_count() == threads  # No thread per cycle
+
+    release.set()
+    for _ in range(100):
+        if hung not in runner._in_flight:
+            break
+        threading.Event().wait(0.01)
+    assert asyncio.run(runner.run(hung, timeout=1.0)) == "done"
+    assert len(started) == 2
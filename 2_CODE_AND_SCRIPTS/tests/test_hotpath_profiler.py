@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+import types
+
+import pytest
+
+from hotpath_profiler import ProfileCapture, StageTimers
+from metrics_exporter import MetricsRegistry
+
+
+def work(x):
+    return sum(range(x))
+
+
+def test_stage_timers_attach_times_calls_and_detach_restores():
+    registry = MetricsRegistry()
+    timers = StageTimers(registry)
+    target = types.SimpleNamespace(score=work, decode=None)
+    timers.attach([(target, 'score', 'score'), (target, 'decode', 'decode')])
+    assert timers.active
+    assert target.score is not work
+    assert target.score(10) == 45
+    target.score(100)
+    timers.detach()
+    assert not timers.active
+    assert target.score is work
+    assert target.decode is None  # Missing hooks are skipped
+    [(stage, calls, mean, total)] = timers.summary()
+    assert (stage, calls) == ('score', 2)
+    assert total >= mean > 0
+    assert 'ics_stage_seconds_count{stage="score"} 2\n' in registry.render()
+
+
+def test_detach_leaves_attributes_replaced_since():
+    timers = StageTimers(MetricsRegistry())
+    target = types.SimpleNamespace(score=work)
+    timers.attach([(target, 'score', 'score')])
+    swapped = lambda x: 0  # noqa: E731 - e.g. a model reload
+    target.score = swapped
+    timers.detach()
+    assert target.score is swapped
+
+
+def test_sample_capture_writes_collapsed_stacks(tmp_path):
+    stop = threading.Event()
+    busy = threading.Thread(target=lambda: [work(1000) for _ in iter(stop.is_set, True)],
+                            name="busy", daemon=True)
+    busy.start()
+    capture = ProfileCapture(lambda: [], str(tmp_path))
+    try:
+        assert capture.start('sample', 0.2)
+        assert not capture.start('sample', 0.2)  # One capture at a time
+        capture.join(10)
+    finally:
+        stop.set()
+    collapsed, report = capture.last_paths
+    assert collapsed.endswith(".collapsed") and report.endswith(".txt")
+    with open(collapsed) as f:
+        assert any(line.startswith("busy;") for line in f)
+    assert "snapshots every" in open(report).read()
+
+
+def test_cprofile_capture_profiles_hooks(tmp_path):
+    target = types.SimpleNamespace(score=work)
+    capture = ProfileCapture(lambda: [(target, 'score', 'score')], str(tmp_path))
+    assert capture.start('cprofile', 0.3)
+    deadline = time.monotonic() + 5
+    while target.score is work and time.monotonic() < deadline:
+        time.sleep(0.01)  # Hooks are patched from the capture thread
+    target.score(1000)
+    capture.join(10)
+    assert target.score is work
+    prof, report = capture.last_paths
+    assert os.path.getsize(prof) > 0
+    assert "work" in open(report).read()
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    capture = ProfileCapture(lambda: [], str(tmp_path))
+    with pytest.raises(ValueError):
+        capture.start('perf')
+    assert not capture.running
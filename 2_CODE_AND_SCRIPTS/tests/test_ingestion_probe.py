@@ -0,0 +1,145 @@
+import json
+import threading
+import types
+
+import pytest
+
+import ingestion_probe
+from ingestion_probe import (IngestionProbe, TelemetryTap, metric_sum, parse_metrics,
+                             percentile, sample_time)
+from telemetry_binary import encode
+
+NODE = "http://node/metrics"
+LOGGER = "http://logger/metrics"
+
+
+class FakeTap:
+    topics = ingestion_probe.TOPICS
+
+    def __init__(self):
+        self.connected = threading.Event()
+        self.connected.set()
+        self.messages = 0
+        self.untimed = 0
+        self.lags = []
+
+    def take_lags(self):
+        lags, self.lags = sorted(self.lags), []
+        return lags
+
+
+@pytest.fixture
+def world(monkeypatch):
+    """A probe on a fake tap, fake /metrics pages and a settable clock"""
+    state = types.SimpleNamespace(now=1000.0, pages={NODE: "", LOGGER: ""})
+    monkeypatch.setattr(ingestion_probe, "time", types.SimpleNamespace(time=lambda: state.now))
+    monkeypatch.setattr(ingestion_probe, "scrape", lambda url: parse_metrics(state.pages[url]))
+    state.tap = FakeTap()
+    state.probe = IngestionProbe(tap=state.tap, node_url=NODE, logger_url=LOGGER)
+    return state
+
+
+def consumers(world, logger_received, node_received, buffered=0, queued=0, dropped=0):
+    world.pages[LOGGER] = (f'ics_logger_received_total{{topic="ics/telemetry/data"}} {logger_received}\n'
+                           f"ics_logger_buffered {buffered}\n")
+    world.pages[NODE] = (f'ics_messages_received_total{{topic="ics/telemetry/data"}} {node_received}\n'
+                         f"ics_samples_dropped_total {dropped}\n"
+                         f"ics_queue_depth {queued}\n")
+
+
+def test_sample_time_reads_json_and_binary():
+    assert sample_time(b'{"timestamp": 12.5}') == 12.5
+    assert sample_time(json.dumps({"timestamp": "2025-01-01T00:00:00+00:00"})) == 1735689600.0
+    assert sample_time(encode({}, ts=99.0)) == 99.0
+    assert sample_time(b'{"timestamp": true}') is None
+    assert sample_time(b"not json") is None
+
+
+def test_metrics_parsing_and_percentiles():
+    metrics = parse_metrics('# TYPE x counter\nx{topic="a"} 2\nx{topic="b"} 3\ny 1.5\n')
+    assert metric_sum(metrics, "x") == 5
+    assert metric_sum(metrics, "x", topic="b") == 3
+    assert metric_sum(metrics, "z") is None
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([], 50) is None
+
+
+def test_tap_records_lags(monkeypatch):
+    monkeypatch.setattr(ingestion_probe, "CA_CERT", "/etc/ssl/certs/ca-certificates.crt")
+    tap = TelemetryTap(lag_samples=2)
+    monkeypatch.setattr(ingestion_probe, "time", types.SimpleNamespace(time=lambda: 110.0))
+    for payload in (b'{"timestamp": 100}', b'{"timestamp": 105}', encode({}, ts=108.0), b"{}"):
+        tap.on_message(None, None, types.SimpleNamespace(payload=payload))
+    assert (tap.messages, tap.untimed) == (4, 1)
+    assert tap.take_lags() == [2.0, 5.0]  # Only the newest lag_samples are kept
+    assert tap.take_lags() == []
+
+
+def test_first_measurement_only_sets_baseline(world):
+    consumers(world, 0, 0)
+    world.tap.lags = [0.2, 0.1]
+    report = world.probe.measure()
+    assert world.probe.has_baseline
+    assert report["msgs_per_s"] is None and report["drop_rate"] is None
+    assert report["lag_p95_s"] == 0.2
+    assert report["issues"] == []
+
+
+def test_healthy_interval(world):
+    consumers(world, 0, 0)
+    world.probe.measure()
+    world.now += 10
+    world.tap.messages = 100
+    world.tap.lags = [0.1] * 100
+    consumers(world, 100, 100, buffered=5)
+    report = world.probe.measure()
+    assert report["msgs_per_s"] == 10
+    assert report["logger"]["msgs_per_s"] == 10
+    assert report["logger"]["backlog_s"] == 0.5
+    assert report["drop_rate"] == 0
+    assert report["issues"] == []
+
+
+def test_lag_backlog_and_drops_are_reported(world):
+    consumers(world, 0, 0)
+    world.probe.measure()
+    world.now += 10
+    world.tap.messages = 100
+    world.tap.lags = [10.0] * 100
+    consumers(world, 100, 100, queued=500, dropped=20)
+    report = world.probe.measure()
+    assert report["node"]["drop_rate"] == pytest.approx(0.2)
+    assert report["node"]["backlog_s"] == 50
+    issues = "\n".join(report["issues"])
+    assert "telemetry lag p95 10.0 s" in issues
+    assert "node backlog 500 messages, 50.0 s behind" in issues
+    assert "node missed 20.0% of telemetry" in issues
+    assert "logger" not in issues
+
+
+def test_too_few_messages_are_not_judged(world):
+    consumers(world, 0, 0)
+    world.probe.measure()
+    world.now += 10
+    world.tap.messages = ingestion_probe.MIN_MESSAGES - 1
+    consumers(world, 0, 0)
+    assert world.probe.measure()["drop_rate"] is None
+
+
+def test_unreachable_consumer_is_reported_not_judged(world, monkeypatch):
+    def scrape(url):
+        raise OSError("connection refused")
+
+    world.probe.measure()
+    monkeypatch.setattr(ingestion_probe, "scrape", scrape)
+    world.now += 10
+    world.tap.messages = 100
+    report = world.probe.measure()
+    assert report["node"]["error"] == "connection refused"
+    assert report["issues"] == []
+
+
+def test_disconnected_tap_raises(world):
+    world.tap.connected.clear()
+    with pytest.raises(ConnectionError):
+        world.probe.measure()
@@ -0,0 +1,35 @@
+import types
+
+import pytest
+
+import intervention_dispatcher
+from intervention_dispatcher import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [500.0]
+    monkeypatch.setattr(intervention_dispatcher, "time",
+                        types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_burst_then_empty(clock):
+    bucket = TokenBucket(rate=1.0, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_refill_at_rate(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.take()
+    clock[0] += 0.25  # Half a token
+    assert not bucket.take()
+    clock[0] += 0.25
+    assert bucket.take() and not bucket.take()
+
+
+def test_refill_capped_at_burst(clock):
+    bucket = TokenBucket(rate=1.0, burst=2)
+    clock[0] += 3600.0
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
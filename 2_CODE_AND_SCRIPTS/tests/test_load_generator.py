@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+import telemetry_binary as tb
+from load_generator import ANALOG, FLOOD_MULTIPLIER, TRAINING_DATA, AttackWindow, \
+    LoadGenerator, StubBroker, TelemetryProfile, load_recording, replay
+
+PROFILE = TelemetryProfile(mean=[10.0, 5.0, 40.0, 2.0], cov=np.diag([1.0, 0.25, 4.0, 0.01]))
+
+
+def collect(fmt, **kwargs):
+    sent = []
+    generator = LoadGenerator(lambda topic, payload: sent.append((topic, payload)) or 0,
+                              PROFILE, fmt=fmt, **kwargs)
+    return generator, sent
+
+
+def test_profile_fits_training_data():
+    profile = TelemetryProfile.from_csv(TRAINING_DATA)
+    assert profile.mean.shape == (len(ANALOG),)
+    samples = profile.sample(np.zeros((5000, len(ANALOG))), np.random.default_rng(0))
+    np.testing.assert_allclose(samples.mean(axis=0), profile.mean, rtol=0.05, atol=0.05)
+
+
+def test_json_round_robin_over_devices():
+    generator, sent = collect('json', devices=3)
+    generator.step(7, elapsed=0.0)
+    records = [json.loads(payload) for _, payload in sent]
+    assert [r['device_id'] for r in records] == ['pump-0000', 'pump-0001', 'pump-0002'] * 2 \
+        + ['pump-0000']
+    assert all(r['is_anomaly'] == 0 and r['mode'] == "normal" for r in records)
+    assert generator.samples == generator.messages == 7
+
+
+@pytest.mark.parametrize("fmt, messages", [('bin', 120), ('frame', 3)])
+def test_binary_formats(fmt, messages):
+    generator, sent = collect(fmt, devices=10, frame_size=50)
+    generator.step(120, elapsed=0.0)
+    assert len(sent) == messages
+    if fmt == 'frame':
+        devices = np.concatenate([tb.decode_frame(payload)['device'] for _, payload in sent])
+    else:
+        devices = np.array([tb.decode(payload)['device_id'] for _, payload in sent])
+    assert list(devices) == [i % 10 for i in range(120)]
+
+
+def test_attacks_hit_only_targeted_devices_in_their_window():
+    generator, sent = collect('json', devices=20, attack_fraction=0.25,
+                              attacks=[AttackWindow('spoofing', 10, 5),
+                                       AttackWindow('flood', 10, 5)])
+    generator.step(20, elapsed=0.0)  # Before the window
+    assert all(json.loads(p)['is_anomaly'] == 0 for _, p in sent)
+    sent.clear()
+    generator.step(20, elapsed=12.0)
+    records = [json.loads(p) for _, p in sent]
+    targeted = {f"pump-{i:04d}" for i in np.flatnonzero(generator.targeted)}
+    assert len(targeted) == 5
+    spoofed = [r for r in records[:20] if r['is_anomaly']]
+    assert {r['device_id'] for r in spoofed} == targeted
+    assert len(records) == 20 + 5 * FLOOD_MULTIPLIER
+    assert generator.attack_samples['flood'] == 5 + 5 * FLOOD_MULTIPLIER
+
+
+def test_stub_broker_routes_wildcards():
+    broker = StubBroker()
+    seen = []
+    broker.subscribe("ics/telemetry/#", lambda message: seen.append(message.topic))
+    broker.subscribe("ics/control", lambda message: seen.append("control"))
+    broker.publish("ics/telemetry/data", "{}")
+    broker.publish("ics/other", b"x")
+    assert seen == ["ics/telemetry/data"]
+    assert (broker.published, broker.delivered) == (2, 1)
+
+
+def test_replay_keeps_order_and_spacing(tmp_path):
+    path = tmp_path / "security_logs.csv"
+    path.write_text("timestamp,topic,data\n"
+                    "2026-01-01T00:00:01,ics/telemetry/data,\"{\"\"n\"\": 2}\"\n"
+                    "2026-01-01T00:00:00,ics/telemetry/data,\"{\"\"n\"\": 1}\"\n")
+    messages = load_recording(str(path))
+    assert [json.loads(payload)['n'] for _, _, payload in messages] == [1, 2]
+    sent = []
+    stats = replay(lambda topic, payload: sent.append(payload) or 0, messages, speed=10)
+    assert len(sent) == 2 and stats['recorded_s'] == 1.0
+    assert 0.09 <= stats['elapsed_s'] < 1.0
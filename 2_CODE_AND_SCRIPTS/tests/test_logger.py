@@ -0,0 +1,136 @@
+import csv
+import errno
+import os
+import types
+
+import pytest
+
+import logger
+from logger import CsvSink, TelemetryLogger
+
+SYSTEM_CA = "/etc/ssl/certs/ca-certificates.crt"
+
+
+class FakeClient:
+    def __init__(self):
+        self.acked = []
+
+    def ack(self, mid, qos):
+        self.acked.append(mid)
+
+
+class FlakySink:
+    """Fails the next `failures` writes, then records what it is given"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.rows = []
+
+    def write(self, rows, fsync=False):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(errno.ENOSPC, "No space left on device")
+        self.rows.extend(rows)
+        return len(rows)
+
+
+def message(mid, qos=1, payload=b'{"flow_rate": 1}'):
+    return types.SimpleNamespace(topic=logger.TOPIC, payload=payload, mid=mid, qos=qos)
+
+
+@pytest.fixture
+def make_logger(monkeypatch):
+    monkeypatch.setattr(logger, "CA_CERT", SYSTEM_CA)
+
+    def make(sink, **kwargs):
+        telemetry_logger = TelemetryLogger(sink, **kwargs)
+        telemetry_logger.client = FakeClient()
+        return telemetry_logger
+    return make
+
+
+def test_ack_only_after_write(make_logger):
+    sink = FlakySink()
+    lg = make_logger(sink)
+    for mid in range(5):
+        lg.on_message(None, None, message(mid, qos=1 if mid % 2 else 0))
+    assert lg.client.acked == []
+    assert lg.flush() == 5
+    assert len(sink.rows) == 5
+    assert lg.client.acked == [1, 3]  # QoS 0 messages need no ack
+
+
+def test_failed_write_is_retried_then_acked(make_logger):
+    sink = FlakySink(failures=2)
+    lg = make_logger(sink)
+    for mid in range(3):
+        lg.on_message(None, None, message(mid))
+    assert lg.flush() == 0 and lg.flush() == 0
+    assert lg.client.acked == [] and lg.write_errors == 2
+    lg.on_message(None, None, message(3))
+    assert lg.flush() == 4
+    assert [topic_row[2] for topic_row in sink.rows] == [b'{"flow_rate": 1}'] * 4
+    assert lg.client.acked == [0, 1, 2, 3]
+
+
+def test_retry_buffer_is_bounded(make_logger):
+    lg = make_logger(FlakySink(failures=10), max_buffered=4)
+    for mid in range(10):
+        lg.on_message(None, None, message(mid))
+    lg.flush()
+    assert lg.dropped == 6
+    assert [mid for _, mid, _ in lg._buffer] == [6, 7, 8, 9]  # Oldest dropped
+
+
+def test_inflight_window_triggers_flush(make_logger):
+    lg = make_logger(FlakySink(), flush_records=1000, inflight_window=3)
+    lg.on_message(None, None, message(0, qos=0))
+    lg.on_message(None, None, message(1))
+    lg.on_message(None, None, message(2))
+    assert not lg._wakeup.is_set()
+    lg.on_message(None, None, message(3))
+    assert lg._wakeup.is_set()
+
+
+def test_flusher_survives_errors(make_logger):
+    lg = make_logger(FlakySink())
+    lg.running = True
+    lg.flush_interval = 0.01
+    calls = []
+
+    def broken_flush(force_fsync=False):
+        calls.append(1)
+        if len(calls) == 3:
+            lg.running = False
+        raise RuntimeError("boom")
+
+    lg.flush = broken_flush
+    lg._flush_loop()
+    assert lg.flusher_errors == 3
+
+
+def test_csv_partial_write_is_truncated(tmp_path, monkeypatch):
+    path = tmp_path / "security_logs.csv"
+    sink = CsvSink(str(path))
+    sink.open()
+    sink.write([(1.0, logger.TOPIC, b'{"a": 1}')])
+    good = path.read_bytes()
+
+    # Half the batch reaches the file, then the disk fills up
+    real_write = os.write
+
+    def partial_write(fd, data):
+        real_write(fd, bytes(data[:len(data) // 2]))
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(logger.os, "write", partial_write)
+    with pytest.raises(OSError):
+        sink.write([(2.0, logger.TOPIC, b'{"a": 2}'), (3.0, logger.TOPIC, b'{"a": 3}')])
+    assert path.read_bytes() == good
+
+    monkeypatch.undo()
+    sink.write([(2.0, logger.TOPIC, b'{"a": 2}'), (3.0, logger.TOPIC, b'{"a": 3}')])
+    sink.close()
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert [row[2] for row in rows[1:]] == ['{"a": 1}', '{"a": 2}', '{"a": 3}']
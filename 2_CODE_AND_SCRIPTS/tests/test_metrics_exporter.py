@@ -0,0 +1,55 @@
+import urllib.request
+
+import pytest
+
+from metrics_exporter import CONTENT_TYPE, MetricsRegistry, MetricsServer
+
+
+def test_render_counters_gauges_and_callbacks():
+    registry = MetricsRegistry()
+    registry.counter("ics_messages_total", "Messages", topic="a").inc(3)
+    registry.counter("ics_messages_total", "Messages", topic='b"\n').inc()
+    registry.gauge("ics_depth", "Depth").set(2.5)
+    registry.gauge_fn("ics_broken", "Fails when read", lambda: 1 / 0)
+    text = registry.render()
+    assert "# TYPE ics_messages_total counter\n" in text
+    assert 'ics_messages_total{topic="a"} 3\n' in text
+    assert 'ics_messages_total{topic="b\\"\\n"} 1\n' in text
+    assert "ics_depth 2.5\n" in text
+    assert "ics_broken NaN\n" in text  # A failing callback does not break the scrape
+    assert registry.counter("ics_messages_total", "Messages", topic="a").value == 3  # Same child
+
+
+def test_kind_conflict_is_rejected():
+    registry = MetricsRegistry()
+    registry.counter("ics_x", "X")
+    with pytest.raises(ValueError):
+        registry.gauge("ics_x", "X")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("ics_latency_seconds", "Latency", (0.01, 0.1))
+    histogram.observe(0.005)
+    histogram.observe_many([0.01, 0.05, 0.5])
+    text = registry.render()
+    assert 'ics_latency_seconds_bucket{le="0.01"} 2\n' in text  # le is inclusive
+    assert 'ics_latency_seconds_bucket{le="0.1"} 3\n' in text
+    assert 'ics_latency_seconds_bucket{le="+Inf"} 4\n' in text
+    assert "ics_latency_seconds_count 4\n" in text
+    assert histogram.sum == pytest.approx(0.565)
+
+
+def test_http_endpoint_and_textfile(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("ics_up_total", "Up").inc()
+    textfile = tmp_path / "ics.prom"
+    server = MetricsServer(registry, port=0, textfile=str(textfile), textfile_interval=60)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert "ics_up_total 1" in response.read().decode()
+    finally:
+        server.stop()
+    assert textfile.read_text() == registry.render()
@@ -0,0 +1,65 @@
+import types
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+import ai_security_node_final as node_module
+from model_watcher import ModelWatcher
+from train_model import FEATURES, save_model
+
+
+def train(path, n_features=len(FEATURES), seed=0, features=FEATURES):
+    X = np.random.default_rng(seed).normal(size=(300, n_features))
+    model = IsolationForest(n_estimators=10, random_state=seed).fit(X)
+    save_model(model, str(path), features=features)
+    return model
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    monkeypatch.setattr(node_module, "CA_CERT", "/etc/ssl/certs/ca-certificates.crt")
+    train(tmp_path / "model.pkl")
+    client = types.SimpleNamespace(publish=lambda *args, **kwargs: None)
+    return node_module.ICSAISecurityNode(mode='monitor', client=client,
+                                         model_path=str(tmp_path / "model.pkl"))
+
+
+def test_reload_swaps_the_scoring_model(node, tmp_path):
+    X = np.random.default_rng(9).normal(size=(5, len(FEATURES)))
+    before = node.batcher.score_fn(X)
+    new_model = train(tmp_path / "model.pkl", seed=1)
+    assert node.reload_model()
+    assert node.model_generation == 1
+    np.testing.assert_array_equal(node.batcher.score_fn(X), new_model.decision_function(X))
+    assert not np.array_equal(before, node.batcher.score_fn(X))
+
+
+def test_incompatible_model_is_rejected(node, tmp_path):
+    current = node.model
+    train(tmp_path / "model.pkl", n_features=4, features=FEATURES[:4])
+    assert not node.reload_model()
+    assert node.model is current and node.model_generation == 0
+
+
+def test_watcher_waits_for_the_files_to_settle(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(b"v1")
+    changes = []
+    watcher = ModelWatcher([str(path), str(tmp_path / "absent.json")],
+                           on_change=lambda: changes.append(path.read_bytes()))
+    # What is written before each poll (None: nothing); sizes differ per write
+    steps = iter([b"v2-part", b"v2-complete", None, None])
+
+    class Polls:
+        def wait(self, interval):
+            step = next(steps, "stop")
+            if step == "stop":
+                return True
+            if step is not None:
+                path.write_bytes(step)
+            return False
+
+    watcher._stop = Polls()
+    watcher._run()
+    assert changes == [b"v2-complete"]  # Once, after a poll without change
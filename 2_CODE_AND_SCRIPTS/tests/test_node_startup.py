@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything collect mode used to drag in besides paho, json and ssl
+HEAVY = ['numpy', 'telemetry_binary', 'metrics_exporter', 'hotpath_profiler',
+         'http.server', 'socketserver', 'cProfile', 'logging.handlers', 'queue']
+
+BUILD_NODE = """
+import json, sys, types
+import ai_security_node_final as node_module
+node_module.CA_CERT = None
+client = types.SimpleNamespace()
+node = node_module.ICSAISecurityNode(mode='collect', client=client)
+node.on_message(client, None, types.SimpleNamespace(
+    topic=node_module.TELEMETRY_TOPIC, payload=b'{"flow_rate": 1}'))
+node.on_message(client, None, types.SimpleNamespace(
+    topic=node_module.CONTROL_TOPIC, payload=b'not json'))
+node.log_status()
+print(json.dumps({"counted": node.normal_count,
+                  "loaded": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY,)
+
+
+def test_collect_mode_imports_stay_light():
+    result = subprocess.run([sys.executable, "-c", BUILD_NODE], cwd=SCRIPTS,
+                            capture_output=True, text=True, timeout=60, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {"counted": 1, "loaded": []}
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from compiled_forest import load_forest
+from regime_forest import RegimeForest, regime_codes, regime_name
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(1)
+    states = rng.integers(0, 2, (3000, 3)).astype(np.float64)
+    analog = rng.normal(size=(3000, 4)) + states @ rng.normal(size=(3, 4)) * 3
+    return np.hstack([analog, states, rng.integers(0, 2, (3000, 2))])
+
+
+@pytest.fixture(scope="module")
+def model(data):
+    # Own forests for regimes 0 and 5; everything else goes to the fallback
+    columns = [4, 5, 6]
+    codes = regime_codes(data[:, columns])
+    members = [IsolationForest(n_estimators=10, random_state=0).fit(data[codes == code])
+               for code in (0, 5)]
+    members.append(IsolationForest(n_estimators=10, random_state=0).fit(data))
+    table = np.full(8, 2)
+    table[0], table[5] = 0, 1
+    return RegimeForest(members, table, columns)
+
+
+def test_regime_codes():
+    values = [[0, 0, 0], [1, 0, 1], [1, 1, 1], [2, 0, 0], [np.nan, 0, 0], [0.5, 0, 0]]
+    np.testing.assert_array_equal(regime_codes(values), [0, 5, 7, -1, -1, -1])
+    assert regime_name(5) == "phase=1,valve_opening=0,safety_trip=1"
+
+
+def test_routing_matches_members(model, data):
+    index = model.route(data)
+    scores = model.decision_function(data)
+    for i, member in enumerate(model.models):
+        rows = index == i
+        assert rows.any()
+        np.testing.assert_array_equal(scores[rows], member.decision_function(data[rows]))
+
+
+def test_invalid_flags_use_fallback(model, data):
+    X = data[:50].copy()
+    X[:, 4] = np.nan
+    assert (model.route(X) == model.fallback).all()
+    np.testing.assert_array_equal(model.decision_function(X),
+                                  model.models[-1].decision_function(X))
+
+
+def test_compiled_parity(model, data, tmp_path):
+    path = tmp_path / "model.npz"
+    model.compiled().save(path)
+    loaded = load_forest(path)
+    assert isinstance(loaded, RegimeForest)
+    assert loaded.regimes() == model.regimes()
+    np.testing.assert_allclose(loaded.decision_function(data),
+                               model.decision_function(data), rtol=0, atol=1e-12)
@@ -0,0 +1,96 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+import telemetry_binary as tb
+from compiled_forest import export_forest
+from sharded_inference import ShardedScorer, make_payloads, shard_of, split_frame
+
+FIELDS = ['flow_rate', 'pressure', 'temperature', 'motor_current',
+          'phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
+
+
+def test_shard_of_is_stable_per_device():
+    payloads = make_payloads(200, devices=8)
+    by_device = {}
+    for payload in payloads:
+        device = json.loads(payload)['device_id']
+        by_device.setdefault(device, set()).add(shard_of(payload, 4))
+    assert all(len(shards) == 1 for shards in by_device.values())
+    assert len(set().union(*by_device.values())) > 1  # Devices do spread out
+    assert shard_of(b'{"flow_rate": 1}', 4) == 0  # No device ID: shard 0
+
+
+def test_json_routes_with_its_device_number():
+    for device in range(8):
+        payload = json.dumps({"device_id": f"pump-{device:03d}"}).encode()
+        record = tb.encode({'flow_rate': 1.0}, device=device, ts=1.0)
+        assert shard_of(payload, 4) == shard_of(record, 4) == device % 4
+
+
+def test_binary_and_frames_route_by_device_number():
+    record = tb.encode({'flow_rate': 1.0}, device=6, ts=1.0)
+    assert shard_of(record, 4) == 2
+    frame = tb.encode_frame([tb.encode({'flow_rate': float(i)}, device=i, ts=float(i))
+                             for i in range(8)])
+    parts = dict(split_frame(frame, 4))
+    assert sorted(parts) == [0, 1, 2, 3]
+    for shard, part in parts.items():
+        devices = tb.decode_frame(part)['device']
+        assert (devices % 4 == shard).all()
+        assert list(devices) == sorted(devices)  # Order kept within a shard
+
+
+@pytest.fixture(scope="module")
+def model():
+    X = np.random.default_rng(0).normal(size=(500, len(FIELDS)))
+    return export_forest(IsolationForest(n_estimators=10, random_state=0).fit(X))
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_workers_survive_bad_payloads_and_restart(model):
+    scored = []
+    lock = threading.Lock()
+
+    def on_scored(scores, contexts, latencies):
+        with lock:
+            scored.append(len(scores))
+
+    shards = ShardedScorer(2, model, FIELDS, None, on_scored, max_batch=4, max_delay=0.02)
+    shards.start()
+    try:
+        # Non-scalar field values and broken JSON on every shard
+        for device in range(8):
+            shards.submit(f'{{"device_id":"pump-{device:03d}","flow_rate":{{"a":1}}}}'.encode())
+            shards.submit(f'{{"device_id":"pump-{device:03d}","pressure":[1,2]}}'.encode())
+            shards.submit(f'{{"device_id":"pump-{device:03d}",'.encode())
+        payloads = make_payloads(40, devices=8)
+        for payload in payloads:
+            shards.submit(payload)
+        assert wait_for(lambda: shards.samples == 40)
+        assert shards.invalid == 24
+        assert shards.stats()['workers_alive'] == 2
+
+        # A worker that dies anyway is replaced and its devices are scored again
+        os.kill(shards.worker_pids()[0], signal.SIGKILL)
+        assert wait_for(lambda: shards.restarts == 1)
+        assert wait_for(lambda: shards.stats()['workers_alive'] == 2)
+        for payload in payloads:
+            shards.submit(payload)
+        assert wait_for(lambda: shards.samples == 80)
+    finally:
+        shards.stop()
@@ -0,0 +1,61 @@
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from regime_forest import RegimeForest
+from shared_forest import SharedModelHost, SharedModelReader, as_compiled, map_forest, \
+    write_forest
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(1000, 9))
+    X[:, 4:7] = rng.integers(0, 2, (1000, 3))
+    return X
+
+
+def forest(data, seed=0):
+    return IsolationForest(n_estimators=20, contamination=0.01, random_state=seed).fit(data)
+
+
+def test_mapped_forest_scores_like_sklearn(data, tmp_path):
+    model = forest(data)
+    path = str(tmp_path / "forest.bin")
+    write_forest(as_compiled(model), path)
+    mapped = map_forest(path)
+    np.testing.assert_array_equal(mapped.decision_function(data), model.decision_function(data))
+    assert not mapped.threshold.flags.writeable  # A view into the read-only mapping
+    assert mapped.contamination == 0.01
+
+
+def test_mapped_regime_forest(data, tmp_path):
+    members = [forest(data, seed) for seed in range(3)]
+    model = RegimeForest(members, np.array([0, 1, 2, 2, 2, 2, 2, 1]), [4, 5, 6])
+    path = str(tmp_path / "regimes.bin")
+    write_forest(model.compiled(), path)
+    np.testing.assert_array_equal(map_forest(path).decision_function(data),
+                                  model.decision_function(data))
+
+
+def test_generation_swap(data, tmp_path):
+    host = SharedModelHost(mp.get_context("spawn"), directory=str(tmp_path))
+    first, second = forest(data, 0), forest(data, 1)
+    host.publish(first)
+    reader = SharedModelReader(host.generation, host.prefix)
+    np.testing.assert_array_equal(reader.current().decision_function(data),
+                                  first.decision_function(data))
+    old = reader.current()
+
+    host.publish(second)
+    assert not os.path.exists(host.path(1))  # Superseded file unlinked...
+    np.testing.assert_array_equal(old.decision_function(data),  # ...mapping still valid
+                                  first.decision_function(data))
+    np.testing.assert_array_equal(reader.current().decision_function(data),
+                                  second.decision_function(data))
+    assert reader.loaded == 2
+    host.close()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from streaming_detector import CHANNELS, StreamingDetector
+
+FEATURES = CHANNELS + ['phase', 'valve_opening', 'safety_trip']
+
+
+def batch(n, regime=(0, 0, 0), seed=0, shift=0.0):
+    rng = np.random.default_rng(seed)
+    analog = rng.normal([10, 3, 40, 5], [0.5, 0.2, 1.0, 0.3], size=(n, 4))
+    analog[:, 1] += shift
+    return np.hstack([analog, np.tile(regime, (n, 1))]).astype(np.float64)
+
+
+def warm_up(detector, regime=(0, 0, 0)):
+    for i in range(0, detector.warmup, 50):
+        detector.decision_function(batch(50, regime, seed=i))
+
+
+def test_cold_regime_scores_normal_then_detects():
+    detector = StreamingDetector(FEATURES, warmup=200)
+    spikes = batch(5, shift=5.0, seed=99)
+    assert (detector.decision_function(spikes) == 1.0).all()  # Still warming up
+    warm_up(detector)
+    assert detector.warm_baselines() == 1
+    assert (detector.decision_function(batch(5, shift=5.0, seed=100)) < 0).all()
+    assert (detector.decision_function(batch(50, seed=101)) >= 0).mean() > 0.95
+
+
+def test_both_mode_keeps_forest_verdicts_while_warming_up():
+    detector = StreamingDetector(FEATURES, warmup=200)
+    forest = np.array([-0.2, 0.1, -0.05])
+    # Cold: forest anomalies pass through unchanged
+    np.testing.assert_array_equal(detector.confirm(forest, batch(3, seed=1)), forest)
+
+    # Warm regime: only anomalies both detectors agree on remain
+    warm_up(detector)
+    normal = detector.confirm(np.full(3, -0.2), batch(3, seed=2))
+    assert (normal >= 0).all()
+    spikes = detector.confirm(np.full(3, -0.2), batch(3, shift=5.0, seed=3))
+    assert (spikes < 0).all()
+
+    # A rare regime that never warms up still gets the forest's verdict
+    rare = detector.confirm(np.full(3, -0.3), batch(3, regime=(1, 1, 1), seed=4))
+    np.testing.assert_array_equal(rare, np.full(3, -0.3))
+
+
+def test_anomalies_are_not_learned():
+    detector = StreamingDetector(FEATURES, warmup=200)
+    warm_up(detector)
+    learned = detector.count.copy()
+    center = detector.center.copy()
+    for i in range(20):
+        assert (detector.decision_function(batch(50, shift=5.0, seed=1000 + i)) < 0).all()
+    np.testing.assert_array_equal(detector.count, learned)
+    np.testing.assert_array_equal(detector.center, center)
+
+    # Forest-flagged rows are not learned during warm-up either
+    cold = StreamingDetector(FEATURES, warmup=200)
+    cold.confirm(np.array([-1.0, 1.0]), batch(2, seed=5))
+    assert cold.count.sum() == 1
+
+
+def test_checkpoint_thread_and_restore(tmp_path):
+    path = str(tmp_path / "state.npz")
+    detector = StreamingDetector(FEATURES, warmup=200, state_path=path,
+                                 checkpoint_interval=0.05)
+    warm_up(detector)
+    detector.start()
+    try:
+        for _ in range(100):
+            if detector.checkpoints:
+                break
+            detector._stop.wait(0.05)
+    finally:
+        detector.stop()
+    assert detector.checkpoints >= 1
+
+    restored = StreamingDetector(FEATURES, warmup=200, state_path=path)
+    assert restored.restore()
+    np.testing.assert_array_equal(restored.count, detector.count)
+    np.testing.assert_allclose(restored.center, detector.center)
+
+
+def test_restore_rejects_other_layout(tmp_path):
+    path = str(tmp_path / "state.npz")
+    detector = StreamingDetector(FEATURES, state_path=path)
+    assert detector.checkpoint()
+    other = StreamingDetector(FEATURES, channels=['flow_rate'], state_path=path)
+    assert not other.restore()
@@ -0,0 +1,78 @@
+import logging
+import types
+
+import pytest
+
+import structured_logging
+from structured_logging import EventThrottle
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(structured_logging, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def logger():
+    log = logging.getLogger("ics.test_throttle")
+    log.propagate = False
+    handler = Records()
+    log.addHandler(handler)
+    yield log, handler.records
+    log.removeHandler(handler)
+
+
+def test_burst_then_summary(clock, logger):
+    log, records = logger
+    throttle = EventThrottle(log, "anomaly", burst=3, interval=10.0)
+
+    logged = [throttle.emit("Anomaly", key=f"pump-{i % 2}", score=-0.1) for i in range(10)]
+    assert logged == [True] * 3 + [False] * 7
+    assert (throttle.logged, throttle.suppressed) == (3, 7)
+    assert [r.fields["event"] for r in records] == ["anomaly"] * 3
+    assert records[0].fields["score"] == -0.1
+
+    # Nothing is summarized before the window ends...
+    throttle.flush()
+    assert len(records) == 3
+
+    # ...then one summary line with the suppressed count per key
+    clock[0] += 10.0
+    throttle.flush()
+    summary = records[-1].fields
+    assert summary["event"] == "anomaly_suppressed"
+    assert summary["suppressed"] == 7
+    assert summary["by_key"] == {"pump-0": 3, "pump-1": 4}
+
+
+def test_new_window_resets_burst(clock, logger):
+    log, records = logger
+    throttle = EventThrottle(log, "invalid_payload", burst=1, interval=5.0)
+    assert throttle.emit("Invalid") and not throttle.emit("Invalid")
+
+    clock[0] += 5.0
+    assert throttle.emit("Invalid")  # Logs the previous window's summary first
+    assert [r.fields["event"] for r in records] == \
+        ["invalid_payload", "invalid_payload_suppressed", "invalid_payload"]
+    assert "by_key" not in records[1].fields  # Events without a key
+
+
+def test_forced_flush(clock, logger):
+    log, records = logger
+    throttle = EventThrottle(log, "anomaly", burst=0, interval=60.0)
+    throttle.emit("Anomaly", key="pump-1")
+    throttle.flush(force=True)
+    assert records[-1].fields["suppressed"] == 1
+    throttle.flush(force=True)  # Nothing left to summarize
+    assert len(records) == 1
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+import telemetry_binary as tb
+
+RECORD = {'flow_rate': 12.5, 'pressure': 3.25, 'temperature': 41.0, 'motor_current': 2.5,
+          'phase': 1, 'valve_opening': 0, 'safety_trip': 0, 'a_high': 1, 'b_low': 0}
+
+
+def test_encode_decode():
+    payload = tb.encode(RECORD, device=7, ts=1234.5)
+    assert len(payload) == tb.RECORD.size
+    assert tb.is_binary(payload) and not tb.is_frame(payload)
+    assert tb.decode(payload) == {'device_id': 7, 'timestamp': 1234.5, **RECORD}
+
+
+def test_missing_fields_are_omitted():
+    decoded = tb.decode(tb.encode({'flow_rate': 1.0, 'phase': 0}, ts=1.0))
+    assert decoded == {'device_id': 0, 'timestamp': 1.0, 'flow_rate': 1.0, 'phase': 0}
+
+
+def test_invalid_payloads():
+    with pytest.raises(ValueError):
+        tb.decode(b'\xb1\x01short')
+    payload = bytearray(tb.encode(RECORD, ts=1.0))
+    payload[1] = 9  # Unknown version
+    with pytest.raises(ValueError):
+        tb.decode(bytes(payload))
+
+
+def test_to_record_accepts_both_formats():
+    assert tb.to_record(json.dumps(RECORD).encode()) == RECORD
+    assert tb.to_record(tb.encode(RECORD, ts=2.0))['flow_rate'] == 12.5
+
+
+def test_frame_round_trip():
+    encoded = [tb.encode({**RECORD, 'flow_rate': float(i)}, device=i, ts=float(i))
+               for i in range(5)]
+    frame = tb.encode_frame(encoded)
+    assert tb.is_frame(frame)
+
+    array = tb.decode_frame(frame)
+    np.testing.assert_array_equal(array['device'], np.arange(5))
+    np.testing.assert_array_equal(array['analog'][:, 0], np.arange(5))
+    assert tb.frame_from_array(array) == frame
+
+    records = tb.to_records(frame)
+    assert [r['device_id'] for r in records] == list(range(5))
+    assert records[3] == tb.decode(encoded[3])
+
+    with pytest.raises(ValueError):
+        tb.decode_frame(frame[:-1])  # Truncated body
+
+
+def test_device_number():
+    assert tb.device_number('pump-007') == 7
+    assert tb.device_number(None) == 0
+    assert 0 <= tb.device_number('no-digits') <= 0xFFFF
+
+
+def test_device_registry_rejects_collisions(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text('{"tank-007": 1007}')
+    registry = tb.DeviceRegistry.load(str(path))
+    assert registry.number('pump-007') == 7
+    assert registry.number('tank-007') == 1007
+    assert registry.number(7) == registry.number('7') == 7  # Binary device numbers
+    with pytest.raises(ValueError):
+        registry.number('valve-007')  # Would silently share pump-007's state
+    with pytest.raises(ValueError):
+        registry.assign('valve-007', 1007)
+    assert registry.assign('valve-007', 2007) == registry.number('valve-007') == 2007
+    with pytest.raises(ValueError):
+        registry.number(70000)
+    assert tb.DeviceRegistry.load(str(tmp_path / "absent.json")).number('pump-3') == 3
@@ -0,0 +1,64 @@
+import json
+import types
+
+import pytest
+
+import telemetry_binary as tb
+import telemetry_bridge
+from telemetry_bridge import FrameAggregator, TelemetryBridge, to_binary
+
+SYSTEM_CA = "/etc/ssl/certs/ca-certificates.crt"
+
+
+def test_json_and_binary_become_records():
+    record = tb.decode(to_binary(json.dumps({
+        "device_id": "pump-007", "timestamp": 12.5, "flow_rate": 3.0, "phase": 1}).encode()))
+    assert record['timestamp'] == 12.5
+    assert record['flow_rate'] == 3.0 and record['phase'] == 1
+
+    binary = tb.encode({'pressure': 2.0}, device=4, ts=1.0)
+    assert to_binary(binary) == binary
+
+
+@pytest.mark.parametrize("payload", [
+    b'{"phase": -1}',
+    b'{"valve_opening": 300}',
+    b'{"flow_rate": {"a": 1}}',
+    b'{"pressure": "high"}',
+    b'[1, 2]',
+    b'not json',
+    b'\xb1\x01truncated',
+])
+def test_bad_payloads_are_rejected(payload):
+    with pytest.raises(ValueError):
+        to_binary(payload)
+
+
+def test_bridge_counts_rejected_payloads(monkeypatch):
+    monkeypatch.setattr(telemetry_bridge, "CA_CERT", SYSTEM_CA)
+    bridge = TelemetryBridge(max_samples=2)
+    frames = []
+    bridge.aggregator.publish_fn = frames.append
+
+    def message(payload):
+        return types.SimpleNamespace(topic=telemetry_bridge.TOPIC, payload=payload)
+
+    # Must not raise: paho re-raises callback errors and would stop the loop
+    bridge.on_message(bridge.client, None, message(b'{"phase": -1}'))
+    bridge.on_message(bridge.client, None, message(b'{"valve_opening": 300}'))
+    assert bridge.invalid == 2
+    bridge.on_message(bridge.client, None, message(b'{"flow_rate": 1.0}'))
+    bridge.on_message(bridge.client, None, message(b'{"flow_rate": 2.0}'))
+    assert len(frames) == 1 and len(tb.decode_frame(frames[0])) == 2
+
+
+def test_aggregator_flushes_on_size_and_age():
+    frames = []
+    aggregator = FrameAggregator(frames.append, max_samples=3, max_delay=60.0)
+    for i in range(4):
+        aggregator.add(tb.encode({'flow_rate': float(i)}, ts=float(i)))
+    assert len(frames) == 1  # Size
+    aggregator.flush(max_age=60.0)
+    assert len(frames) == 1  # Not old enough
+    aggregator.flush()
+    assert [len(tb.decode_frame(f)) for f in frames] == [3, 1]
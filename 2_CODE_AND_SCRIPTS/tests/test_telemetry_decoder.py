@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+import telemetry_binary as tb
+from sharded_inference import make_payloads
+from telemetry_decoder import TelemetryDecoder, available_backends
+
+FIELDS = ['flow_rate', 'pressure', 'temperature', 'motor_current',
+          'phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
+
+backends = pytest.mark.parametrize("backend", available_backends())
+
+
+def reference_row(payload):
+    """What the node computed before the decoder: json.loads + .get"""
+    data = json.loads(payload)
+    return [float(data.get(name) or 0) for name in FIELDS]
+
+
+@backends
+def test_parity_with_json(backend):
+    decoder = TelemetryDecoder(FIELDS, backend=backend)
+    payloads = make_payloads(200, devices=4) + [
+        b'{"device_id": "pump-1", "flow_rate": null, "phase": "1"}',  # Typed-path fallback
+        b'{"flow_rate": 3, "unknown": {"nested": [1, 2]}}',           # Unknown keys skipped
+        b'{}',
+    ]
+    row = np.empty(len(FIELDS))
+    for payload in payloads:
+        record = decoder.decode_into(payload, row)
+        assert list(row) == reference_row(payload)
+        assert record.get('device_id') == json.loads(payload).get('device_id')
+
+
+@backends
+def test_binary_records(backend):
+    decoder = TelemetryDecoder(FIELDS, backend=backend)
+    row = np.zeros(len(FIELDS))
+    record = decoder.decode_into(tb.encode({'flow_rate': 2.5, 'phase': 1}, device=3, ts=1.0),
+                                 row)
+    assert record.get('device_id') == 3
+    assert row[0] == 2.5 and row[4] == 1
+
+
+@backends
+@pytest.mark.parametrize("payload", [
+    b'{"device_id": "pump-000", "flow_rate": {"a": 1}}',
+    b'{"device_id": "pump-000", "pressure": [1, 2]}',
+    b'{"flow_rate": "high"}',
+    b'{"flow_rate": 1',
+    b'[1, 2, 3]',
+    b'not json',
+    b'',
+])
+def test_malformed_payloads_raise_value_error(backend, payload):
+    decoder = TelemetryDecoder(FIELDS, backend=backend)
+    with pytest.raises(ValueError):
+        decoder.decode_into(payload, np.empty(len(FIELDS)))
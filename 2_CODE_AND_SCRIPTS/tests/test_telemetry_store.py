@@ -0,0 +1,105 @@
+import errno
+import os
+
+import numpy as np
+import pytest
+
+import telemetry_store
+from telemetry_store import PARTITION_SECONDS, TelemetryStore
+
+T0 = 1_700_000_000 - 1_700_000_000 % PARTITION_SECONDS
+
+
+def records(n, offset=0):
+    return [{'flow_rate': float(offset + i), 'phase': (offset + i) % 2,
+             'device_id': f"pump-{(offset + i) % 3}"} for i in range(n)]
+
+
+def column_rows(store):
+    """Row count of every column file in every partition"""
+    return {name: os.path.getsize(os.path.join(path, f"{name}.bin")) // dtype.itemsize
+            for _, path in store.partitions()
+            for name, dtype in store.dtypes.items()}
+
+
+def test_round_trip(tmp_path):
+    store = TelemetryStore(tmp_path)
+    ts = T0 + np.arange(0, 2 * PARTITION_SECONDS, 60.0)  # Two partitions
+    assert store.append(ts, records(len(ts))) == len(ts)
+
+    data = store.read()
+    np.testing.assert_array_equal(data['ts'], ts)
+    np.testing.assert_array_equal(data['flow_rate'], np.arange(len(ts)))
+    assert np.isnan(data['pressure']).all()
+    assert (data['safety_trip'] == telemetry_store.MISSING_INT).all()
+    assert len(store.partitions()) == 2
+
+    # Range cut inside both partitions, column subset, per-partition iteration
+    start, end = T0 + 1800, T0 + PARTITION_SECONDS + 1800
+    part = store.read(start, end, ['ts', 'phase'])
+    assert set(part) == {'ts', 'phase'}
+    assert ((part['ts'] >= start) & (part['ts'] < end)).all()
+    chunks = list(store.iter_read(start, end, ['ts']))
+    assert len(chunks) == 2
+    np.testing.assert_array_equal(np.concatenate([c['ts'] for c in chunks]), part['ts'])
+
+    df = store.read_frame(columns=['device_id', 'safety_trip'])
+    assert df['device_id'].iloc[1] == "pump-1"
+    assert df['safety_trip'].isna().all()
+
+
+def test_unknown_column(tmp_path):
+    with pytest.raises(ValueError):
+        TelemetryStore(tmp_path).read(columns=['nope'])
+
+
+def test_failed_append_rolls_back(tmp_path, monkeypatch):
+    store = TelemetryStore(tmp_path)
+    store.append(T0 + np.arange(5.0), records(5))
+
+    # Fail on the third column file of the next batch
+    real_open, opened = open, []
+
+    def failing_open(path, mode='r', *args, **kwargs):
+        if mode == 'ab':
+            opened.append(path)
+            if len(opened) == 3:
+                raise OSError(errno.ENOSPC, "No space left on device")
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(telemetry_store, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        store.append(T0 + 5 + np.arange(5.0), records(5, offset=5))
+    assert set(column_rows(store).values()) == {5}
+
+    # The retry lands exactly once in every column
+    monkeypatch.undo()
+    store.append(T0 + 5 + np.arange(5.0), records(5, offset=5))
+    assert set(column_rows(store).values()) == {10}
+    np.testing.assert_array_equal(store.read()['flow_rate'], np.arange(10))
+
+
+def test_torn_partition_is_repaired(tmp_path):
+    store = TelemetryStore(tmp_path)
+    store.append(T0 + np.arange(4.0), records(4))
+    _, path = store.partitions()[0]
+    with open(os.path.join(path, "flow_rate.bin"), 'ab') as f:
+        f.write(np.float32(99).tobytes())  # Torn append: one extra row in one column
+
+    reopened = TelemetryStore(tmp_path)
+    assert len(reopened.read()['ts']) == 4
+    reopened.append(T0 + 4 + np.arange(2.0), records(2, offset=4))
+    assert set(column_rows(reopened).values()) == {6}
+    np.testing.assert_array_equal(reopened.read()['flow_rate'], np.arange(6))
+
+
+def test_partition_without_added_column(tmp_path):
+    store = TelemetryStore(tmp_path)
+    store.append(T0 + np.arange(3.0), records(3))
+    _, path = store.partitions()[0]
+    os.remove(os.path.join(path, "device_id.bin"))  # Written before device_id existed
+
+    reopened = TelemetryStore(tmp_path)
+    assert list(reopened.read()['device_id']) == [b''] * 3
+    reopened.append(T0 + 3 + np.arange(2.0), records(2, offset=3))
+    assert list(reopened.read()['device_id']) == [b''] * 3 + [b'pump-0', b'pump-1']
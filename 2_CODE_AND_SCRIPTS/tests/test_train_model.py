@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from telemetry_decoder import TelemetryDecoder
+from telemetry_store import TelemetryStore
+from train_model import FEATURES, Reservoir, StreamingStats, default_data_path, \
+    fill_missing, iter_chunks, load_data, prepare_training_data, stream_training_data
+
+RECORDS = [
+    {'flow_rate': 12.5, 'pressure': 3.0, 'temperature': 40.0, 'motor_current': 2.0,
+     'phase': 1, 'valve_opening': 1, 'safety_trip': 0, 'a_high': 0, 'b_low': 1},
+    {'flow_rate': 11.0, 'temperature': None, 'motor_current': 2.1,
+     'phase': 2, 'valve_opening': 0, 'safety_trip': 0},  # pressure, flags absent
+]
+
+
+def write_csv(path):
+    pd.DataFrame({'timestamp': ['2026-01-01T00:00:00', '2026-01-01T00:00:01'],
+                  'topic': 'ics/telemetry/data',
+                  'data': [json.dumps(r) for r in RECORDS]}).to_csv(path, index=False)
+
+
+def live_rows():
+    decoder = TelemetryDecoder(FEATURES)
+    rows = np.empty((len(RECORDS), len(FEATURES)))
+    for i, record in enumerate(RECORDS):
+        decoder.decode_into(json.dumps(record).encode(), rows[i])
+    return rows
+
+
+def test_missing_values_match_live_scoring(tmp_path):
+    path = tmp_path / "security_logs.csv"
+    write_csv(path)
+    expected = live_rows()
+    assert expected[1, FEATURES.index('pressure')] == 0.0
+
+    df = load_data(str(path))
+    df[FEATURES] = fill_missing(df[FEATURES].to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(prepare_training_data(df).to_numpy(), expected)
+
+    X, _, _, _ = next(iter_chunks(str(path), chunk_rows=10))
+    np.testing.assert_array_equal(X, expected)
+
+    store = TelemetryStore(str(tmp_path / "store"))
+    store.append([1.7e9, 1.7e9 + 1], RECORDS)
+    X, _, _, _ = next(iter_chunks(str(tmp_path / "store"), chunk_rows=10))
+    np.testing.assert_allclose(X, expected, rtol=1e-6)  # The store keeps float32
+
+
+def test_default_data_falls_back_to_csv(tmp_path, capsys):
+    store_dir, csv_path = str(tmp_path / "store"), str(tmp_path / "security_logs.csv")
+    assert default_data_path(store_dir, csv_path) == csv_path
+    assert "empty" in capsys.readouterr().out
+
+    TelemetryStore(store_dir).append([1.7e9], RECORDS[:1])
+    assert default_data_path(store_dir, csv_path) == store_dir
+    assert store_dir in capsys.readouterr().out
+
+
+def test_streaming_stats_match_numpy():
+    rng = np.random.default_rng(1)
+    X = rng.normal(5.0, 2.0, size=(1000, 3))
+    X[rng.random(X.shape) < 0.1] = np.nan
+    stats = StreamingStats(3)
+    for chunk in np.array_split(X, 7):
+        stats.update(chunk)
+    np.testing.assert_allclose(stats.mean, np.nanmean(X, axis=0))
+    np.testing.assert_allclose(stats.std(), np.nanstd(X, axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.min, np.nanmin(X, axis=0))
+    np.testing.assert_array_equal(stats.count, (~np.isnan(X)).sum(axis=0))
+
+
+def test_reservoir_is_bounded_and_uniform():
+    reservoir = Reservoir(100, 1, seed=0)
+    for start in range(0, 10000, 700):
+        reservoir.add(np.arange(start, min(start + 700, 10000), dtype=float)[:, None])
+    sample = reservoir.sample()[:, 0]
+    assert reservoir.seen == 10000 and len(sample) == 100
+    assert len(set(sample)) == 100
+    assert 3000 < sample.mean() < 7000  # Not just the first or last rows
+
+
+def test_stream_mode_trains_on_normal_rows_only(tmp_path):
+    path = tmp_path / "flat.csv"
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(rng.normal(size=(500, len(FEATURES))), columns=FEATURES)
+    df['is_anomaly'] = (np.arange(500) % 10 == 0).astype(int)
+    df.loc[df['is_anomaly'] == 1, 'flow_rate'] = 1000.0
+    df.to_csv(path, index=False)
+
+    X, stats = stream_training_data(str(path), sample_size=1000, chunk_rows=64)
+    assert len(X) == 450 and list(X.columns) == FEATURES
+    assert X['flow_rate'].max() < 1000.0
+    assert stats.count[0] == 450
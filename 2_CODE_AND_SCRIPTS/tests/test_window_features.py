@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import telemetry_binary as tb
+from window_features import DEFAULT_DEVICE, TelemetryFeatures, WindowFeatureEngine, \
+    device_key
+from train_model import device_keys
+
+FIELDS = ['flow_rate', 'pressure', 'temperature', 'motor_current']
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(tb, "_registry", tb.DeviceRegistry())
+
+
+def test_device_key_is_the_same_for_every_form():
+    forms = ['pump-007', 7, '7', b'pump-007', b'7', 7.0]
+    assert {device_key(form) for form in forms} == {7}
+    for missing in [None, '', b'', float('nan')]:
+        assert device_key(missing) == DEFAULT_DEVICE == tb.device_number(None)
+    with pytest.raises(ValueError):
+        device_key('tank-007')  # Collides with pump-007
+
+
+def test_training_keys_match_live_keys():
+    keys = device_keys(['pump-001', b'pump-002', '1', None, np.nan])
+    assert list(keys) == [1, 2, 1, DEFAULT_DEVICE, DEFAULT_DEVICE]
+
+
+def test_json_and_frame_samples_share_one_window():
+    features = TelemetryFeatures(FIELDS, WindowFeatureEngine(windows=(4,), lags=(1,)))
+    first = features.new_row()
+    first[:4] = [1.0, 2.0, 3.0, 4.0]
+    features.fill_window({'device_id': 'pump-005'}, first, 1.0)
+
+    # The same device, now as a binary frame carrying its device number
+    X = features.new_rows(1)
+    X[0, :4] = [3.0, 2.0, 3.0, 4.0]
+    features.fill_window_rows([5], X, [2.0])
+    assert list(features.engine.devices) == [5]
+    names = features.names()
+    assert X[0, names.index('flow_rate_delta')] == 2.0
+    assert X[0, names.index('flow_rate_lag1')] == 1.0
+
+
+def test_rolling_features_match_pandas():
+    rng = np.random.default_rng(0)
+    X = rng.normal(10.0, 3.0, size=(300, 4))
+    ts = np.arange(300) * 0.5
+    engine = WindowFeatureEngine(windows=(5, 20), lags=(1, 3))
+    out = pd.DataFrame(engine.transform(X, ts), columns=engine.feature_names())
+    df = pd.DataFrame(X, columns=FIELDS)
+    for w in (5, 20):
+        rolling = df.rolling(w, min_periods=1)
+        for c in FIELDS:
+            np.testing.assert_allclose(out[f"{c}_mean_{w}"], rolling[c].mean(), atol=1e-9)
+            np.testing.assert_allclose(out[f"{c}_std_{w}"], rolling[c].std(ddof=0), atol=1e-6)
+    delta = df['flow_rate'].diff().fillna(0.0)
+    np.testing.assert_allclose(out['flow_rate_delta'], delta)
+    np.testing.assert_allclose(out['flow_rate_rate'][1:], delta[1:] / 0.5)
+    np.testing.assert_allclose(out['flow_rate_lag3'][3:], df['flow_rate'].shift(3)[3:])
+
+
+def test_devices_keep_separate_windows():
+    engine = WindowFeatureEngine(windows=(3,), lags=(1,))
+    names = engine.feature_names()
+    engine.update(1, [1.0, 0, 0, 0])
+    engine.update(2, [100.0, 0, 0, 0])
+    out = engine.update(1, [3.0, 0, 0, 0])
+    assert out[names.index('flow_rate_mean_3')] == 2.0
+    assert out[names.index('flow_rate_lag1')] == 1.0
+    engine.reset(1)
+    assert list(engine.devices) == [2]
+
+
+def test_gap_holds_last_reading():
+    engine = WindowFeatureEngine(windows=(2,), lags=(1,))
+    names = engine.feature_names()
+    engine.update(1, [4.0, 1.0, 1.0, 1.0])
+    out = engine.update(1, [np.nan, 1.0, 1.0, 1.0])
+    assert out[names.index('flow_rate_mean_2')] == 4.0
+    assert not np.isnan(out).any()
+
+
+def test_config_round_trip():
+    engine = WindowFeatureEngine(windows=(10, 60), lags=(1, 2))
+    clone = WindowFeatureEngine.from_config(engine.config())
+    assert clone.config() == engine.config()
+    assert clone.feature_names() == engine.feature_names()
+    assert TelemetryFeatures(FIELDS, clone).n_features == len(FIELDS) + engine.n_features
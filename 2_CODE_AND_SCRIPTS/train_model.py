@@ -3,16 +3,40 @@
 ICS AI Model Training Script
 Trains an Isolation Forest model on collected telemetry data for anomaly detection.
 
-Usage: python3 train_model.py [--data /path/to/data.csv] [--output /path/to/model.pkl]
+Usage: python3 train_model.py [--data /path/to/store_or.csv] [--output /path/to/model.pkl]
+                              [--start ISO_TIME] [--end ISO_TIME]
+       python3 train_model.py --stream [--sample-size 100000] [--chunk-rows 50000]
+       python3 train_model.py --windows 10,60 [--lags 1]
+       python3 train_model.py --regimes [--regime-estimators 25] [--min-regime-rows 200]
+
+Streaming mode (--stream) makes one chunked pass over the data, keeping a
+uniform reservoir sample of normal rows plus running per-feature statistics,
+so peak memory is bounded by --sample-size rather than by history length.
+
+Without --data, the telemetry store is used if it holds any data, else
+security_logs.csv (the script says which). Missing or null telemetry
+values are filled with MISSING_VALUE (0), exactly as the AI node's decoders
+fill them live, before window features are computed.
+
+--windows adds per-device rolling mean/std, delta, rate and lag features
+(window_features.py) computed in time order before normal rows are selected;
+the AI node rebuilds the same features live from the model metadata.
+
+--regimes trains one small forest per operating regime (phase x
+valve_opening x safety_trip, regime_forest.py) instead of one large forest,
+plus a global fallback for regimes with too few rows. The node routes each
+sample to its regime's forest with a table lookup.
 
 The script will:
-1. Load telemetry data from security_logs.csv
+1. Load telemetry data from the columnar telemetry store (or a security_logs.csv)
 2. Extract normal operation data for training
 3. Train an Isolation Forest model
 4. Save the model as a .pkl file for deployment
+5. Export a compiled, sklearn-free copy of the forest as a .npz file
 """
 
 import argparse
+import ast
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
@@ -20,47 +44,295 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import joblib
+import json
 import os
+import time
 from datetime import datetime
 
+from compiled_forest import export_forest
+from regime_forest import (RegimeForest, REGIME_KEYS, REGIME_LEVELS, REGIME_ESTIMATORS,
+                           MIN_REGIME_ROWS, regime_codes, regime_name)
+from window_features import WindowFeatureEngine, DEVICE_KEY, device_key
+
 # Configuration
 FEATURES = ['flow_rate', 'pressure', 'temperature', 'motor_current',
             'phase', 'valve_opening', 'safety_trip', 'a_high', 'b_low']
 CONTAMINATION = 0.01  # Expect ~1% anomalies in production
+N_ESTIMATORS = 100
+STORE_DIR = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/telemetry_store"
+CSV_PATH = "/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv"
+MISSING_VALUE = 0.0  # Missing/null telemetry, as telemetry_decoder.py scores it live
+
+# Parsed column dtypes; keys missing from a record default to 0
+COLUMN_DTYPES = {
+    'flow_rate': np.float64,
+    'pressure': np.float64,
+    'temperature': np.float64,
+    'motor_current': np.float64,
+    'phase': np.int8,
+    'valve_opening': np.int8,
+    'safety_trip': np.int8,
+    'a_high': np.int8,
+    'b_low': np.int8,
+    'is_anomaly': np.int8,
+}
+
+def parse_record(text):
+    """Decode one `data` cell without eval: JSON, then Python-literal fallback"""
+    if isinstance(text, dict):
+        return text
+    if not isinstance(text, str):
+        return {}
+    try:
+        record = json.loads(text)
+    except ValueError:
+        try:
+            record = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return {}
+    return record if isinstance(record, dict) else {}
+
+def parse_records(cells):
+    """Decode a whole `data` column, in a single JSON parse when possible"""
+    try:
+        records = json.loads('[' + ','.join(cells) + ']')
+        if len(records) == len(cells) and all(isinstance(r, dict) for r in records):
+            return records
+    except (TypeError, ValueError):
+        pass
+    return [parse_record(cell) for cell in cells]
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def device_keys(values):
+    """Window-engine device keys (window_features.device_key, as the AI node uses)"""
+    return np.array([device_key(value) for value in values], dtype=object)
+
+def build_columns(records):
+    """Build every COLUMN_DTYPES column (and device IDs) from decoded records in one pass"""
+    names = list(COLUMN_DTYPES)
+    rows = [tuple(record.get(name, 0) for name in names) for record in records]
+    try:
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+    except (TypeError, ValueError):
+        # Some value is null or non-numeric: coerce cell by cell
+        matrix = np.array([[_to_number(v) for v in row] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(names))
+    columns = {name: matrix[:, i].astype(COLUMN_DTYPES[name])
+               for i, name in enumerate(names)}
+    columns[DEVICE_KEY] = device_keys(record.get(DEVICE_KEY) for record in records)
+    return columns
+
+def default_data_path(store_dir=STORE_DIR, csv_path=CSV_PATH):
+    """The telemetry store if it holds any data, else the legacy CSV"""
+    from telemetry_store import TelemetryStore
+    
+    if TelemetryStore(store_dir).partitions():
+        print(f"No --data given: training on the telemetry store {store_dir}")
+        return store_dir
+    print(f"No --data given and the telemetry store {store_dir} is empty: "
+          f"training on {csv_path}")
+    return csv_path
+
+def fill_missing(X):
+    """Replace NaN (missing/null) feature values with MISSING_VALUE, in place"""
+    X[np.isnan(X)] = MISSING_VALUE
+    return X
 
 def load_data(data_path):
     """Load and preprocess telemetry data"""
     print(f"Loading data from {data_path}...")
-    df = pd.read_csv(data_path)
+    start = time.perf_counter()
+    df = pd.read_csv(data_path, dtype={'data': str})
     
-    # Parse the data column
-    try:
-        df['parsed_data'] = df['data'].apply(lambda x: eval(x) if isinstance(x, str) else x)
-        df['flow_rate'] = df['parsed_data'].apply(lambda x: x.get('flow_rate', 0))
-        df['pressure'] = df['parsed_data'].apply(lambda x: x.get('pressure', 0))
-        df['temperature'] = df['parsed_data'].apply(lambda x: x.get('temperature', 0))
-        df['motor_current'] = df['parsed_data'].apply(lambda x: x.get('motor_current', 0))
-        df['phase'] = df['parsed_data'].apply(lambda x: x.get('phase', 0))
-        df['valve_opening'] = df['parsed_data'].apply(lambda x: x.get('valve_opening', 0))
-        df['safety_trip'] = df['parsed_data'].apply(lambda x: x.get('safety_trip', 0))
-        df['a_high'] = df['parsed_data'].apply(lambda x: x.get('a_high', 0))
-        df['b_low'] = df['parsed_data'].apply(lambda x: x.get('b_low', 0))
-    except Exception as e:
-        print(f"Error parsing data: {e}")
-        # Try alternative parsing
-        df = pd.DataFrame(df['data'].apply(eval).tolist())
+    if 'data' not in df.columns:
+        # Already flat (e.g. collect_data.py output)
+        return df
+    
+    # Parse the data column once, then fan out into typed feature columns
+    cells = df['data'].fillna('{}').tolist()
+    columns = build_columns(parse_records(cells))
+    df = df.drop(columns=['data']).assign(**columns)
+    
+    elapsed = time.perf_counter() - start
+    rate = len(df) / elapsed if elapsed > 0 else float('inf')
+    print(f"Parsed {len(df)} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
     
     return df
 
-def prepare_training_data(df):
+def load_store(store_dir, start=None, end=None):
+    """Load FEATURES (and labels) for a time range from the columnar store"""
+    from telemetry_store import TelemetryStore
+    
+    print(f"Loading data from store {store_dir}...")
+    start = datetime.fromisoformat(start) if start else None
+    end = datetime.fromisoformat(end) if end else None
+    return TelemetryStore(store_dir).read_frame(start, end, ['ts'] + FEATURES +
+                                                ['is_anomaly', DEVICE_KEY])
+
+class StreamingStats:
+    """Running per-feature count/mean/variance/min/max (Chan et al. merge), NaN-aware"""
+    
+    def __init__(self, n_features):
+        self.count = np.zeros(n_features)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+    
+    def update(self, X):
+        """Merge the statistics of one chunk (rows x features)"""
+        valid = ~np.isnan(X)
+        n = valid.sum(axis=0)
+        if not n.any():
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunk_mean = np.where(n > 0, np.nansum(X, axis=0) / n, 0.0)
+            chunk_m2 = np.nansum((X - chunk_mean) ** 2, axis=0)
+            total = self.count + n
+            delta = chunk_mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * n / total, 0.0)
+            self.m2 = np.where(total > 0, self.m2 + chunk_m2 + delta ** 2 * self.count * n / total, 0.0)
+        self.count = total
+        self.min = np.fmin(self.min, np.nanmin(np.where(valid, X, np.inf), axis=0))
+        self.max = np.fmax(self.max, np.nanmax(np.where(valid, X, -np.inf), axis=0))
+    
+    def std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(np.where(self.count > 1, self.m2 / (self.count - 1), np.nan))
+    
+    def summary(self, names):
+        """Per-feature statistics as a plain dict (for printing and metadata)"""
+        std = self.std()
+        return {name: {'count': int(self.count[i]),
+                       'mean': float(self.mean[i]) if self.count[i] else None,
+                       'std': float(std[i]) if self.count[i] > 1 else None,
+                       'min': float(self.min[i]) if self.count[i] else None,
+                       'max': float(self.max[i]) if self.count[i] else None}
+                for i, name in enumerate(names)}
+
+class Reservoir:
+    """Fixed-size uniform sample of a row stream (Algorithm R, vectorized per chunk)"""
+    
+    def __init__(self, size, n_features, seed=42):
+        self.size = size
+        self.rows = np.empty((size, n_features))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+    
+    def add(self, X):
+        n = len(X)
+        if n == 0:
+            return
+        # Fill the empty slots first
+        fill = min(max(self.size - self.seen, 0), n)
+        self.rows[self.seen:self.seen + fill] = X[:fill]
+        # Row with global index i survives with probability size / (i + 1)
+        index = np.arange(self.seen + fill, self.seen + n)
+        slots = (self.rng.random(index.size) * (index + 1)).astype(np.int64)
+        keep = slots < self.size
+        self.rows[slots[keep]] = X[fill:][keep]
+        self.seen += n
+    
+    def sample(self):
+        return self.rows[:min(self.seen, self.size)]
+
+def iter_chunks(data_path, chunk_rows, start=None, end=None):
+    """
+    Yield (features, is_anomaly, epoch seconds, device keys) arrays chunk by
+    chunk from a CSV or store
+    """
+    columns = FEATURES + ['is_anomaly']
+    if os.path.isdir(data_path):
+        from telemetry_store import TelemetryStore, MISSING_INT
+        
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) if end else None
+        for chunk in TelemetryStore(data_path).iter_read(start, end,
+                                                         columns + ['ts', DEVICE_KEY]):
+            X = np.column_stack([chunk[name].astype(np.float64) for name in FEATURES])
+            X[np.column_stack([chunk[name] == MISSING_INT if chunk[name].dtype.kind == 'i'
+                               else np.zeros(len(X), bool) for name in FEATURES])] = np.nan
+            yield fill_missing(X), chunk['is_anomaly'], chunk['ts'], \
+                device_keys(chunk[DEVICE_KEY])
+        return
+    
+    for df in pd.read_csv(data_path, dtype={'data': str}, chunksize=chunk_rows):
+        if 'data' in df.columns:
+            parsed = build_columns(parse_records(df['data'].fillna('{}').tolist()))
+        else:
+            parsed = {name: pd.to_numeric(df[name], errors='coerce').to_numpy()
+                      if name in df.columns else np.zeros(len(df)) for name in columns}
+            parsed[DEVICE_KEY] = device_keys(df[DEVICE_KEY] if DEVICE_KEY in df.columns
+                                             else [None] * len(df))
+        X = np.column_stack([np.asarray(parsed[name], dtype=np.float64) for name in FEATURES])
+        yield fill_missing(X), np.asarray(parsed['is_anomaly']), frame_timestamps(df), \
+            parsed[DEVICE_KEY]
+
+def frame_timestamps(df):
+    """Epoch seconds for each row, from a store 'ts' or a CSV 'timestamp' column"""
+    if 'ts' in df.columns:
+        return df['ts'].to_numpy(dtype=np.float64)
+    if 'timestamp' in df.columns:
+        ts = pd.to_datetime(df['timestamp'], errors='coerce', utc=True, format='ISO8601')
+        return (ts - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+    return None
+
+def add_window_features(df, engine):
+    """Append sliding-window feature columns, computed in row (time) order"""
+    print(f"Computing window features (windows {engine.windows}, lags {engine.lags})...")
+    X = df[engine.channels].astype(np.float64).to_numpy()
+    # One window per device, as the AI node keeps them live
+    device_ids = device_keys(df[DEVICE_KEY] if DEVICE_KEY in df.columns else [None] * len(df))
+    window = engine.transform(X, frame_timestamps(df), device_ids)
+    return pd.concat([df.reset_index(drop=True),
+                      pd.DataFrame(window, columns=engine.feature_names())], axis=1)
+
+def stream_training_data(data_path, sample_size, chunk_rows, start=None, end=None,
+                         engine=None):
+    """Single pass: reservoir-sample normal rows and accumulate feature stats"""
+    print(f"Streaming data from {data_path} (chunks of {chunk_rows}, "
+          f"reservoir of {sample_size})...")
+    features = FEATURES + (engine.feature_names() if engine else [])
+    channels = [FEATURES.index(name) for name in engine.channels] if engine else None
+    stats = StreamingStats(len(features))
+    reservoir = Reservoir(sample_size, len(features))
+    total = 0
+    t0 = time.perf_counter()
+    
+    for X, labels, timestamps, devices in iter_chunks(data_path, chunk_rows, start, end):
+        total += len(X)
+        if engine is not None:
+            # Windows see every row, including the ones dropped below, per device
+            X = np.hstack([X, engine.transform(X[:, channels], timestamps, devices)])
+        # Only normal rows are used for training
+        X = X[labels != 1]
+        stats.update(X)
+        reservoir.add(X)
+    
+    elapsed = time.perf_counter() - t0
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"Streamed {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/s), "
+          f"{reservoir.seen} normal")
+    
+    sample = reservoir.sample().copy()
+    print(f"Using {len(sample)} sampled normal rows for training")
+    
+    return pd.DataFrame(sample, columns=features), stats
+
+def prepare_training_data(df, features=FEATURES):
     """Prepare features for training"""
     print("Preparing training data...")
     
     # Extract features
-    X = df[FEATURES].copy()
+    X = df[features].copy()
     
-    # Handle missing values
-    X = X.fillna(X.mean())
+    # Handle missing values the way the live decoders do
+    X = X.fillna(MISSING_VALUE)
     
     # Remove obvious anomalies (is_anomaly = 1) for training
     # We only want to train on normal data
@@ -74,18 +346,22 @@ def prepare_training_data(df):
     
     return X_normal
 
-def train_model(X_train):
-    """Train the Isolation Forest model"""
-    print("Training Isolation Forest model...")
-    
-    # Initialize model
-    model = IsolationForest(
-        n_estimators=100,
+def new_forest(n_estimators):
+    """Untrained Isolation Forest with the deployment settings"""
+    return IsolationForest(
+        n_estimators=n_estimators,
         contamination=CONTAMINATION,
         max_samples='auto',
         random_state=42,
         n_jobs=-1
     )
+
+def train_model(X_train, n_estimators=N_ESTIMATORS):
+    """Train the Isolation Forest model"""
+    print(f"Training Isolation Forest model ({n_estimators} trees)...")
+    
+    # Initialize model
+    model = new_forest(n_estimators)
     
     # Train
     model.fit(X_train)
@@ -97,6 +373,44 @@ def train_model(X_train):
     
     return model
 
+def train_regime_model(X_train, n_estimators=N_ESTIMATORS,
+                       regime_estimators=REGIME_ESTIMATORS, min_rows=MIN_REGIME_ROWS):
+    """Train one small forest per operating regime plus a global fallback"""
+    print(f"Training per-regime Isolation Forests ({regime_estimators} trees each, "
+          f"regimes with >= {min_rows} rows)...")
+    
+    # Fit on plain arrays: the RegimeForest routes and scores ndarrays
+    columns = [list(X_train.columns).index(key) for key in REGIME_KEYS]
+    X = X_train.to_numpy(dtype=np.float64)
+    codes = regime_codes(X[:, columns])
+    
+    models = []
+    table = np.full(int(np.prod(REGIME_LEVELS)), -1)
+    summary = {}
+    for code in range(table.size):
+        rows = int((codes == code).sum())
+        name = regime_name(code)
+        if rows < min_rows:
+            print(f"  {name:<40} {rows:>9} rows -> fallback")
+            continue
+        table[code] = len(models)
+        models.append(new_forest(regime_estimators).fit(X[codes == code]))
+        summary[name] = {'rows': rows, 'n_estimators': regime_estimators}
+        print(f"  {name:<40} {rows:>9} rows")
+    
+    # Regimes without a model (and rows with invalid state flags) use the fallback
+    table[table < 0] = len(models)
+    models.append(new_forest(n_estimators).fit(X))
+    print(f"  {'fallback (all rows)':<40} {len(X):>9} rows, {n_estimators} trees")
+    
+    model = RegimeForest(models, table, columns)
+    train_scores = model.decision_function(X)
+    print(f"Training score range: {train_scores.min():.4f} to {train_scores.max():.4f}")
+    print(f"Mean training score: {train_scores.mean():.4f}")
+    
+    return model, {'keys': REGIME_KEYS, 'min_rows': min_rows, 'models': summary,
+                   'fallback_estimators': n_estimators}
+
 def evaluate_model(model, X_test):
     """Evaluate model performance (if we have labels)"""
     print("\nEvaluating model...")
@@ -112,7 +426,35 @@ def evaluate_model(model, X_test):
     
     return predictions
 
-def save_model(model, output_path):
+def save_compiled_model(model, X_check, output_path):
+    """Export the forest to flat arrays and verify it scores identically"""
+    compiled_path = output_path.replace('.pkl', '.npz')
+    if isinstance(model, RegimeForest):
+        compiled = model.compiled()
+        forests = compiled.models
+    else:
+        compiled = export_forest(model)
+        forests = [compiled]
+    
+    expected = model.decision_function(X_check)
+    actual = compiled.decision_function(np.asarray(X_check, dtype=np.float64))
+    if not np.array_equal(expected, actual):
+        print(f"Warning: compiled forest differs from sklearn "
+              f"(max abs diff {np.abs(expected - actual).max():.3e}); not exported")
+        # A previous run's export would otherwise be loaded in place of this model
+        if os.path.exists(compiled_path):
+            os.remove(compiled_path)
+            print(f"Removed stale {compiled_path}")
+        return None
+    
+    compiled.save(compiled_path)
+    print(f"Compiled model saved to {compiled_path} "
+          f"({sum(forest.feature.size for forest in forests)} nodes, "
+          f"max depth {max(forest.max_depth for forest in forests)})")
+    return compiled_path
+
+def save_model(model, output_path, compiled_path=None, feature_stats=None,
+               features=FEATURES, engine=None, regimes=None):
     """Save the trained model"""
     print(f"\nSaving model to {output_path}...")
     joblib.dump(model, output_path)
@@ -120,11 +462,18 @@ def save_model(model, output_path):
     
     # Also save metadata
     metadata = {
-        'features': FEATURES,
+        'features': features,
         'contamination': CONTAMINATION,
         'trained_at': datetime.now().isoformat(),
-        'n_estimators': 100
+        'n_estimators': model.n_estimators,
+        'compiled_model': os.path.basename(compiled_path) if compiled_path else None
     }
+    if engine is not None:
+        metadata['window'] = engine.config()
+    if feature_stats is not None:
+        metadata['feature_stats'] = feature_stats
+    if regimes is not None:
+        metadata['regimes'] = regimes
     metadata_path = output_path.replace('.pkl', '_metadata.json')
     with open(metadata_path, 'w') as f:
         json.dump(metadata, f, indent=2)
@@ -133,15 +482,43 @@ def save_model(model, output_path):
 def main():
     parser = argparse.ArgumentParser(description="Train ICS Anomaly Detection Model")
     parser.add_argument("--data", 
-                        default="/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/security_logs.csv",
-                        help="Path to training data CSV")
+                        default=None,
+                        help="Telemetry store directory or training data CSV "
+                             "(default: the store if it has data, else security_logs.csv)")
+    parser.add_argument("--start", default=None,
+                        help="Store only: first timestamp to train on (ISO 8601)")
+    parser.add_argument("--end", default=None,
+                        help="Store only: train on data before this timestamp (ISO 8601)")
     parser.add_argument("--output",
                         default="/home/naim/pipeline_project/3_DATA_AND_ARTIFACTS/isolation_forest_model.pkl",
                         help="Output path for trained model")
     parser.add_argument("--test-split", type=float, default=0.2,
                         help="Fraction of data for testing")
+    parser.add_argument("--stream", action="store_true",
+                        help="Out-of-core mode: one chunked pass with reservoir sampling")
+    parser.add_argument("--sample-size", type=int, default=100000,
+                        help="Stream mode: rows kept in the training reservoir")
+    parser.add_argument("--chunk-rows", type=int, default=50000,
+                        help="Stream mode: CSV rows read per chunk")
+    parser.add_argument("--windows", default=None,
+                        help="Comma-separated rolling windows in samples, e.g. 10,60 "
+                             "(enables window features)")
+    parser.add_argument("--lags", default="1",
+                        help="Comma-separated lag offsets for window features")
+    parser.add_argument("--n-estimators", type=int, default=N_ESTIMATORS,
+                        help=f"Trees in the forest, or in the fallback forest with "
+                             f"--regimes (default: {N_ESTIMATORS})")
+    parser.add_argument("--regimes", action="store_true",
+                        help="Train one forest per phase/valve_opening/safety_trip regime")
+    parser.add_argument("--regime-estimators", type=int, default=REGIME_ESTIMATORS,
+                        help=f"Regime mode: trees per regime forest (default: {REGIME_ESTIMATORS})")
+    parser.add_argument("--min-regime-rows", type=int, default=MIN_REGIME_ROWS,
+                        help=f"Regime mode: training rows a regime needs for its own forest "
+                             f"(default: {MIN_REGIME_ROWS})")
     
     args = parser.parse_args()
+    if args.data is None:
+        args.data = default_data_path()
     
     # Check data file exists
     if not os.path.exists(args.data):
@@ -149,12 +526,36 @@ def main():
         print("Please collect data first using the AI node in collect mode.")
         return 1
     
-    # Load data
-    df = load_data(args.data)
-    print(f"Loaded {len(df)} total records")
+    engine = None
+    features = FEATURES
+    if args.windows:
+        engine = WindowFeatureEngine(windows=[int(w) for w in args.windows.split(',')],
+                                     lags=[int(k) for k in args.lags.split(',') if k])
+        features = FEATURES + engine.feature_names()
     
-    # Prepare training data
-    X = prepare_training_data(df)
+    feature_stats = None
+    if args.stream:
+        X, stats = stream_training_data(args.data, args.sample_size, args.chunk_rows,
+                                        args.start, args.end, engine)
+        feature_stats = stats.summary(features)
+        for name, st in feature_stats.items():
+            if st['count']:
+                print(f"  {name:<14} n={st['count']:<9} mean={st['mean']:.4f} "
+                      f"min={st['min']:.4f} max={st['max']:.4f}")
+    else:
+        # Load data
+        if os.path.isdir(args.data):
+            df = load_store(args.data, args.start, args.end)
+        else:
+            df = load_data(args.data)
+        print(f"Loaded {len(df)} total records")
+        df[FEATURES] = fill_missing(df[FEATURES].to_numpy(dtype=np.float64))
+        
+        if engine is not None:
+            df = add_window_features(df, engine)
+        
+        # Prepare training data
+        X = prepare_training_data(df, features)
     
     # Split for evaluation (if enough data)
     if len(X) > 100:
@@ -164,14 +565,20 @@ def main():
         X_test = X
     
     # Train model
-    model = train_model(X_train)
+    regimes = None
+    if args.regimes:
+        model, regimes = train_regime_model(X_train, args.n_estimators,
+                                            args.regime_estimators, args.min_regime_rows)
+    else:
+        model = train_model(X_train, args.n_estimators)
     
     # Evaluate (if test set has labels)
     evaluate_model(model, X_test)
     
     # Save model
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    save_model(model, args.output)
+    compiled_path = save_compiled_model(model, X_test, args.output)
+    save_model(model, args.output, compiled_path, feature_stats, features, engine, regimes)
     
     print("\n" + "="*60)
     print("Training complete!")
@@ -180,6 +587,7 @@ def main():
     print(f"1. Deploy the model to {args.output}")
     print(f"2. Update ics_ai_node.service to use monitor mode")
     print(f"3. Restart the AI node: sudo systemctl restart ics_ai_node")
+    print(f"   (a node already in monitor mode hot-swaps the new model by itself)")
     
     return 0
 
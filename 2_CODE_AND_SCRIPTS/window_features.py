@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+ICS AI Sliding-Window Feature Engine
+Per-device rolling features for temporal attack detection (replay, slow
+drift, frozen sensors) that a per-sample model cannot see.
+
+For every analog channel the engine produces, per configured window w:
+  <channel>_mean_<w>, <channel>_std_<w>
+plus
+  <channel>_delta      change since the previous sample
+  <channel>_rate       delta / seconds since the previous sample
+  <channel>_lag<k>     value k samples ago
+
+Each device has one preallocated NumPy ring buffer and running sums per
+window, so an update is O(windows x channels) regardless of window length.
+train_model.py and the live AI node both call WindowFeatureEngine.update(),
+so offline and online features are computed by the same code.
+
+State is kept per device_key(): a device's JSON device_id ('pump-007'),
+binary/frame device number (7) and stored column value (b'pump-007') all
+map to the same device number, so one device never has two windows.
+
+Usage:
+  engine = WindowFeatureEngine(windows=(10, 60), lags=(1,))
+  extra = engine.update(device_id, [flow, pressure, temp, current], ts)
+  features = TelemetryFeatures(FEATURES, engine)
+  row = features.new_row()                      # raw fields written by the decoder
+  features.fill_window(record, row, ts)
+  features.fill_window_rows(devices, X, timestamps)   # a whole frame, in order
+"""
+
+import numpy as np
+
+from telemetry_binary import device_number
+
+# Defaults
+CHANNELS = ['flow_rate', 'pressure', 'temperature', 'motor_current']
+WINDOWS = (10, 60)      # Samples per rolling window
+LAGS = (1,)             # Lag features (samples back)
+DEVICE_KEY = 'device_id'
+DEFAULT_DEVICE = 0         # Samples without a device_id (as device_number(None))
+RESYNC_INTERVAL = 4096  # Recompute running sums exactly this often (float drift)
+
+
+def device_key(device_id):
+    """Window-state key of a device: its device number (ValueError on a collision)"""
+    if isinstance(device_id, int):
+        return device_id
+    if isinstance(device_id, bytes):
+        device_id = device_id.decode(errors='replace')
+    elif isinstance(device_id, float):
+        if device_id != device_id:  # NaN (missing in a DataFrame)
+            return DEFAULT_DEVICE
+        if device_id.is_integer():
+            return device_number(int(device_id))
+    if device_id is None or device_id == '':
+        return DEFAULT_DEVICE
+    return device_number(device_id)
+
+
+class RollingWindow:
+    """Ring buffer of one device's recent samples with O(1) rolling sums"""
+
+    def __init__(self, n_channels, windows, depth):
+        self.windows = windows
+        self.depth = depth
+        self.values = np.zeros((depth, n_channels))
+        self.pos = 0              # Next slot to write
+        self.count = 0            # Samples pushed so far
+        self.last_ts = None
+        self.sums = np.zeros((len(windows), n_channels))
+        self.sumsq = np.zeros((len(windows), n_channels))
+
+    def push(self, x, ts):
+        """Add one sample; returns seconds since the previous one (or None)"""
+        for i, w in enumerate(self.windows):
+            if self.count >= w:
+                old = self.values[(self.pos - w) % self.depth]
+                self.sums[i] -= old
+                self.sumsq[i] -= old * old
+            self.sums[i] += x
+            self.sumsq[i] += x * x
+
+        self.values[self.pos] = x
+        self.pos = (self.pos + 1) % self.depth
+        self.count += 1
+        if self.count % RESYNC_INTERVAL == 0:
+            self._resync()
+
+        dt = None if self.last_ts is None or ts is None else ts - self.last_ts
+        self.last_ts = ts
+        return dt
+
+    def _resync(self):
+        """Recompute running sums from the buffer to cancel rounding drift"""
+        for i, w in enumerate(self.windows):
+            recent = self.lag_block(w)
+            self.sums[i] = recent.sum(axis=0)
+            self.sumsq[i] = (recent * recent).sum(axis=0)
+
+    def lag_block(self, n):
+        """The last min(n, count) samples"""
+        n = min(n, self.count)
+        index = (self.pos - 1 - np.arange(n)) % self.depth
+        return self.values[index]
+
+    def lag(self, k):
+        """Sample pushed k steps before the newest one (oldest if not yet seen)"""
+        k = min(k, self.count - 1)
+        return self.values[(self.pos - 1 - k) % self.depth]
+
+
+class WindowFeatureEngine:
+    def __init__(self, channels=CHANNELS, windows=WINDOWS, lags=LAGS):
+        """
+        Initialize the engine.
+
+        Args:
+            channels: names of the analog inputs passed to update(), in order
+            windows: rolling window lengths, in samples
+            lags: lag offsets, in samples
+        """
+        self.channels = list(channels)
+        self.windows = tuple(int(w) for w in windows)
+        self.lags = tuple(int(k) for k in lags)
+        self.depth = max(self.windows + tuple(k + 1 for k in self.lags) + (2,))
+        self.devices = {}
+        self.n_features = len(self.feature_names())
+
+    @classmethod
+    def from_config(cls, config):
+        """Build an engine from the 'window' block of model metadata"""
+        return cls(config.get('channels', CHANNELS), config.get('windows', WINDOWS),
+                   config.get('lags', LAGS))
+
+    def config(self):
+        """Serializable configuration, stored in model metadata"""
+        return {'channels': self.channels, 'windows': list(self.windows),
+                'lags': list(self.lags)}
+
+    def feature_names(self):
+        names = []
+        for w in self.windows:
+            names += [f"{c}_mean_{w}" for c in self.channels]
+            names += [f"{c}_std_{w}" for c in self.channels]
+        names += [f"{c}_delta" for c in self.channels]
+        names += [f"{c}_rate" for c in self.channels]
+        for k in self.lags:
+            names += [f"{c}_lag{k}" for c in self.channels]
+        return names
+
+    def reset(self, device_id=None):
+        """Forget history for one device, or for all of them"""
+        if device_id is None:
+            self.devices.clear()
+        else:
+            self.devices.pop(device_id, None)
+
+    def update(self, device_id, values, ts=None, out=None):
+        """
+        Push one sample for a device and return its window features.
+
+        Args:
+            device_id: key that separates independent sensor streams
+            values: analog readings in `channels` order
+            ts: sample time in seconds (used for rate features)
+            out: optional preallocated array of length n_features
+
+        Returns:
+            feature vector in feature_names() order
+        """
+        x = np.asarray(values, dtype=np.float64)
+        window = self.devices.get(device_id)
+        if window is None:
+            window = self.devices[device_id] = RollingWindow(len(self.channels),
+                                                             self.windows, self.depth)
+        missing = np.isnan(x)
+        if missing.any():
+            # Hold the last reading so one gap does not poison the running sums
+            x = np.where(missing, window.lag(0) if window.count else 0.0, x)
+        dt = window.push(x, ts)
+
+        if out is None:
+            out = np.empty(self.n_features)
+        n_ch = len(self.channels)
+        col = 0
+        for i, w in enumerate(self.windows):
+            n = min(window.count, w)
+            mean = window.sums[i] / n
+            var = np.maximum(window.sumsq[i] / n - mean * mean, 0.0)
+            out[col:col + n_ch] = mean
+            out[col + n_ch:col + 2 * n_ch] = np.sqrt(var)
+            col += 2 * n_ch
+
+        delta = x - window.lag(1)
+        out[col:col + n_ch] = delta
+        out[col + n_ch:col + 2 * n_ch] = delta / dt if dt and dt > 0 else 0.0
+        col += 2 * n_ch
+
+        for k in self.lags:
+            out[col:col + n_ch] = window.lag(k)
+            col += n_ch
+        return out
+
+    def transform(self, X, timestamps=None, device_ids=None):
+        """
+        Run update() over rows in time order (offline / training use).
+
+        Args:
+            X: (n_samples, len(channels)) analog readings
+            timestamps: optional per-row times in seconds
+            device_ids: optional per-row device keys (default: one device)
+
+        Returns:
+            (n_samples, n_features) window features
+        """
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty((len(X), self.n_features))
+        for i in range(len(X)):
+            ts = None if timestamps is None else timestamps[i]
+            device = DEFAULT_DEVICE if device_ids is None else device_ids[i]
+            self.update(device, X[i], ts, out[i])
+        return out
+
+
+class TelemetryFeatures:
+    """The live model input: raw telemetry fields, then window features"""
+
+    def __init__(self, fields, engine=None):
+        """
+        Args:
+            fields: telemetry keys copied into the row, in order
+            engine: optional WindowFeatureEngine; its channels must be in fields
+        """
+        self.fields = list(fields)
+        self.engine = engine
+        self.channel_index = [self.fields.index(c) for c in engine.channels] if engine else []
+        self.n_features = len(self.fields) + (engine.n_features if engine else 0)
+
+    def names(self):
+        """Column names of row(), in order"""
+        return self.fields + (self.engine.feature_names() if self.engine else [])
+
+    def new_row(self):
+        return np.empty(self.n_features)
+
+    def new_rows(self, n):
+        return np.empty((n, self.n_features))
+
+    def fill_window(self, record, row, ts=None):
+        """
+        Write the window features into row[len(fields):].
+
+        Args:
+            record: decoded message (anything with .get), for the device ID
+                    (ValueError if it collides with another device's number)
+            row: feature row whose first len(fields) values are already set
+            ts: sample time in seconds
+        """
+        if self.engine is not None:
+            self.engine.update(device_key(record.get(DEVICE_KEY)),
+                               row[self.channel_index], ts,
+                               out=row[len(self.fields):])
+        return row
+
+    def fill_window_rows(self, devices, X, timestamps):
+        """fill_window() for each row of X, in order (devices: frame device numbers)"""
+        if self.engine is not None:
+            n_fields = len(self.fields)
+            for i in range(len(X)):
+                self.engine.update(devices[i], X[i, self.channel_index], timestamps[i],
+                                   out=X[i, n_fields:])
+        return X